@@ -1,99 +1,837 @@
-from google import genai
-from google.genai import types
+from __future__ import annotations
+
+import contextvars
+import threading
+import time
+from functools import partial
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
 
 from config import Config
+from memory import ConversationMemory
+from model_calls import ModelCaller
+from router import IntentRouter
+from singleflight import SingleFlight
+from tiers import ModelTiers
 from tools.registry import ToolRegistry
+from tracing import get_tracer
+from utils import lazy_import
+
+genai = lazy_import("google.genai")
+errors = lazy_import("google.genai.errors")
+# Only needed once a request is made, kept off the startup path
+caching = lazy_import("context_cache")
+types = lazy_import("google.genai.types")
+
+# Whether the latest request in this context went out on the context cache,
+# which declares every tool rather than the pruned ones
+_used_context_cache: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "jarvis_used_context_cache", default=False
+)
 
 
 class JarvisAgent:
     """Main agent for processing command using Gemini"""
 
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, client=None):
+        """
+        :param config: Application config
+        :param client: Gemini client to use instead of creating one, e.g. a local stand-in
+        """
         self.config = config
-        self.client = genai.Client(api_key=config.api_key)
-        self.tool_registry = ToolRegistry(config.command_timeout)
+        self._client = client
+        self._client_lock = threading.Lock()
+        self.tool_registry = ToolRegistry(
+            config.command_timeout,
+            config.tool_workers,
+            config.shell_output_limit,
+            config.shell_echo,
+            config.shell_sessions,
+            config.file_index_roots,
+            config.file_index_path,
+            config.app_index_path,
+            config.tool_cache_bytes
+        )
+        self.router = IntentRouter(self.tool_registry) if config.fast_path else None
+        self.memory = ConversationMemory(
+            config.memory_token_budget,
+            config.memory_recent_turns,
+            config.memory_result_chars
+        ) if config.memory_enabled else None
+        self.last_ttft: Optional[float] = None
+        self.tracer = get_tracer()
+        self.model_caller = ModelCaller(config, lambda: self.client)
+        self.tiers = ModelTiers(config, self.tool_registry)
+        self._configs: Dict[Optional[Tuple[str, ...]], types.GenerateContentConfig] = {}
+        self._configs_version = -1
+        self.flights = SingleFlight()
+        self._context_cache: Optional[caching.ContextCache] = None
+        self._context_cache_lock = threading.Lock()
 
-    def _create_tools(self) -> list:
-        """Create tools configuration for Gemini"""
+    @property
+    def client(self) -> genai.Client:
+        """Gemini client, created on first use"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = genai.Client(api_key=self.config.api_key)
+        return self._client
+
+    @client.setter
+    def client(self, client) -> None:
+        self._client = client
+
+    @property
+    def context_cache(self) -> Optional[caching.ContextCache]:
+        """Server-side cache of the request prefix, created on first use. None if disabled"""
+        if self._context_cache is None and self.config.context_cache:
+            with self._context_cache_lock:
+                if self._context_cache is None:
+                    self._context_cache = caching.ContextCache(self.config, lambda: self.client)
+        return self._context_cache
+
+    def warm_up(self) -> threading.Thread:
+        """
+        Import the SDK, create the client and load tools in a background thread,
+        so the first command doesn't pay for it
+        """
+        def warm() -> None:
+            try:
+                _ = self.client
+                _ = self.context_cache
+                self._initial_config()
+                if self.config.tool_top_k:
+                    self.tool_registry.tool_index()
+                if self.router:
+                    self.router.rebuild()
+            except Exception:
+                # Errors will surface again on first real use
+                pass
+
+        thread = threading.Thread(target=warm, name="jarvis-warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    def _create_tools(self, tool_names: Optional[Tuple[str, ...]] = None) -> list:
+        """Create tools configuration for Gemini, with all tools or only the named ones"""
         return [types.Tool(
-            function_declarations=self.tool_registry.get_function_declarations()
+            function_declarations=self.tool_registry.get_function_declarations(
+                None if tool_names is None else list(tool_names)
+            )
         )]
 
+    def _initial_config(self, tool_names: Optional[Tuple[str, ...]] = None) -> types.GenerateContentConfig:
+        """
+        Config for the first request, with tools available
+
+        Configs are built once per tool subset and reused until a tool is registered
+        """
+        if self._configs_version != self.tool_registry.version:
+            self._configs = {}
+            self._configs_version = self.tool_registry.version
+            # Nothing to drop if no request was made yet
+            if self._context_cache:
+                self._context_cache.invalidate()
+
+        config = self._configs.get(tool_names)
+        if config is None:
+            config = self._configs[tool_names] = types.GenerateContentConfig(
+                tools=self._create_tools(tool_names),
+                system_instruction=self.config.system_instruction
+            )
+        return config
+
+    def _followup_config(self, tool_round: int,
+                         tool_names: Optional[Tuple[str, ...]] = None) -> types.GenerateContentConfig:
+        """
+        Config for the request that sends function results back
+
+        The model may keep calling tools until max_tool_rounds is reached
+        """
+        if tool_round < self.config.max_tool_rounds:
+            return self._initial_config(tool_names)
+        return types.GenerateContentConfig(
+            system_instruction=self.config.system_instruction
+        )
+
+    def _select_tools(self, user_input: str, contents: List[types.Content]) -> Optional[Tuple[str, ...]]:
+        """
+        Pick the tools to declare for a command, None to declare all
+
+        Tools called earlier in the conversation stay declared so the model
+        can refer back to them
+        """
+        if not self.config.tool_top_k:
+            return None
+        used = [
+            part.function_call.name
+            for content in contents for part in content.parts or [] if part.function_call
+        ]
+        with self.tracer.span("select_tools") as span:
+            selection = self.tool_registry.select_tools(
+                user_input, self.config.tool_top_k, list(self.config.tool_always_include) + used
+            )
+            span.set(tools=len(selection.names), tool_tokens_saved=selection.tokens_saved)
+        return tuple(selection.names)
+
+    @staticmethod
+    def _user_content(user_input: str) -> types.Content:
+        """Wrap user input into a content"""
+        return types.Content(role="user", parts=[types.Part(text=user_input)])
+
+    def _request_contents(self, user_input: str) -> List[types.Content]:
+        """Build the contents of a new request: conversation history and the user input"""
+        user_content = self._user_content(user_input)
+        if not self.memory:
+            return [user_content]
+
+        contents = self.memory.history() + [user_content]
+        self.memory.record_prompt(contents)
+        return contents
+
+    def _remember(self, user_input: str, turn_contents: List[types.Content], reply: str) -> None:
+        """Store a finished turn in the conversation memory"""
+        if self.memory:
+            self.memory.add_turn(user_input, turn_contents, reply)
+
+    def _generate(self, stage: str, contents: List[types.Content], config: types.GenerateContentConfig,
+                  model: Optional[str] = None):
+        """
+        Call the model, tracing the call as a span
+
+        :param stage: "initial", "escalation" or "followup"
+        :param contents: Request contents
+        :param config: Request config
+        :param model: Model to call, config.model_name if not given
+        :return: Model response
+        """
+        model = model or self.config.model_name
+        with self.tracer.span(f"model.{stage}", model=model) as span:
+            started = time.perf_counter()
+            request_config = self._request_config(model, config, span)
+            try:
+                response = self.model_caller.generate(model, contents, request_config, span)
+            except errors.ClientError as e:
+                if request_config is config or not caching.cache_unavailable(e):
+                    raise
+                # The cached prefix is gone on the server, send it in full
+                self._discard_cache(request_config)
+                response = self.model_caller.generate(model, contents, config, span)
+            self.tiers.record(model, time.perf_counter() - started, response)
+            span.record_usage(response)
+            return response
+
+    def _request_config(self, model: str, config: types.GenerateContentConfig, span) -> types.GenerateContentConfig:
+        """Config referring to a server-side cache of the system instruction and tools, if there is one"""
+        if self.context_cache is None:
+            _used_context_cache.set(False)
+            return config
+        # Requests declaring tools share one cache of all of them, rather than
+        # a cache per pruned subset
+        prefix = self._initial_config() if config.tools else config
+        request_config = self.context_cache.apply(model, config, prefix)
+        _used_context_cache.set(request_config is not config)
+        span.set(context_cache=request_config is not config)
+        return request_config
+
+    def _discard_cache(self, request_config: types.GenerateContentConfig) -> None:
+        """Drop a cache a request failed on, before resending it uncached"""
+        self.context_cache.discard(request_config)
+        _used_context_cache.set(False)
+
+    def _stream_with_fallback(self, model: str, contents: List[types.Content],
+                              config: types.GenerateContentConfig, span) -> Iterator:
+        """model_caller.stream, resent without the cached prefix if the cache is gone"""
+        request_config = self._request_config(model, config, span)
+        stream = self.model_caller.stream(model, contents, request_config, span)
+        if request_config is config:
+            yield from stream
+            return
+        try:
+            first = next(stream, None)
+        except errors.ClientError as e:
+            if not caching.cache_unavailable(e):
+                raise
+            self._discard_cache(request_config)
+            yield from self.model_caller.stream(model, contents, config, span)
+            return
+        if first is not None:
+            yield first
+            yield from stream
+
+    def _generate_stream(self, stage: str, contents: List[types.Content],
+                         config: types.GenerateContentConfig, model: Optional[str] = None) -> Iterator:
+        """Streaming counterpart of _generate, the span ends when the stream does"""
+        model = model or self.config.model_name
+        span = self.tracer.start_span(f"model.{stage}", model=model, stream=True)
+        started = time.perf_counter()
+        last = None
+        try:
+            stream = self._stream_with_fallback(model, contents, config, span)
+            for i, chunk in enumerate(stream):
+                if i == 0:
+                    span.set(ttft_ms=(time.perf_counter() - started) * 1000)
+                span.record_usage(chunk)
+                last = chunk
+                yield chunk
+            self.tiers.record(model, time.perf_counter() - started, last)
+        except BaseException as e:
+            span.fail(e)
+            raise
+        finally:
+            span.finish()
+
+    def _should_escalate(self, model: str, content: Optional[types.Content],
+                         tool_names: Optional[Tuple[str, ...]]) -> bool:
+        """Whether a first response should be retried on the capable model"""
+        if _used_context_cache.get():
+            # The cached prefix declared every tool, a call to a pruned one is valid
+            tool_names = None
+        calls = [
+            (func_call.name, dict(func_call.args or {}))
+            for func_call in (self._function_calls(content) if content else [])
+        ]
+        return self.tiers.should_escalate(model, calls, tool_names)
+
+    @staticmethod
+    def _chunks_content(chunks: list) -> Optional[types.Content]:
+        """Join the parts of streamed chunks into one content"""
+        parts = [
+            part
+            for chunk in chunks if chunk.candidates and chunk.candidates[0].content
+            for part in chunk.candidates[0].content.parts or []
+        ]
+        return types.Content(role="model", parts=parts) if parts else None
+
+    def _initial_response(self, user_input: str, contents: List[types.Content],
+                          tool_names: Optional[Tuple[str, ...]]) -> Tuple[Any, str]:
+        """
+        Get the first response of a command from the model tier it needs
+
+        :return: Tuple of (response, model that gave it)
+        """
+        config = self._initial_config(tool_names)
+        model = self.tiers.initial_model(user_input)
+        response = self._generate("initial", contents, config, model)
+        if self._should_escalate(model, self._response_content(response), tool_names):
+            self.tiers.escalated()
+            model = self.tiers.capable
+            response = self._generate("escalation", contents, config, model)
+        return response, model
+
+    def _initial_stream(self, user_input: str, contents: List[types.Content],
+                        tool_names: Optional[Tuple[str, ...]]) -> Tuple[Iterator, str]:
+        """
+        Streaming counterpart of _initial_response
+
+        A fast tier stream is read to the end before anything is shown, so it
+        can still be escalated
+        """
+        config = self._initial_config(tool_names)
+        model = self.tiers.initial_model(user_input)
+        stream = self._generate_stream("initial", contents, config, model)
+        if model == self.tiers.capable:
+            return stream, model
+
+        chunks = list(stream)
+        if not self._should_escalate(model, self._chunks_content(chunks), tool_names):
+            return iter(chunks), model
+
+        self.tiers.escalated()
+        model = self.tiers.capable
+        return self._generate_stream("escalation", contents, config, model), model
+
+    @staticmethod
+    def _command_key(user_input: str) -> str:
+        """Identity of a command for coalescing, ignoring case, fillers and punctuation"""
+        return IntentRouter.normalize(user_input).lower()
+
     def process_command(self, user_input: str) -> str:
         """
         Process user command using gemini
+
+        An identical command already being processed, e.g. sent by another
+        front-end, is waited for and its reply shared instead of run again
         :param user_input: User's natural language command
         :return: Agent's response
         """
-        try:
-            # Generate initial response
-            response = self.client.models.generate_content(
-                model=self.config.model_name,
-                contents=user_input,
-                config=types.GenerateContentConfig(
-                    tools=self._create_tools(),
-                    system_instruction=self.config.system_instruction
-                )
-            )
+        if not self.config.coalesce_commands:
+            return self._process_command(user_input)
+        reply, _ = self.flights.do(self._command_key(user_input), partial(self._process_command, user_input))
+        return reply
+
+    def _process_command(self, user_input: str) -> str:
+        with self.tracer.span("command", input_chars=len(user_input)) as span:
+            try:
+                # Answer common commands locally
+                if self.router:
+                    result = self.router.route(user_input)
+                    if result is not None:
+                        span.set(fast_path=True)
+                        self._remember(user_input, [self._user_content(user_input)], result)
+                        return result
+
+                # Generate initial response
+                contents = self._request_contents(user_input)
+                turn_start = len(contents) - 1
+                tool_names = self._select_tools(user_input, contents)
+                response, model = self._initial_response(user_input, contents, tool_names)
+
+                reply = self._handle_response(contents, response, tool_names, model)
+                self._remember(user_input, contents[turn_start:], reply)
+                return reply
+
+            except Exception as e:
+                span.fail(e)
+                return f"Error processing command: {str(e)}"
+
+    def process_command_stream(self, user_input: str) -> Iterator[str]:
+        """
+        Process user command using gemini, yielding text as it arrives
+
+        Time to first chunk is stored in last_ttft
+        :param user_input: User's natural language command
+        :return: Iterator over chunks of the agent's response
+        """
+        started = time.perf_counter()
+        self.last_ttft = None
+
+        for chunk in self._stream_command(user_input):
+            if not chunk:
+                continue
+            if self.last_ttft is None:
+                self.last_ttft = time.perf_counter() - started
+            yield chunk
+
+    def _stream_command(self, user_input: str) -> Iterator[str]:
+        """Streaming counterpart of process_command"""
+        with self.tracer.span("command", input_chars=len(user_input), stream=True) as span:
+            try:
+                if self.router:
+                    result = self.router.route(user_input)
+                    if result is not None:
+                        span.set(fast_path=True)
+                        self._remember(user_input, [self._user_content(user_input)], result)
+                        yield result
+                        return
+
+                contents = self._request_contents(user_input)
+                turn_start = len(contents) - 1
+                tool_names = self._select_tools(user_input, contents)
+                stream, model = self._initial_stream(user_input, contents, tool_names)
+
+                reply = []
+                for chunk in self._handle_stream(contents, stream, tool_names, model):
+                    reply.append(chunk)
+                    yield chunk
+                self._remember(user_input, contents[turn_start:], "".join(reply))
+
+            except Exception as e:
+                span.fail(e)
+                yield f"Error processing command: {str(e)}"
+
+    @staticmethod
+    def _response_content(response) -> Optional[types.Content]:
+        """Get the content of the first candidate, if any"""
+        if not response.candidates or not response.candidates[0].content:
+            return None
+        if not response.candidates[0].content.parts:
+            return None
+        return response.candidates[0].content
+
+    @staticmethod
+    def _function_calls(content: types.Content) -> List[types.FunctionCall]:
+        """Collect every function call the model asked for"""
+        return [part.function_call for part in content.parts if part.function_call]
 
-            return self._handle_response(user_input, response)
+    @staticmethod
+    def _content_text(content: types.Content) -> str:
+        """Join the text parts of a content"""
+        return "".join(part.text for part in content.parts if part.text and not part.thought)
 
-        except Exception as e:
-            return f"Error processing command: {str(e)}"
+    @staticmethod
+    def _no_answer(tool_round: int) -> str:
+        """Fallback reply when the model returned no text"""
+        return "I'm not sure how to help with that" if tool_round == 0 else "Action completed"
 
-    def _handle_response(self, user_input: str, response) -> str:
+    def _parse_response(self, response) -> Tuple[Optional[types.Content], List[types.FunctionCall]]:
+        """Get the content of a response and the function calls in it"""
+        with self.tracer.span("parse") as span:
+            content = self._response_content(response)
+            func_calls = self._function_calls(content) if content else []
+            span.set(function_calls=len(func_calls))
+            return content, func_calls
+
+    def _handle_response(self, contents: List[types.Content], response,
+                         tool_names: Optional[Tuple[str, ...]] = None, model: Optional[str] = None) -> str:
         """Handle Gemini's response and execute functions if needed"""
-        if not response.candidates or not response.candidates[0].content.parts:
-            return "I'm not sure how to help with that"
+        # One more round than tool rounds, to read the answer to the last one
+        for tool_round in range(self.config.max_tool_rounds + 2):
+            content, func_calls = self._parse_response(response)
+            if content is None:
+                return self._no_answer(tool_round)
+
+            # The last follow-up declares no tools, calls in its answer aren't run
+            if not func_calls or tool_round > self.config.max_tool_rounds:
+                return self._content_text(content) or self._no_answer(tool_round)
 
-        for part in response.candidates[0].content.parts:
-            # Handle function calls
-            if hasattr(part, 'function_call') and part.function_call:
-                return self._handle_function_call(user_input, response, part.function_call)
+            calls = self._call_arguments(func_calls)
+            results = self._execute_function_calls(calls)
 
-            # Handle text response
-            if hasattr(part, 'text') and part.text:
-                return part.text
+            # Self-describing results need no second round trip
+            reply = self.tool_registry.render_responses(calls, results)
+            if reply is not None:
+                return reply
 
-        return "I'm not sure how to help with that"
+            contents += [content, self._function_response_content(func_calls, results)]
 
-    def _handle_function_call(self, user_input: str, initial_response, func_call) -> str:
-        """Execute function and get final response from Gemini"""
-        func_name = func_call.name
-        func_args = dict(func_call.args)
+            # Send all function results back to model in one request
+            try:
+                response = self._generate(
+                    "followup", contents, self._followup_config(tool_round + 1, tool_names), model
+                )
+            except Exception as e:
+                return f"Error getting final response: {str(e)}"
 
-        print(f"[Executing: {func_name}({func_args})]")
+    def _consume_stream(self, stream, parts: list) -> Iterator[str]:
+        """Yield text from a stream, collecting every part into parts"""
+        for chunk in stream:
+            if not chunk.candidates or not chunk.candidates[0].content:
+                continue
+            for part in chunk.candidates[0].content.parts or []:
+                parts.append(part)
+                if part.text and not part.function_call and not part.thought:
+                    yield part.text
 
-        # Execute the function
-        result = self.tool_registry.execute(func_name, **func_args)
+    def _handle_stream(self, contents: List[types.Content], stream,
+                       tool_names: Optional[Tuple[str, ...]] = None, model: Optional[str] = None) -> Iterator[str]:
+        """Yield streamed text, executing function calls between rounds"""
+        # One more round than tool rounds, to read the answer to the last one
+        for tool_round in range(self.config.max_tool_rounds + 2):
+            parts = []
+            has_text = False
+            try:
+                for text in self._consume_stream(stream, parts):
+                    has_text = True
+                    yield text
+            except Exception as e:
+                if tool_round == 0:
+                    raise
+                # Follow-up streams only fail once they're consumed, here
+                yield f"Error getting final response: {str(e)}"
+                return
 
-        # Send function result back to model
-        try:
-            response = self.client.models.generate_content(
-                model=self.config.model_name,
-                contents=[
-                    user_input,
-                    initial_response.candidates[0].content,
-                    types.Content(
-                        parts=[types.Part(
-                            function_response=types.FunctionResponse(
-                                name=func_name,
-                                response={"result": result}
-                            )
-                        )]
+            content = types.Content(role="model", parts=parts)
+            func_calls = self._function_calls(content)
+            if not func_calls or tool_round > self.config.max_tool_rounds:
+                if not has_text:
+                    yield self._no_answer(tool_round)
+                return
+
+            calls = self._call_arguments(func_calls)
+            results = self._execute_function_calls(calls)
+
+            reply = self.tool_registry.render_responses(calls, results)
+            if reply is not None:
+                yield reply
+                return
+
+            contents += [content, self._function_response_content(func_calls, results)]
+
+            stream = self._generate_stream(
+                "followup", contents, self._followup_config(tool_round + 1, tool_names), model
+            )
+
+    @staticmethod
+    def _call_arguments(func_calls: List[types.FunctionCall]) -> List[Tuple[str, Dict[str, Any]]]:
+        """Extract (name, arguments) from function calls and log them"""
+        calls = []
+        for func_call in func_calls:
+            func_args = dict(func_call.args or {})
+            print(f"[Executing: {func_call.name}({func_args})]")
+            calls.append((func_call.name, func_args))
+        return calls
+
+    def _execute_function_calls(self, calls: List[Tuple[str, Dict[str, Any]]]) -> List[str]:
+        """Execute all function calls of a response concurrently"""
+        return self.tool_registry.execute_many(calls)
+
+    @staticmethod
+    def _function_response_content(func_calls: List[types.FunctionCall], results: List[str]) -> types.Content:
+        """Build the content that sends function results back to the model"""
+        return types.Content(
+            role="user",
+            parts=[
+                types.Part(
+                    function_response=types.FunctionResponse(
+                        id=func_call.id,
+                        name=func_call.name,
+                        response={"result": result}
                     )
-                ],
-                config=types.GenerateContentConfig(
-                    system_instruction=self.config.system_instruction
                 )
-            )
+                for func_call, result in zip(func_calls, results)
+            ]
+        )
+
+
+class AsyncJarvisAgent(JarvisAgent):
+    """Agent built on the async Gemini client, for serving several conversations"""
+
+    async def _generate(self, stage: str, contents: List[types.Content], config: types.GenerateContentConfig,
+                        model: Optional[str] = None):
+        """Call the model, tracing the call as a span"""
+        model = model or self.config.model_name
+        with self.tracer.span(f"model.{stage}", model=model) as span:
+            started = time.perf_counter()
+            request_config = self._request_config(model, config, span)
+            try:
+                response = await self.model_caller.generate_async(model, contents, request_config, span)
+            except errors.ClientError as e:
+                if request_config is config or not caching.cache_unavailable(e):
+                    raise
+                self._discard_cache(request_config)
+                response = await self.model_caller.generate_async(model, contents, config, span)
+            self.tiers.record(model, time.perf_counter() - started, response)
+            span.record_usage(response)
+            return response
+
+    async def _stream_with_fallback(self, model: str, contents: List[types.Content],
+                                    config: types.GenerateContentConfig, span) -> AsyncIterator:
+        """Async counterpart of JarvisAgent._stream_with_fallback"""
+        request_config = self._request_config(model, config, span)
+        stream = self.model_caller.stream_async(model, contents, request_config, span)
+        if request_config is not config:
+            try:
+                first = await stream.__anext__()
+            except StopAsyncIteration:
+                return
+            except errors.ClientError as e:
+                if not caching.cache_unavailable(e):
+                    raise
+                self._discard_cache(request_config)
+                stream = self.model_caller.stream_async(model, contents, config, span)
+            else:
+                yield first
+        async for chunk in stream:
+            yield chunk
+
+    async def _generate_stream(self, stage: str, contents: List[types.Content],
+                               config: types.GenerateContentConfig, model: Optional[str] = None) -> AsyncIterator:
+        """Streaming counterpart of _generate, the span ends when the stream does"""
+        model = model or self.config.model_name
+        span = self.tracer.start_span(f"model.{stage}", model=model, stream=True)
+        started = time.perf_counter()
+        last = None
+        try:
+            stream = self._stream_with_fallback(model, contents, config, span)
+            async for chunk in stream:
+                if last is None:
+                    span.set(ttft_ms=(time.perf_counter() - started) * 1000)
+                span.record_usage(chunk)
+                last = chunk
+                yield chunk
+            self.tiers.record(model, time.perf_counter() - started, last)
+        except BaseException as e:
+            span.fail(e)
+            raise
+        finally:
+            span.finish()
+
+    async def _initial_response(self, user_input: str, contents: List[types.Content],
+                                tool_names: Optional[Tuple[str, ...]]) -> Tuple[Any, str]:
+        """Get the first response of a command from the model tier it needs"""
+        config = self._initial_config(tool_names)
+        model = self.tiers.initial_model(user_input)
+        response = await self._generate("initial", contents, config, model)
+        if self._should_escalate(model, self._response_content(response), tool_names):
+            self.tiers.escalated()
+            model = self.tiers.capable
+            response = await self._generate("escalation", contents, config, model)
+        return response, model
+
+    async def _initial_stream(self, user_input: str, contents: List[types.Content],
+                              tool_names: Optional[Tuple[str, ...]]) -> Tuple[AsyncIterator, str]:
+        """Streaming counterpart of _initial_response"""
+        config = self._initial_config(tool_names)
+        model = self.tiers.initial_model(user_input)
+        stream = self._generate_stream("initial", contents, config, model)
+        if model == self.tiers.capable:
+            return stream, model
+
+        chunks = [chunk async for chunk in stream]
+        if not self._should_escalate(model, self._chunks_content(chunks), tool_names):
+            return self._replay(chunks), model
+
+        self.tiers.escalated()
+        model = self.tiers.capable
+        return self._generate_stream("escalation", contents, config, model), model
+
+    @staticmethod
+    async def _replay(chunks: list) -> AsyncIterator:
+        """Async iterator over already received chunks"""
+        for chunk in chunks:
+            yield chunk
 
-            if response.candidates and response.candidates[0].content.parts:
-                for part in response.candidates[0].content.parts:
-                    if hasattr(part, 'text') and part.text:
-                        return part.text
+    async def process_command(self, user_input: str) -> str:
+        """
+        Process user command using gemini without blocking the event loop
+        :param user_input: User's natural language command
+        :return: Agent's response
+        """
+        if not self.config.coalesce_commands:
+            return await self._process_command(user_input)
+        reply, _ = await self.flights.do_async(
+            self._command_key(user_input), partial(self._process_command, user_input)
+        )
+        return reply
+
+    async def _process_command(self, user_input: str) -> str:
+        with self.tracer.span("command", input_chars=len(user_input)) as span:
+            try:
+                if self.router:
+                    result = await self.router.route_async(user_input)
+                    if result is not None:
+                        span.set(fast_path=True)
+                        self._remember(user_input, [self._user_content(user_input)], result)
+                        return result
+
+                contents = self._request_contents(user_input)
+                turn_start = len(contents) - 1
+                tool_names = self._select_tools(user_input, contents)
+                response, model = await self._initial_response(user_input, contents, tool_names)
+
+                reply = await self._handle_response(contents, response, tool_names, model)
+                self._remember(user_input, contents[turn_start:], reply)
+                return reply
+
+            except Exception as e:
+                span.fail(e)
+                return f"Error processing command: {str(e)}"
+
+    async def process_command_stream(self, user_input: str) -> AsyncIterator[str]:
+        """
+        Process user command using gemini, yielding text as it arrives
+
+        Time to first chunk is stored in last_ttft
+        :param user_input: User's natural language command
+        :return: Async iterator over chunks of the agent's response
+        """
+        started = time.perf_counter()
+        self.last_ttft = None
+
+        async for chunk in self._stream_command(user_input):
+            if not chunk:
+                continue
+            if self.last_ttft is None:
+                self.last_ttft = time.perf_counter() - started
+            yield chunk
+
+    async def _stream_command(self, user_input: str) -> AsyncIterator[str]:
+        """Streaming counterpart of process_command"""
+        with self.tracer.span("command", input_chars=len(user_input), stream=True) as span:
+            try:
+                if self.router:
+                    result = await self.router.route_async(user_input)
+                    if result is not None:
+                        span.set(fast_path=True)
+                        self._remember(user_input, [self._user_content(user_input)], result)
+                        yield result
+                        return
+
+                contents = self._request_contents(user_input)
+                turn_start = len(contents) - 1
+                tool_names = self._select_tools(user_input, contents)
+                stream, model = await self._initial_stream(user_input, contents, tool_names)
+
+                reply = []
+                async for chunk in self._handle_stream(contents, stream, tool_names, model):
+                    reply.append(chunk)
+                    yield chunk
+                self._remember(user_input, contents[turn_start:], "".join(reply))
 
-            return "Action completed"
+            except Exception as e:
+                span.fail(e)
+                yield f"Error processing command: {str(e)}"
+
+    async def _handle_response(self, contents: List[types.Content], response,
+                               tool_names: Optional[Tuple[str, ...]] = None,
+                               model: Optional[str] = None) -> str:
+        """Handle Gemini's response and execute functions if needed"""
+        # One more round than tool rounds, to read the answer to the last one
+        for tool_round in range(self.config.max_tool_rounds + 2):
+            content, func_calls = self._parse_response(response)
+            if content is None:
+                return self._no_answer(tool_round)
+
+            # The last follow-up declares no tools, calls in its answer aren't run
+            if not func_calls or tool_round > self.config.max_tool_rounds:
+                return self._content_text(content) or self._no_answer(tool_round)
+
+            calls = self._call_arguments(func_calls)
+            results = await self._execute_function_calls(calls)
+
+            reply = self.tool_registry.render_responses(calls, results)
+            if reply is not None:
+                return reply
+
+            contents += [content, self._function_response_content(func_calls, results)]
+
+            try:
+                response = await self._generate(
+                    "followup", contents, self._followup_config(tool_round + 1, tool_names), model
+                )
+            except Exception as e:
+                return f"Error getting final response: {str(e)}"
+
+    async def _consume_stream(self, stream, parts: list) -> AsyncIterator[str]:
+        """Yield text from a stream, collecting every part into parts"""
+        async for chunk in stream:
+            if not chunk.candidates or not chunk.candidates[0].content:
+                continue
+            for part in chunk.candidates[0].content.parts or []:
+                parts.append(part)
+                if part.text and not part.function_call and not part.thought:
+                    yield part.text
+
+    async def _handle_stream(self, contents: List[types.Content], stream,
+                             tool_names: Optional[Tuple[str, ...]] = None,
+                             model: Optional[str] = None) -> AsyncIterator[str]:
+        """Yield streamed text, executing function calls between rounds"""
+        # One more round than tool rounds, to read the answer to the last one
+        for tool_round in range(self.config.max_tool_rounds + 2):
+            parts = []
+            has_text = False
+            try:
+                async for text in self._consume_stream(stream, parts):
+                    has_text = True
+                    yield text
+            except Exception as e:
+                if tool_round == 0:
+                    raise
+                # Follow-up streams only fail once they're consumed, here
+                yield f"Error getting final response: {str(e)}"
+                return
+
+            content = types.Content(role="model", parts=parts)
+            func_calls = self._function_calls(content)
+            if not func_calls or tool_round > self.config.max_tool_rounds:
+                if not has_text:
+                    yield self._no_answer(tool_round)
+                return
+
+            calls = self._call_arguments(func_calls)
+            results = await self._execute_function_calls(calls)
+
+            reply = self.tool_registry.render_responses(calls, results)
+            if reply is not None:
+                yield reply
+                return
+
+            contents += [content, self._function_response_content(func_calls, results)]
+
+            stream = self._generate_stream(
+                "followup", contents, self._followup_config(tool_round + 1, tool_names), model
+            )
 
-        except Exception as e:
-            return f"Error getting final response: {str(e)}"
\ No newline at end of file
+    async def _execute_function_calls(self, calls: List[Tuple[str, Dict[str, Any]]]) -> List[str]:
+        """Execute all function calls of a response concurrently"""
+        return await self.tool_registry.execute_many_async(calls)
@@ -0,0 +1,287 @@
+import json
+import os
+import re
+import shlex
+import shutil
+import tempfile
+import threading
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_CACHE_PATH = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "jarvis", "app_index.json"
+)
+
+# Exec field codes standing for files or URLs passed to the app
+_FILE_CODES = ("%f", "%F", "%u", "%U")
+# Deprecated and icon/name/location codes, dropped from the command line
+_DROPPED_CODES = re.compile(r"%[dDnNvmick]")
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def application_dirs() -> List[str]:
+    """XDG applications dirs, the most important first"""
+    data_home = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+    data_dirs = (os.environ.get("XDG_DATA_DIRS") or "/usr/local/share:/usr/share").split(":")
+    dirs = [data_home] + [path for path in data_dirs if path]
+    # Flatpak apps aren't always on XDG_DATA_DIRS
+    dirs += [os.path.join(data_home, "flatpak/exports/share"), "/var/lib/flatpak/exports/share"]
+
+    unique = []
+    for path in dirs:
+        path = os.path.join(path, "applications")
+        if path not in unique:
+            unique.append(path)
+    return unique
+
+
+@dataclass
+class DesktopEntry:
+    """Launchable application from a .desktop file"""
+
+    id: str
+    name: str
+    exec: str
+    # Exec split into arguments once, at index time
+    argv: List[str]
+    generic_name: str = ""
+    keywords: List[str] = field(default_factory=list)
+    terminal: bool = False
+    # Hidden entries mark an app as uninstalled, overriding lower-priority dirs
+    hidden: bool = False
+
+    def command(self, target: Optional[str] = None) -> List[str]:
+        """
+        Argument list to launch the app with
+
+        :param target: Optional file or URL to open in it
+        """
+        argv = []
+        for arg in self.argv:
+            if arg in _FILE_CODES:
+                if target:
+                    argv.append(target)
+                continue
+            arg = _DROPPED_CODES.sub("", arg).replace("%%", "%")
+            if arg:
+                argv.append(arg)
+        return argv
+
+
+def parse_desktop_file(path: str, entry_id: str) -> Optional[DesktopEntry]:
+    """
+    Read the [Desktop Entry] group of a .desktop file
+
+    :return: The entry, or None if it isn't an application
+    """
+    values: Dict[str, str] = {}
+    in_group = False
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith("["):
+                    if in_group:
+                        break
+                    in_group = line == "[Desktop Entry]"
+                elif in_group and "=" in line and not line.startswith("#"):
+                    key, _, value = line.partition("=")
+                    values[key.strip()] = value.strip()
+    except OSError:
+        return None
+
+    hidden = values.get("Hidden") == "true"
+    if values.get("Type") != "Application" or not (values.get("Exec") or hidden):
+        return None
+    try:
+        argv = shlex.split(values.get("Exec", ""))
+    except ValueError:
+        # E.g. an unbalanced quote, common in Wine-generated entries
+        if not hidden:
+            return None
+        argv = []
+    try_exec = values.get("TryExec")
+    if try_exec and not shutil.which(try_exec):
+        hidden = True
+    return DesktopEntry(
+        id=entry_id,
+        name=values.get("Name", entry_id),
+        exec=values.get("Exec", ""),
+        argv=argv,
+        generic_name=values.get("GenericName", ""),
+        keywords=[keyword for keyword in values.get("Keywords", "").split(";") if keyword],
+        terminal=values.get("Terminal") == "true",
+        hidden=hidden
+    )
+
+
+class AppIndex:
+    """
+    Index of installed applications from XDG .desktop files
+
+    Entries are kept per directory with the directory's mtime and
+    persisted, so a lookup only stats the applications dirs and parses
+    again just the ones that changed
+    """
+
+    def __init__(self, cache_path: Optional[str] = DEFAULT_CACHE_PATH, dirs: Optional[List[str]] = None):
+        """
+        :param cache_path: File the index is persisted to, None to keep it in memory only
+        :param dirs: Applications dirs, most important first. Defaults to the XDG ones
+        """
+        self.cache_path = cache_path
+        self.dirs = dirs if dirs is not None else application_dirs()
+        # directory -> (mtime, entries, subdirs)
+        self._dirs: Dict[str, Tuple[float, List[DesktopEntry], List[str]]] = {}
+        self._entries: Dict[str, DesktopEntry] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        """Load the persisted index"""
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                data = json.load(f)
+            self._dirs = {
+                path: (mtime, [DesktopEntry(**entry) for entry in entries], subdirs)
+                for path, (mtime, entries, subdirs) in data.items()
+            }
+        except (OSError, ValueError, TypeError):
+            # Unreadable, or written by an older version, indexed again from scratch
+            self._dirs = {}
+
+    def save(self) -> None:
+        """Persist the index, replacing the file atomically"""
+        if not self.cache_path:
+            return
+        directory = os.path.dirname(self.cache_path)
+        os.makedirs(directory, exist_ok=True)
+        data = {
+            path: [mtime, [asdict(entry) for entry in entries], subdirs]
+            for path, (mtime, entries, subdirs) in self._dirs.items()
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".app_index-")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp_path, self.cache_path)
+
+    @staticmethod
+    def _scan(root: str, directory: str) -> Tuple[List[DesktopEntry], List[str]]:
+        """Parse the .desktop files directly in directory, and list its subdirs"""
+        # Files in subdirs get ids with the subdir prefixed, like kde4-kate.desktop
+        prefix = os.path.relpath(directory, root).replace(os.sep, "-") + "-" if directory != root else ""
+        entries, subdirs = [], []
+        for item in sorted(os.scandir(directory), key=lambda item: item.name):
+            if item.is_dir():
+                subdirs.append(item.path)
+            elif item.name.endswith(".desktop"):
+                entry = parse_desktop_file(item.path, prefix + item.name)
+                if entry:
+                    entries.append(entry)
+        return entries, subdirs
+
+    def refresh(self) -> bool:
+        """
+        Revalidate against the applications dirs
+
+        :return: Whether anything changed
+        """
+        with self._lock:
+            if not self._loaded:
+                self.load()
+                self._loaded = True
+
+            dirs: Dict[str, Tuple[float, List[DesktopEntry], List[str]]] = {}
+            changed = False
+            for root in self.dirs:
+                pending = [root]
+                while pending:
+                    directory = pending.pop()
+                    try:
+                        mtime = os.stat(directory).st_mtime
+                        cached = self._dirs.get(directory)
+                        if not cached or cached[0] != mtime:
+                            cached = (mtime, *self._scan(root, directory))
+                            changed = True
+                    except OSError:
+                        continue
+                    dirs[directory] = cached
+                    pending.extend(cached[2])
+
+            changed = changed or dirs.keys() != self._dirs.keys()
+            if changed or not self._entries:
+                self._dirs = dirs
+                self._entries = self._merge()
+            if changed:
+                try:
+                    self.save()
+                except OSError:
+                    pass
+            return changed
+
+    def _merge(self) -> Dict[str, DesktopEntry]:
+        """Entries by id, the first dir listing an id winning"""
+        entries: Dict[str, DesktopEntry] = {}
+        for root in self.dirs:
+            for directory, (_, listed, _) in self._dirs.items():
+                if directory != root and not directory.startswith(root + os.sep):
+                    continue
+                for entry in listed:
+                    entries.setdefault(entry.id, entry)
+        return {entry_id: entry for entry_id, entry in entries.items() if not entry.hidden}
+
+    def entries(self) -> List[DesktopEntry]:
+        """Every launchable application"""
+        self.refresh()
+        return list(self._entries.values())
+
+    @staticmethod
+    def _score(entry: DesktopEntry, query: str, words: List[str]) -> float:
+        name = entry.name.lower()
+        program = os.path.basename(entry.argv[0]).lower() if entry.argv else ""
+        entry_id = entry.id.lower()[:-len(".desktop")]
+        if query in (name, program) or entry_id == query or entry_id.endswith("." + query):
+            return 100.0
+
+        score = 0.0
+        if name.startswith(query):
+            score += 20
+        generic = entry.generic_name.lower()
+        keywords = " ".join(entry.keywords).lower()
+        for word in words:
+            if word in name:
+                score += 6
+            if word == program or word in entry_id:
+                score += 5
+            if word in generic:
+                score += 3
+            if word in keywords:
+                score += 2
+        # Every word has to match somewhere
+        haystack = f"{name} {program} {entry_id} {generic} {keywords}"
+        return score if all(word in haystack for word in words) else 0.0
+
+    def search(self, query: str, limit: int = 5) -> List[DesktopEntry]:
+        """
+        Find applications by name, generic name, keywords or program
+
+        :param query: E.g. "firefox", "text editor" or "spreadsheet"
+        :param limit: Max entries returned
+        :return: Entries, best first
+        """
+        query = query.strip().lower()
+        words = _WORD_RE.findall(query)
+        if not words:
+            return []
+        scored = [(self._score(entry, query, words), entry) for entry in self.entries()]
+        scored = [(score, entry) for score, entry in scored if score > 0]
+        # Prefer shorter names among equal scores, "Kate" over "KDE Connect SMS"
+        scored.sort(key=lambda item: (-item[0], len(item[1].name)))
+        return [entry for _, entry in scored[:limit]]
+
+    def resolve(self, query: str) -> Optional[DesktopEntry]:
+        """Best matching application, None if nothing matches"""
+        matches = self.search(query, 1)
+        return matches[0] if matches else None
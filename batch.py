@@ -0,0 +1,167 @@
+import asyncio
+import contextlib
+import json
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, TextIO
+
+from agent import AsyncJarvisAgent
+
+# Fields holding the command text, in order of preference
+COMMAND_FIELDS = ("command", "input", "text", "title", "body")
+
+# Fields holding the record id, the line number is used if none is set
+ID_FIELDS = ("request_id", "id")
+
+
+@dataclass
+class BatchRecord:
+    """One command of a batch"""
+
+    id: Any
+    command: str
+
+
+def parse_record(line: str, line_number: int) -> Optional[BatchRecord]:
+    """
+    Parse a JSONL line, or a plain text line holding just the command
+
+    :param line: Input line
+    :param line_number: 1-based line number, used as id if the record has none
+    :return: Record, or None if the line holds no command
+    """
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        data = json.loads(line)
+    except json.JSONDecodeError:
+        return BatchRecord(line_number, line)
+
+    if isinstance(data, str):
+        return BatchRecord(line_number, data)
+    if not isinstance(data, dict):
+        return None
+
+    record_id = next((data[name] for name in ID_FIELDS if data.get(name) is not None), line_number)
+    for name in COMMAND_FIELDS:
+        if data.get(name):
+            return BatchRecord(record_id, str(data[name]))
+    return None
+
+
+@dataclass
+class BatchStats:
+    """Summary of a batch run"""
+
+    commands: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+
+
+class BatchRunner:
+    """Pushes commands through an agent concurrently and writes results as JSONL"""
+
+    def __init__(self, agent: AsyncJarvisAgent, concurrency: int = 4, ordered: bool = True,
+                 output: TextIO = sys.stdout):
+        """
+        :param agent: Agent to process commands with
+        :param concurrency: Max commands in flight
+        :param ordered: Write results in input order, otherwise as soon as they finish
+        :param output: Stream to write result lines to
+        """
+        self.agent = agent
+        self.concurrency = max(1, concurrency)
+        self.ordered = ordered
+        self.output = output
+        self.stats = BatchStats()
+        self._finished: Dict[int, Dict[str, Any]] = {}
+        self._next_index = 0
+
+    async def run(self, source: TextIO) -> BatchStats:
+        """
+        Process every command in source
+
+        Lines are read only as fast as commands finish, so input can be a
+        pipe of any length
+        """
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(self.concurrency)
+        tasks = set()
+        line_number = 0
+
+        while True:
+            line = await loop.run_in_executor(None, source.readline)
+            if not line:
+                break
+            line_number += 1
+            record = parse_record(line, line_number)
+            if record is None:
+                continue
+
+            await slots.acquire()
+            task = asyncio.create_task(self._process(self.stats.commands, record))
+            task.add_done_callback(lambda _: slots.release())
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            self.stats.commands += 1
+
+        if tasks:
+            await asyncio.gather(*tasks)
+        self.stats.seconds = time.perf_counter() - started
+        return self.stats
+
+    async def _process(self, index: int, record: BatchRecord) -> None:
+        started = time.perf_counter()
+        result: Dict[str, Any] = {"id": record.id, "command": record.command}
+        try:
+            reply = await self.agent.process_command(record.command)
+        except Exception as e:
+            reply = f"Error processing command: {str(e)}"
+
+        if reply.startswith("Error processing command:"):
+            self.stats.errors += 1
+            result["error"] = reply
+        else:
+            result["reply"] = reply
+        result["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        self._finish(index, result)
+
+    def _finish(self, index: int, result: Dict[str, Any]) -> None:
+        """Write a result, holding it back until earlier ones are written if ordered"""
+        if not self.ordered:
+            self._write(result)
+            return
+
+        self._finished[index] = result
+        while self._next_index in self._finished:
+            self._write(self._finished.pop(self._next_index))
+            self._next_index += 1
+
+    def _write(self, result: Dict[str, Any]) -> None:
+        self.output.write(json.dumps(result, ensure_ascii=False) + "\n")
+        self.output.flush()
+
+
+def run_batch(agent: AsyncJarvisAgent, path: str, concurrency: int = 4, ordered: bool = True) -> BatchStats:
+    """
+    Run a batch from a file, or stdin if path is "-"
+
+    Results go to stdout, the agent's own output is moved to stderr so it
+    doesn't mix with them
+    """
+    output = sys.stdout
+    runner = BatchRunner(agent, concurrency, ordered, output)
+    with contextlib.ExitStack() as stack:
+        source = sys.stdin if path == "-" else stack.enter_context(open(path, encoding="utf-8"))
+        stack.enter_context(contextlib.redirect_stdout(sys.stderr))
+        stats = asyncio.run(runner.run(source))
+
+    print(
+        f"Processed {stats.commands} commands in {stats.seconds:.1f} s "
+        f"({stats.errors} errors)",
+        file=sys.stderr
+    )
+    return stats
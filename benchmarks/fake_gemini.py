@@ -0,0 +1,303 @@
+import asyncio
+import random
+import re
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from google.genai import errors, types
+
+# Keyword rules mapping a command to the function calls a model would make
+DEFAULT_RULES: List[Tuple[str, str, Dict[str, Any]]] = [
+    (r"\bsearch(?: for)? (?P<query>.+)", "search_web", {}),
+    (r"\b(?:find|where is) (?:my )?(?P<query>.+)", "locate_file", {}),
+    (r"\bbrowser|firefox\b", "open_browser", {}),
+    (r"\bterminal|konsole\b", "open_terminal", {}),
+    (r"\bfile manager|folder|dolphin\b", "open_file_manager", {}),
+    (r"\beditor|kate\b", "open_text_editor", {}),
+    (r"\bcalculator|kcalc\b", "open_calculator", {}),
+    (r"\bsystem monitor|task manager\b", "open_system_monitor", {}),
+    (r"\btime\b", "get_system_info", {"info_type": "time"}),
+    (r"\bdate|today\b", "get_system_info", {"info_type": "date"}),
+    (r"\bmemory|ram|cpu|load\b", "get_system_metrics", {"metric": "all"}),
+    (r"\bdisk|kernel|uptime|run\b", "execute_shell_command", {"command": "uname -a"}),
+]
+
+
+class FakeModels:
+    """Stand-in for client.models, answering from keyword rules after a delay"""
+
+    def __init__(self, client: "FakeGeminiClient"):
+        self._client = client
+
+    def generate_content(self, model: str, contents: Any, config: Any = None) -> types.GenerateContentResponse:
+        self._client.record_call(model)
+        time.sleep(self._client.delay(model))
+        self._client.maybe_fail()
+        return self._client.respond(contents, config)
+
+    def generate_content_stream(self, model: str, contents: Any,
+                                config: Any = None) -> Iterator[types.GenerateContentResponse]:
+        self._client.record_call(model)
+        time.sleep(self._client.delay(model))
+        self._client.maybe_fail()
+        chunks = self._client.stream_chunks(self._client.respond(contents, config))
+        for i, chunk in enumerate(chunks):
+            if i:
+                time.sleep(self._client.chunk_delay)
+            yield chunk
+
+
+class FakeAsyncModels:
+    """Stand-in for client.aio.models"""
+
+    def __init__(self, client: "FakeGeminiClient"):
+        self._client = client
+
+    async def generate_content(self, model: str, contents: Any,
+                               config: Any = None) -> types.GenerateContentResponse:
+        self._client.record_call(model)
+        await asyncio.sleep(self._client.delay(model))
+        self._client.maybe_fail()
+        return self._client.respond(contents, config)
+
+    async def generate_content_stream(self, model: str, contents: Any,
+                                      config: Any = None) -> AsyncIterator[types.GenerateContentResponse]:
+        self._client.record_call(model)
+        await asyncio.sleep(self._client.delay(model))
+        self._client.maybe_fail()
+        chunks = self._client.stream_chunks(self._client.respond(contents, config))
+
+        async def stream() -> AsyncIterator[types.GenerateContentResponse]:
+            for i, chunk in enumerate(chunks):
+                if i:
+                    await asyncio.sleep(self._client.chunk_delay)
+                yield chunk
+
+        return stream()
+
+
+class FakeCaches:
+    """Stand-in for client.caches, keeping cached prefixes in memory"""
+
+    def __init__(self, client: "FakeGeminiClient", min_tokens: int = 0):
+        """
+        :param client: Client the caches belong to
+        :param min_tokens: Smallest prefix accepted, larger ones are rejected with a 400 like the API does
+        """
+        self._client = client
+        self.min_tokens = min_tokens
+        self.entries: Dict[str, Tuple[str, Any, float]] = {}
+        self.created = 0
+        self.updated = 0
+        self.deleted = 0
+        self._lock = threading.Lock()
+
+    def create(self, model: str, config: Any) -> types.CachedContent:
+        tokens = self._client.prefix_tokens(config)
+        if tokens < self.min_tokens:
+            raise errors.ClientError(400, {"error": {
+                "code": 400, "message": f"Cached content is too small. total_token_count={tokens}",
+                "status": "INVALID_ARGUMENT"
+            }})
+        with self._lock:
+            self.created += 1
+            name = f"cachedContents/fake-{self.created}"
+            self.entries[name] = (model, config, time.monotonic() + self._ttl(config.ttl))
+        return types.CachedContent(
+            name=name, model=model, usage_metadata=types.CachedContentUsageMetadata(total_token_count=tokens)
+        )
+
+    def update(self, name: str, config: Any) -> types.CachedContent:
+        with self._lock:
+            model, cached, _ = self.get_entry(name)
+            self.entries[name] = (model, cached, time.monotonic() + self._ttl(config.ttl))
+            self.updated += 1
+        return types.CachedContent(name=name, model=model)
+
+    def delete(self, name: str) -> None:
+        with self._lock:
+            if self.entries.pop(name, None):
+                self.deleted += 1
+
+    def get_entry(self, name: str) -> Tuple[str, Any, float]:
+        """Model, config and expiry of a live cache, raising a 403 like the API for missing ones"""
+        entry = self.entries.get(name)
+        if entry is None or entry[2] < time.monotonic():
+            raise errors.ClientError(403, {"error": {
+                "code": 403, "message": f"CachedContent not found (or permission denied): {name}",
+                "status": "PERMISSION_DENIED"
+            }})
+        return entry
+
+    @staticmethod
+    def _ttl(ttl: Optional[str]) -> float:
+        return float(ttl.rstrip("s")) if ttl else 3600.0
+
+
+class FakeAio:
+    def __init__(self, client: "FakeGeminiClient"):
+        self.models = FakeAsyncModels(client)
+
+
+class FakeGeminiClient:
+    """
+    Offline replacement for genai.Client with configurable latency
+
+    Commands matching a rule get function calls, follow-up requests carrying
+    function results get a short text answer, anything else is answered
+    with text directly
+    """
+
+    def __init__(self, latency: float = 0.3, jitter: float = 0.0, chunk_delay: float = 0.02,
+                 chunks: int = 4, rules: Optional[List[Tuple[str, str, Dict[str, Any]]]] = None,
+                 seed: Optional[int] = None, error_rate: float = 0.0, slow_rate: float = 0.0,
+                 slow_factor: float = 10.0, model_latency: Optional[Dict[str, float]] = None,
+                 cache_min_tokens: int = 0):
+        """
+        :param latency: Seconds before the first byte of every response
+        :param jitter: Max extra seconds added at random to latency
+        :param chunk_delay: Seconds between streamed chunks
+        :param chunks: Number of chunks streamed text is split into
+        :param rules: (regex, function name, arguments) rules, DEFAULT_RULES if not given
+        :param seed: Seed for the jitter
+        :param error_rate: Probability of a call failing with a 503
+        :param slow_rate: Probability of a call being a tail-latency outlier
+        :param slow_factor: How many times slower outliers are
+        :param model_latency: Latency of specific models, overriding latency
+        :param cache_min_tokens: Smallest prefix client.caches accepts
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.chunk_delay = chunk_delay
+        self.chunks = chunks
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_factor = slow_factor
+        self.model_latency = model_latency or {}
+        self.rules = [(re.compile(p, re.IGNORECASE), name, args) for p, name, args in rules or DEFAULT_RULES]
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.calls_by_model: Dict[str, int] = {}
+        self.models = FakeModels(self)
+        self.aio = FakeAio(self)
+        self.caches = FakeCaches(self, cache_min_tokens)
+
+    def record_call(self, model: str) -> None:
+        with self._lock:
+            self.calls += 1
+            self.calls_by_model[model] = self.calls_by_model.get(model, 0) + 1
+
+    def delay(self, model: Optional[str] = None) -> float:
+        with self._lock:
+            delay = self.model_latency.get(model, self.latency) + self._random.uniform(0, self.jitter)
+            if self._random.random() < self.slow_rate:
+                delay *= self.slow_factor
+            return delay
+
+    def maybe_fail(self) -> None:
+        """Raise a transient server error at error_rate"""
+        with self._lock:
+            fail = self._random.random() < self.error_rate
+        if fail:
+            raise errors.ServerError(503, {"error": {"code": 503, "message": "Overloaded", "status": "UNAVAILABLE"}})
+
+    @staticmethod
+    def prefix_tokens(config: Any) -> int:
+        """Tokens of the system instruction and tool declarations in config"""
+        if config is None:
+            return 0
+        chars = len(config.system_instruction or "")
+        chars += sum(len(tool.model_dump_json(exclude_none=True)) for tool in config.tools or [])
+        return chars // 4
+
+    def respond(self, contents: Any, config: Any = None) -> types.GenerateContentResponse:
+        """Build the response a model would give to contents"""
+        contents = contents if isinstance(contents, list) else [contents]
+        last = contents[-1]
+        cached_tokens = 0
+        if config is not None and config.cached_content:
+            # The system instruction and tools come from the cache
+            _, config, _ = self.caches.get_entry(config.cached_content)
+            cached_tokens = self.prefix_tokens(config)
+        prefix_tokens = self.prefix_tokens(config)
+
+        if isinstance(last, types.Content) and any(part.function_response for part in last.parts or []):
+            results = [
+                str((part.function_response.response or {}).get("result", ""))
+                for part in last.parts if part.function_response
+            ]
+            return self._response(
+                [types.Part(text="Done. " + "; ".join(results)[:200])], contents, prefix_tokens, cached_tokens
+            )
+
+        text = self._text(last)
+        declared = self._declared(config)
+        calls = [call for call in self._match(text) if declared is None or call[0] in declared]
+        if calls:
+            parts = [types.Part(function_call=types.FunctionCall(name=name, args=args)) for name, args in calls]
+            return self._response(parts, contents, prefix_tokens, cached_tokens)
+        return self._response(
+            [types.Part(text=f"Here's what I think about '{text}'.")], contents, prefix_tokens, cached_tokens
+        )
+
+    @staticmethod
+    def _declared(config: Any) -> Optional[set]:
+        """Names of the functions declared in config, None if no config was given"""
+        if config is None:
+            return None
+        return {
+            declaration.name
+            for tool in getattr(config, "tools", None) or []
+            for declaration in tool.function_declarations or []
+        }
+
+    def _match(self, text: str) -> List[Tuple[str, Dict[str, Any]]]:
+        calls = []
+        for regex, name, args in self.rules:
+            match = regex.search(text)
+            if not match:
+                continue
+            call = (name, {**args, **{k: v for k, v in match.groupdict().items() if v}})
+            if call not in calls:
+                calls.append(call)
+        return calls
+
+    @staticmethod
+    def _text(content: Any) -> str:
+        if isinstance(content, str):
+            return content
+        return "".join(part.text or "" for part in content.parts or [])
+
+    def _response(self, parts: List[types.Part], contents: List[Any], prefix_tokens: int = 0,
+                  cached_tokens: int = 0) -> types.GenerateContentResponse:
+        prompt_tokens = sum(len(self._text(content)) for content in contents) // 4 + 1 + prefix_tokens
+        output_chars = sum(len(part.text or "") for part in parts) + 20 * sum(1 for part in parts if part.function_call)
+        output_tokens = output_chars // 4 + 1
+        return types.GenerateContentResponse(
+            candidates=[types.Candidate(content=types.Content(role="model", parts=parts))],
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=prompt_tokens,
+                cached_content_token_count=cached_tokens or None,
+                candidates_token_count=output_tokens,
+                total_token_count=prompt_tokens + output_tokens
+            )
+        )
+
+    def stream_chunks(self, response: types.GenerateContentResponse) -> List[types.GenerateContentResponse]:
+        """Split a response into streamed chunks"""
+        chunks = []
+        for part in response.candidates[0].content.parts:
+            if part.text:
+                size = max(1, -(-len(part.text) // self.chunks))
+                pieces = [types.Part(text=part.text[i:i + size]) for i in range(0, len(part.text), size)]
+            else:
+                pieces = [part]
+            for piece in pieces:
+                chunks.append(types.GenerateContentResponse(
+                    candidates=[types.Candidate(content=types.Content(role="model", parts=[piece]))]
+                ))
+        if chunks:
+            chunks[-1].usage_metadata = response.usage_metadata
+        return chunks
@@ -0,0 +1,291 @@
+"""
+Offline latency benchmark for JarvisAgent
+
+Replays a command corpus against a local Gemini stand-in with stubbed
+tool backends, so nothing leaves the machine and no apps are launched:
+
+    python -m benchmarks.run --latency 0.3 --repeat 3
+    python -m benchmarks.run --corpus requests.jsonl --stream --max-p95-ms 800
+"""
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent import JarvisAgent  # noqa: E402
+from batch import parse_record  # noqa: E402
+from benchmarks.fake_gemini import FakeGeminiClient  # noqa: E402
+from benchmarks.stubs import StubBackends, stub_backends  # noqa: E402
+from config import Config  # noqa: E402
+from model_calls import ModelCallStats  # noqa: E402
+from result_cache import CacheStats  # noqa: E402
+from tools.index import SelectionStats  # noqa: E402
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "commands.jsonl")
+
+
+@dataclass
+class CommandSample:
+    """Measurements of one processed command"""
+
+    command: str
+    latency: float
+    round_trips: int
+    tool_calls: int
+    ttft: Optional[float] = None
+
+
+@dataclass
+class BenchmarkReport:
+    """Aggregated benchmark results, times in milliseconds"""
+
+    commands: int
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    mean_ms: float
+    round_trips_per_command: float
+    tool_calls_per_command: float
+    tool_dispatch_overhead_ms: float
+    ttft_p50_ms: Optional[float] = None
+    ttft_p95_ms: Optional[float] = None
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+
+def load_corpus(path: str) -> List[str]:
+    """
+    Read commands from a JSONL file, or a text file with one command per line
+
+    :param path: Corpus path
+    :return: Commands in file order
+    """
+    with open(path, encoding="utf-8") as f:
+        records = [parse_record(line, i) for i, line in enumerate(f, 1)]
+    return [record.command for record in records if record]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class BenchmarkRunner:
+    """Replays commands through an agent wired to a fake client and stub tools"""
+
+    def __init__(self, agent: JarvisAgent, client: FakeGeminiClient, stubs: StubBackends,
+                 stream: bool = False):
+        self.agent = agent
+        self.client = client
+        self.stubs = stubs
+        self.stream = stream
+        self.tool_calls = 0
+        self.tool_seconds = 0.0
+        self._instrument_registry()
+
+    def _instrument_registry(self) -> None:
+        """Time every tool dispatch"""
+        execute = self.agent.tool_registry.execute
+
+        def timed_execute(name: str, **kwargs) -> str:
+            started = time.perf_counter()
+            try:
+                return execute(name, **kwargs)
+            finally:
+                self.tool_calls += 1
+                self.tool_seconds += time.perf_counter() - started
+
+        self.agent.tool_registry.execute = timed_execute
+
+    def run_command(self, command: str) -> CommandSample:
+        """Process one command, discarding the agent's console output"""
+        calls_before, tools_before = self.client.calls, self.tool_calls
+        ttft = None
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            if self.stream:
+                for _ in self.agent.process_command_stream(command):
+                    pass
+                ttft = self.agent.last_ttft
+            else:
+                self.agent.process_command(command)
+            latency = time.perf_counter() - started
+
+        return CommandSample(
+            command=command,
+            latency=latency,
+            round_trips=self.client.calls - calls_before,
+            tool_calls=self.tool_calls - tools_before,
+            ttft=ttft
+        )
+
+    def run(self, commands: List[str], repeat: int = 1, warmup: int = 1) -> BenchmarkReport:
+        """
+        Replay the corpus and aggregate the measurements
+
+        :param commands: Commands to replay
+        :param repeat: Number of passes over the corpus
+        :param warmup: Commands run first and left out of the results
+        """
+        for command in commands[:warmup]:
+            self.run_command(command)
+        self.tool_calls, self.tool_seconds = 0, 0.0
+        self.stubs.backend_seconds = 0.0
+        self.agent.model_caller.stats = ModelCallStats()
+        self.agent.tool_registry.selection_stats = SelectionStats()
+        self.agent.tiers.stats, self.agent.tiers.escalations = {}, 0
+        if self.agent.tool_registry.result_cache:
+            self.agent.tool_registry.result_cache.stats = CacheStats()
+        if self.agent.router:
+            self.agent.router.reset_stats()
+
+        samples = [self.run_command(command) for _ in range(repeat) for command in commands]
+        return self.report(samples)
+
+    def report(self, samples: List[CommandSample]) -> BenchmarkReport:
+        latencies = [sample.latency * 1000 for sample in samples]
+        ttfts = [sample.ttft * 1000 for sample in samples if sample.ttft is not None]
+        count = len(samples) or 1
+        dispatch = self.tool_seconds - self.stubs.backend_seconds
+
+        return BenchmarkReport(
+            commands=len(samples),
+            p50_ms=percentile(latencies, 50),
+            p95_ms=percentile(latencies, 95),
+            p99_ms=percentile(latencies, 99),
+            mean_ms=sum(latencies) / count,
+            round_trips_per_command=sum(sample.round_trips for sample in samples) / count,
+            tool_calls_per_command=sum(sample.tool_calls for sample in samples) / count,
+            tool_dispatch_overhead_ms=dispatch * 1000 / self.tool_calls if self.tool_calls else 0.0,
+            ttft_p50_ms=percentile(ttfts, 50) if ttfts else None,
+            ttft_p95_ms=percentile(ttfts, 95) if ttfts else None,
+            extra={
+                "router": self.agent.router.stats() if self.agent.router else None,
+                "model": self.agent.model_caller.stats.as_dict(),
+                "tool_selection": asdict(self.agent.tool_registry.selection_stats),
+                "tiers": self.agent.tiers.report(),
+                "context_cache": self.agent.context_cache.stats.as_dict() if self.agent.context_cache else None,
+                "result_cache": (
+                    self.agent.tool_registry.result_cache.stats.as_dict()
+                    if self.agent.tool_registry.result_cache else None
+                )
+            }
+        )
+
+
+def print_report(report: BenchmarkReport) -> None:
+    print(f"commands                 {report.commands}")
+    print(f"latency p50/p95/p99      {report.p50_ms:.1f} / {report.p95_ms:.1f} / {report.p99_ms:.1f} ms")
+    print(f"latency mean             {report.mean_ms:.1f} ms")
+    if report.ttft_p50_ms is not None:
+        print(f"first token p50/p95      {report.ttft_p50_ms:.1f} / {report.ttft_p95_ms:.1f} ms")
+    print(f"round trips / command    {report.round_trips_per_command:.2f}")
+    print(f"tool calls / command     {report.tool_calls_per_command:.2f}")
+    print(f"tool dispatch overhead   {report.tool_dispatch_overhead_ms:.3f} ms")
+    router = report.extra.get("router")
+    if router:
+        print(f"fast path hits/misses    {router['hits']} / {router['misses']}")
+    selection = report.extra.get("tool_selection")
+    if selection and selection["requests"]:
+        sent = selection["tokens_sent"] / selection["requests"]
+        saved = selection["tokens_saved"] / selection["requests"]
+        print(f"tool tokens sent/saved   {sent:.0f} / {saved:.0f} per request")
+    tiers = report.extra.get("tiers")
+    if tiers and tiers["models"]:
+        for name, stats in tiers["models"].items():
+            print(f"  {name:<26} {stats['calls']} calls, {stats['mean_latency'] * 1000:.1f} ms mean, ${stats['cost']:.6f}")
+        print(f"tier escalations         {tiers['escalations']}")
+    context = report.extra.get("context_cache")
+    if context and context["created"]:
+        print(f"context cache hits/miss  {context['hits']} / {context['misses']}, {context['created']} created")
+    cache = report.extra.get("result_cache")
+    if cache and (cache["hits"] or cache["misses"]):
+        print(f"tool cache hits/misses   {cache['hits']} / {cache['misses']} ({cache['hit_rate']:.0%})")
+    model = report.extra.get("model")
+    if model and (model["retries"] or model["hedges"]):
+        print(f"model retries/failures   {model['retries']} / {model['failures']}")
+        print(f"model hedges/wins        {model['hedges']} / {model['hedge_wins']}")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline Jarvis latency benchmark")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="JSONL or text file with commands")
+    parser.add_argument("--repeat", type=int, default=1, help="Passes over the corpus")
+    parser.add_argument("--latency", type=float, default=0.3, help="Fake model latency in seconds")
+    parser.add_argument("--fast-latency", type=float, help="Fake latency of the fast model tier, --latency if not set")
+    parser.add_argument("--jitter", type=float, default=0.05, help="Max random extra latency in seconds")
+    parser.add_argument("--spawn-latency", type=float, default=0.0, help="Stub app launch time in seconds")
+    parser.add_argument("--command-latency", type=float, default=0.0, help="Stub shell command time in seconds")
+    parser.add_argument("--stream", action="store_true", help="Use the streaming path")
+    parser.add_argument("--no-fast-path", action="store_true", help="Disable the local intent router")
+    parser.add_argument("--memory", action="store_true", help="Keep conversation memory between commands")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of model calls failing with 503")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Fraction of model calls 10x slower")
+    parser.add_argument("--hedge", action="store_true", help="Hedge slow model calls")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for latency jitter")
+    parser.add_argument("--json", dest="json_path", help="Also write the report as JSON to this path")
+    parser.add_argument(
+        "--context-cache", action="store_true",
+        help="Cache the system instruction and tools server-side regardless of their size"
+    )
+    parser.add_argument("--max-p95-ms", type=float, help="Exit with status 1 if p95 latency is above this")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    commands = load_corpus(args.corpus)
+    if not commands:
+        print(f"No commands in {args.corpus}")
+        sys.exit(1)
+
+    config = Config(
+        api_key="offline",
+        fast_path=not args.no_fast_path,
+        stream=args.stream,
+        memory_enabled=args.memory,
+        model_retry_base_delay=0.05,
+        model_hedge=args.hedge,
+        model_hedge_min_delay=0.0,
+        # Keep the file index from scanning the disk during measurements
+        file_index_roots=(),
+        context_cache_min_tokens=0 if args.context_cache else Config.context_cache_min_tokens
+    )
+    client = FakeGeminiClient(
+        latency=args.latency,
+        jitter=args.jitter,
+        seed=args.seed,
+        error_rate=args.error_rate,
+        slow_rate=args.slow_rate,
+        model_latency={config.fast_model_name: args.fast_latency} if args.fast_latency is not None else None
+    )
+    stubs = StubBackends(spawn_latency=args.spawn_latency, command_latency=args.command_latency)
+
+    with stub_backends(stubs):
+        agent = JarvisAgent(config, client=client)
+        report = BenchmarkRunner(agent, client, stubs, stream=args.stream).run(commands, args.repeat)
+
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(asdict(report), f, indent=2)
+
+    if args.max_p95_ms is not None and report.p95_ms > args.max_p95_ms:
+        print(f"p95 latency {report.p95_ms:.1f} ms is above {args.max_p95_ms:.1f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
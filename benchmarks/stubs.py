@@ -0,0 +1,55 @@
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional
+
+from utils import CommandResult, ProcessExecutor
+
+
+class StubBackends:
+    """Replaces process spawning so benchmarks never launch real apps"""
+
+    def __init__(self, spawn_latency: float = 0.0, command_latency: float = 0.0,
+                 command_output: str = "Linux jarvis 6.0.0 x86_64 GNU/Linux"):
+        """
+        :param spawn_latency: Seconds a detached launch takes
+        :param command_latency: Seconds a shell command takes
+        :param command_output: Output of every shell command
+        """
+        self.spawn_latency = spawn_latency
+        self.command_latency = command_latency
+        self.command_output = command_output
+        self.spawned: List[List[str]] = []
+        self.commands: List[str] = []
+        self.backend_seconds = 0.0
+
+    def run_detached(self, command: List[str]) -> bool:
+        time.sleep(self.spawn_latency)
+        self.backend_seconds += self.spawn_latency
+        self.spawned.append(command)
+        return True
+
+    def capture(self, command: str, timeout: int = 10, limit: int = 0,
+                echo: Optional[Callable[[str], None]] = None) -> CommandResult:
+        time.sleep(self.command_latency)
+        self.backend_seconds += self.command_latency
+        self.commands.append(command)
+        return CommandResult(0, self.command_output, "")
+
+    async def capture_async(self, command: str, timeout: int = 10, limit: int = 0,
+                            echo: Optional[Callable[[str], None]] = None) -> CommandResult:
+        return self.capture(command, timeout, limit, echo)
+
+
+@contextmanager
+def stub_backends(stubs: Optional[StubBackends] = None) -> Iterator[StubBackends]:
+    """Patch ProcessExecutor with stubs for the duration of the block"""
+    stubs = stubs or StubBackends()
+    patched = {name: ProcessExecutor.__dict__[name] for name in ("run_detached", "capture", "capture_async")}
+    ProcessExecutor.run_detached = staticmethod(stubs.run_detached)
+    ProcessExecutor.capture = staticmethod(stubs.capture)
+    ProcessExecutor.capture_async = staticmethod(stubs.capture_async)
+    try:
+        yield stubs
+    finally:
+        for name, method in patched.items():
+            setattr(ProcessExecutor, name, method)
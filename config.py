@@ -1,8 +1,6 @@
 import os
 from dataclasses import dataclass
-from dotenv import load_dotenv
-
-load_dotenv()
+from typing import Optional, Tuple
 
 @dataclass
 class Config:
@@ -10,6 +8,7 @@ class Config:
 
     api_key: str
     model_name: str = "gemini-flash-latest"
+    fast_model_name: Optional[str] = "gemini-flash-lite-latest"
     system_instruction: str = (
         "You are Jarvis, a helpful desktop assistant for Kubuntu Linux"
         "Your job is to interpret user commands and call the appropriate system functions"
@@ -17,10 +16,60 @@ class Config:
         "Available system: Kubuntu (KDE Plasma desktop environment)"
     )
     command_timeout: int = 10
+    shell_output_limit: int = 16384
+    shell_echo: bool = False
+    shell_sessions: int = 0
+    tool_workers: int = 4
+    max_tool_rounds: int = 5
+    memory_enabled: bool = True
+    memory_token_budget: int = 4000
+    memory_recent_turns: int = 4
+    memory_result_chars: int = 500
+    fast_path: bool = True
+    stream: bool = True
+    complex_input_words: int = 20
+    escalate_without_call: bool = True
+    # USD per million input and output tokens, for cost reporting
+    model_price: Tuple[float, float] = (0.30, 2.50)
+    fast_model_price: Tuple[float, float] = (0.10, 0.40)
+    tool_top_k: int = 4
+    tool_always_include: Tuple[str, ...] = ("execute_shell_command",)
+    model_rpm: int = 0
+    model_tpm: int = 0
+    model_max_retries: int = 3
+    model_retry_base_delay: float = 0.5
+    model_retry_max_delay: float = 8.0
+    model_hedge: bool = False
+    model_hedge_percentile: float = 95
+    model_hedge_min_delay: float = 0.2
+    # Directories the file index covers, empty to disable locate_file
+    file_index_roots: Tuple[str, ...] = ("~",)
+    file_index_path: Optional[str] = None
+    app_index_path: Optional[str] = None
+    # Bound on cached read-only tool results, 0 to disable the cache
+    tool_cache_bytes: int = 1 << 20
+    # Share one run between identical commands arriving while it's in flight
+    coalesce_commands: bool = True
+    # Store the system instruction and tool declarations server-side, where the model supports it
+    context_cache: bool = True
+    context_cache_ttl: int = 3600
+    # Smaller prefixes aren't sent for caching, the API rejects them
+    context_cache_min_tokens: int = 1024
+    context_cache_max_entries: int = 8
+    trace_path: Optional[str] = None
+    metrics_textfile: Optional[str] = None
+    metrics_port: Optional[int] = None
+    # Where profiling reports go, commands faster than the threshold aren't written out
+    profile_dir: Optional[str] = None
+    profile_threshold_ms: float = 0.0
+    profile_top: int = 25
 
     @classmethod
     def from_env(cls) -> 'Config':
         """Create config from env vars"""
+        from dotenv import load_dotenv
+        load_dotenv()
+
         api_key = os.getenv("GEMINI_API_KEY")
         if not api_key:
             raise ValueError(
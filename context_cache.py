@@ -0,0 +1,257 @@
+import atexit
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Set, Tuple
+
+from config import Config
+from utils import lazy_import
+
+errors = lazy_import("google.genai.errors")
+types = lazy_import("google.genai.types")
+
+# Fraction of the TTL left at which a cache is extended
+REFRESH_FRACTION = 0.2
+# Seconds before creating a cache is tried again after a transient failure
+RETRY_DELAY = 60.0
+# Rough characters per token, as in memory.py
+CHARS_PER_TOKEN = 4
+
+# Status codes of a cache that's missing, expired or not allowed
+UNAVAILABLE_CODES = (403, 404)
+
+# (model, names of the declared tools)
+CacheKey = Tuple[str, Tuple[str, ...]]
+
+
+def cache_unavailable(error: Exception) -> bool:
+    """Whether a request failed because of its cache, rather than its content or quota"""
+    return isinstance(error, errors.APIError) and getattr(error, "code", None) in UNAVAILABLE_CODES
+
+
+@dataclass
+class _Entry:
+    name: str
+    expires: float
+    config: Any
+
+
+@dataclass
+class ContextCacheStats:
+    """Counters of server-side context caching"""
+
+    hits: int = 0
+    misses: int = 0
+    created: int = 0
+    refreshed: int = 0
+    failed: int = 0
+    invalidated: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class ContextCache:
+    """
+    Server-side cached content for the static prefix of requests
+
+    The system instruction and tool declarations are the same in every
+    request with the same tools, so they're stored once with
+    client.caches.create and requests refer to them by name. Caches are
+    created and extended in the background, requests go out uncached
+    until one is ready. Models or prefixes the API won't cache, e.g.
+    because they're below its minimum size, are remembered and skipped
+    """
+
+    def __init__(self, config: Config, client: Callable[[], Any]):
+        """
+        :param config: Application config
+        :param client: Returns the Gemini client, so it can stay lazy
+        """
+        self.config = config
+        self._client = client
+        self.ttl = config.context_cache_ttl
+        self.stats = ContextCacheStats()
+        self._entries: "OrderedDict[CacheKey, _Entry]" = OrderedDict()
+        self._pending: Set[CacheKey] = set()
+        self._retry_at: Dict[CacheKey, float] = {}
+        self._unsupported_keys: Set[CacheKey] = set()
+        self._unsupported_models: Set[str] = set()
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="jarvis-context-cache")
+        self._closing = False
+        atexit.register(self.close)
+
+    @staticmethod
+    def key(model: str, config: Any) -> CacheKey:
+        names = tuple(
+            declaration.name
+            for tool in config.tools or []
+            for declaration in tool.function_declarations or []
+        )
+        return model, names
+
+    def _prefix_tokens(self, config: Any) -> int:
+        chars = len(config.system_instruction or "")
+        chars += sum(len(tool.model_dump_json(exclude_none=True)) for tool in config.tools or [])
+        return chars // CHARS_PER_TOKEN
+
+    def apply(self, model: str, config: Any, prefix: Any = None) -> Any:
+        """
+        Config referring to the cached prefix if there's a cache for it
+
+        :param model: Model the request goes to, caches are per model
+        :param config: Config with the system instruction and tools
+        :param prefix: Config with the system instruction and tools to cache,
+            defaults to config. Passing a superset of config's tools, e.g.
+            all of them, lets requests declaring different tools share a cache
+        :return: Config with cached_content, or config itself
+        """
+        if config.cached_content or model in self._unsupported_models:
+            return config
+        prefix = config if prefix is None else prefix
+        key = self.key(model, prefix)
+        now = time.monotonic()
+        with self._lock:
+            if key in self._unsupported_keys:
+                return config
+            entry = self._entries.get(key)
+            if entry and now < entry.expires:
+                self._entries.move_to_end(key)
+                self.stats.hits += 1
+                if entry.expires - now < self.ttl * REFRESH_FRACTION:
+                    self._schedule(key, self._refresh, key, entry.name)
+                return entry.config
+
+            self.stats.misses += 1
+            if entry:
+                del self._entries[key]
+            if now < self._retry_at.get(key, 0.0):
+                return config
+        if self._prefix_tokens(prefix) < self.config.context_cache_min_tokens:
+            with self._lock:
+                self._unsupported_keys.add(key)
+            return config
+        with self._lock:
+            self._schedule(key, self._create, key, prefix, self._generation)
+        return config
+
+    def _schedule(self, key: CacheKey, fn: Callable, *args) -> None:
+        """Run fn on the worker unless something is already pending for key, lock held"""
+        if key in self._pending or self._closing:
+            return
+        self._pending.add(key)
+
+        def run() -> None:
+            try:
+                fn(*args)
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+
+        self._worker.submit(run)
+
+    def _create(self, key: CacheKey, config: Any, generation: int) -> None:
+        model = key[0]
+        try:
+            cached = self._client().caches.create(model=model, config=types.CreateCachedContentConfig(
+                system_instruction=config.system_instruction,
+                tools=config.tools,
+                ttl=f"{self.ttl}s",
+                display_name="jarvis-prefix"
+            ))
+        except Exception as e:
+            self._creation_failed(key, e)
+            return
+
+        with self._lock:
+            if generation != self._generation:
+                # Tools changed while the cache was being created
+                stale = cached.name
+            else:
+                stale = None
+                self._entries[key] = _Entry(
+                    cached.name,
+                    time.monotonic() + self.ttl,
+                    types.GenerateContentConfig(cached_content=cached.name)
+                )
+                self.stats.created += 1
+                while len(self._entries) > self.config.context_cache_max_entries:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._worker.submit(self._delete, evicted.name)
+        if stale:
+            self._delete(stale)
+
+    def _creation_failed(self, key: CacheKey, error: Exception) -> None:
+        with self._lock:
+            self.stats.failed += 1
+            code = getattr(error, "code", None) if isinstance(error, errors.APIError) else None
+            if code in UNAVAILABLE_CODES:
+                # The model or the API key can't use caching at all
+                self._unsupported_models.add(key[0])
+            elif code == 400:
+                # This prefix can't be cached, e.g. it's below the model's minimum size
+                self._unsupported_keys.add(key)
+            else:
+                self._retry_at[key] = time.monotonic() + RETRY_DELAY
+
+    def _refresh(self, key: CacheKey, name: str) -> None:
+        """Extend a cache before it expires"""
+        try:
+            self._client().caches.update(name=name, config=types.UpdateCachedContentConfig(ttl=f"{self.ttl}s"))
+        except Exception:
+            with self._lock:
+                self.stats.failed += 1
+                entry = self._entries.get(key)
+                if entry and entry.name == name:
+                    # Recreated on the next request
+                    del self._entries[key]
+            return
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry.name == name:
+                entry.expires = time.monotonic() + self.ttl
+                self.stats.refreshed += 1
+
+    def _delete(self, name: str) -> None:
+        try:
+            self._client().caches.delete(name=name)
+        except Exception:
+            # It expires on its own
+            pass
+
+    def discard(self, config: Any) -> None:
+        """Forget the cache a request failed with, e.g. one deleted on the server"""
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if entry.config is config:
+                    del self._entries[key]
+
+    def invalidate(self) -> None:
+        """Drop every cache, after the tool set changed"""
+        with self._lock:
+            self._generation += 1
+            entries = list(self._entries.values())
+            self._entries.clear()
+            self._unsupported_keys.clear()
+            self._retry_at.clear()
+            self.stats.invalidated += len(entries)
+            if self._closing:
+                return
+            for entry in entries:
+                self._worker.submit(self._delete, entry.name)
+
+    def close(self) -> None:
+        """Delete the caches so they stop accruing storage"""
+        with self._lock:
+            if self._closing:
+                return
+            self._closing = True
+            names = [entry.name for entry in self._entries.values()]
+            self._entries.clear()
+        for name in names:
+            self._delete(name)
+        self._worker.shutdown(wait=False)
@@ -0,0 +1,336 @@
+import bisect
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Directories never worth indexing
+DEFAULT_EXCLUDES = frozenset({
+    ".git", ".hg", ".svn", "node_modules", "__pycache__", ".venv", "venv", ".tox",
+    ".cache", ".npm", ".cargo", ".rustup", ".gradle", ".m2", ".Trash", "snap"
+})
+
+# Words in a query that say nothing about the file name
+_STOPWORDS = frozenset({"my", "the", "a", "an", "of", "for", "in", "on", "to", "file", "folder", "directory"})
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+DEFAULT_CACHE_PATH = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "jarvis", "file_index.json"
+)
+
+
+@dataclass
+class DirListing:
+    """Names in a directory as of its mtime"""
+
+    mtime: float
+    files: List[str]
+    dirs: List[str]
+
+
+@dataclass
+class RefreshStats:
+    """Work done by a refresh"""
+
+    dirs_listed: int = 0
+    dirs_reused: int = 0
+    entries: int = 0
+    seconds: float = 0.0
+
+
+@dataclass
+class _Lookup:
+    """Paths and the lowercase strings they're searched through"""
+
+    paths: List[str]
+    is_dir: bytearray
+    # Paths relative to their root
+    path_blob: str
+    path_starts: List[int]
+    name_blob: str
+    name_starts: List[int]
+
+
+def _joined(values: List[str]) -> Tuple[str, List[int]]:
+    """Lowercase values joined by newlines, and the offset each starts at"""
+    lowered = [value.lower() for value in values]
+    starts, offset = [], 0
+    for value in lowered:
+        starts.append(offset)
+        offset += len(value) + 1
+    return "\n".join(lowered), starts
+
+
+def _containing(blob: str, starts: List[int], term: str) -> List[int]:
+    """Indices of the lines of blob containing term"""
+    indices = []
+    pos = blob.find(term)
+    while pos != -1:
+        index = bisect.bisect_right(starts, pos) - 1
+        indices.append(index)
+        next_start = starts[index + 1] if index + 1 < len(starts) else len(blob)
+        pos = blob.find(term, next_start)
+    return indices
+
+
+class FileIndex:
+    """
+    Filename index of a few root directories
+
+    A directory is listed again only when its mtime changed, so a refresh
+    costs one stat per directory. Lookups scan one lowercase string of all
+    paths with str.find instead of walking the disk
+    """
+
+    def __init__(self, roots: Sequence[str], cache_path: Optional[str] = DEFAULT_CACHE_PATH,
+                 max_age: float = 30.0, include_hidden: bool = False, max_entries: int = 500_000):
+        """
+        :param roots: Directories to index, ~ is expanded
+        :param cache_path: File the index is persisted to, None to keep it in memory only
+        :param max_age: Seconds after which a lookup triggers a background refresh
+        :param include_hidden: Whether to index dot files and dot directories
+        :param max_entries: Stop indexing after this many entries
+        """
+        self.roots = [os.path.abspath(os.path.expanduser(root)) for root in roots]
+        self.cache_path = cache_path
+        self.max_age = max_age
+        self.include_hidden = include_hidden
+        self.max_entries = max_entries
+        self.last_refresh = 0.0
+        self.last_stats = RefreshStats()
+
+        self._listings: Dict[str, DirListing] = {}
+        self._lookup = _Lookup([], bytearray(), "", [], "", [])
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._ready = threading.Event()
+        self._started = False
+
+    def start(self) -> None:
+        """Load the persisted index and refresh it in the background"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._load_and_refresh, name="jarvis-file-index", daemon=True).start()
+
+    def _load_and_refresh(self) -> None:
+        try:
+            if self.load():
+                self._ready.set()
+            self.refresh()
+        finally:
+            self._ready.set()
+
+    def load(self) -> bool:
+        """Load the persisted index, return whether it was usable"""
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return False
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get("roots") != self.roots:
+            return False
+        listings = {path: DirListing(*listing) for path, listing in data.get("dirs", {}).items()}
+        self._install(listings)
+        return True
+
+    def save(self) -> None:
+        """Persist the index, replacing the file atomically"""
+        if not self.cache_path:
+            return
+        directory = os.path.dirname(self.cache_path)
+        os.makedirs(directory, exist_ok=True)
+        data = {
+            "roots": self.roots,
+            "dirs": {path: [listing.mtime, listing.files, listing.dirs] for path, listing in self._listings.items()}
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".file_index-")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp_path, self.cache_path)
+
+    def refresh(self) -> RefreshStats:
+        """Bring the index up to date, listing only directories that changed"""
+        with self._refresh_lock:
+            started = time.perf_counter()
+            stats = RefreshStats()
+            old = self._listings
+            listings: Dict[str, DirListing] = {}
+            pending = [root for root in self.roots if os.path.isdir(root)]
+            entries = 0
+
+            while pending and entries < self.max_entries:
+                directory = pending.pop()
+                try:
+                    mtime = os.stat(directory).st_mtime
+                except OSError:
+                    continue
+
+                listing = old.get(directory)
+                if listing and listing.mtime == mtime:
+                    stats.dirs_reused += 1
+                else:
+                    listing = self._list(directory, mtime)
+                    if listing is None:
+                        continue
+                    stats.dirs_listed += 1
+
+                listings[directory] = listing
+                entries += len(listing.files) + len(listing.dirs)
+                pending.extend(os.path.join(directory, name) for name in listing.dirs)
+
+            if stats.dirs_listed or len(listings) != len(old):
+                self._install(listings)
+            stats.entries = len(self._lookup.paths)
+            stats.seconds = time.perf_counter() - started
+            self.last_refresh = time.monotonic()
+            self.last_stats = stats
+            self._ready.set()
+
+            if stats.dirs_listed:
+                try:
+                    self.save()
+                except OSError:
+                    pass
+            return stats
+
+    def _list(self, directory: str, mtime: float) -> Optional[DirListing]:
+        files, dirs = [], []
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if not self.include_hidden and entry.name.startswith("."):
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in DEFAULT_EXCLUDES:
+                                dirs.append(entry.name)
+                        else:
+                            files.append(entry.name)
+                    except OSError:
+                        continue
+        except OSError:
+            return None
+        return DirListing(mtime, files, dirs)
+
+    def _install(self, listings: Dict[str, DirListing]) -> None:
+        """Rebuild the lookup arrays from directory listings and swap them in"""
+        paths, relative, names, is_dir = [], [], [], bytearray()
+        for directory, listing in listings.items():
+            # Words of the root itself would match every path under it
+            root = next((root for root in self.roots if directory.startswith(root)), "")
+            for name in listing.dirs + listing.files:
+                path = os.path.join(directory, name)
+                paths.append(path)
+                relative.append(path[len(root):])
+                names.append(name)
+            is_dir.extend([1] * len(listing.dirs) + [0] * len(listing.files))
+
+        lookup = _Lookup(paths, is_dir, *_joined(relative), *_joined(names))
+        with self._lock:
+            self._listings = listings
+            self._lookup = lookup
+
+    def _ensure_fresh(self) -> None:
+        """Wait for the first build, refresh in the background when stale"""
+        if not self._ready.is_set():
+            self.start()
+            self._ready.wait()
+        if time.monotonic() - self.last_refresh > self.max_age and not self._refresh_lock.locked():
+            threading.Thread(target=self.refresh, name="jarvis-file-index", daemon=True).start()
+
+    @staticmethod
+    def terms(query: str) -> List[str]:
+        """Words of a query worth matching"""
+        words = _WORD_RE.findall(query.lower())
+        return [word for word in words if word not in _STOPWORDS] or words
+
+    def search(self, query: str, limit: int = 10, kind: str = "any") -> List[str]:
+        """
+        Find paths matching a vague description
+
+        Every word of the query has to appear in the path. Names that equal
+        or start with the query rank first, then names containing the words,
+        then paths containing them. Without such matches, names holding the
+        query's letters in order are returned
+
+        :param query: E.g. "thesis draft"
+        :param limit: Max paths returned
+        :param kind: "file", "directory" or "any"
+        :return: Paths, best first
+        """
+        expanded = os.path.expanduser(query)
+        if os.path.isabs(expanded) and os.path.exists(expanded):
+            return [expanded]
+        terms = self.terms(query)
+        if not terms:
+            return []
+
+        self._ensure_fresh()
+        with self._lock:
+            lookup = self._lookup
+
+        wanted = {"file": 0, "directory": 1}.get(kind)
+        longest = max(terms, key=len)
+        # Names are far fewer matches to score than full paths, which only fill up a short list
+        scored = self._score(lookup, _containing(lookup.name_blob, lookup.name_starts, longest), terms, wanted)
+        if len(scored) < limit:
+            seen = {index for _, index in scored}
+            candidates = [
+                index for index in _containing(lookup.path_blob, lookup.path_starts, longest)
+                if index not in seen
+            ]
+            scored += self._score(lookup, candidates, terms, wanted)
+
+        if not scored:
+            return self._fuzzy(lookup, "".join(terms), wanted, limit)
+
+        scored.sort(key=lambda item: -item[0])
+        return [lookup.paths[index] for _, index in scored[:limit]]
+
+    @staticmethod
+    def _score(lookup: _Lookup, candidates: List[int], terms: List[str],
+               wanted: Optional[int]) -> List[Tuple[float, int]]:
+        phrase = " ".join(terms)
+        scored = []
+        for index in candidates:
+            if wanted is not None and lookup.is_dir[index] != wanted:
+                continue
+            start = lookup.path_starts[index]
+            end = lookup.path_starts[index + 1] - 1 if index + 1 < len(lookup.path_starts) else None
+            path = lookup.path_blob[start:end]
+            if not all(term in path for term in terms):
+                continue
+            name = os.path.basename(path)
+            stem = os.path.splitext(name)[0]
+            score = sum(3 if term in name else 1 for term in terms)
+            if stem == phrase or name == phrase:
+                score += 10
+            elif name.startswith(terms[0]):
+                score += 4
+            # Prefer shallow paths and short names
+            score -= path.count(os.sep) * 0.1 + len(name) * 0.01
+            scored.append((score, index))
+        return scored
+
+    @staticmethod
+    def _fuzzy(lookup: _Lookup, query: str, wanted: Optional[int], limit: int) -> List[str]:
+        """Names holding the letters of query in order, tightest matches first"""
+        regex = re.compile("[^\n]*?".join(re.escape(char) for char in query))
+        best: Dict[int, int] = {}
+        for match in regex.finditer(lookup.name_blob):
+            index = bisect.bisect_right(lookup.name_starts, match.start()) - 1
+            if wanted is not None and lookup.is_dir[index] != wanted:
+                continue
+            span = match.end() - match.start()
+            if span < best.get(index, span + 1):
+                best[index] = span
+        ranked = sorted(best, key=lambda index: (best[index], len(lookup.paths[index])))
+        return [lookup.paths[index] for index in ranked[:limit]]
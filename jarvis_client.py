@@ -0,0 +1,72 @@
+"""
+Thin client for the Jarvis daemon, fast enough to bind to a hotkey
+
+    python jarvis_client.py open browser
+    echo "what time is it" | python jarvis_client.py
+"""
+import argparse
+import socket
+import sys
+
+from protocol import ProtocolError, default_socket_path, recv_frame, send_frame
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command-line arguments"""
+    parser = argparse.ArgumentParser(description="Send a command to the Jarvis daemon")
+    parser.add_argument("command", nargs="*", help="Command to send, read from stdin if not given")
+    parser.add_argument("--socket", default=default_socket_path(), help="Daemon socket")
+    parser.add_argument(
+        "--no-stream", action="store_true",
+        help="Wait for the whole response instead of printing it as it arrives"
+    )
+    parser.add_argument("--ping", action="store_true", help="Check that the daemon is running")
+    return parser.parse_args()
+
+
+def main() -> None:
+    """Client entry point"""
+    args = parse_args()
+    if args.ping:
+        request = {"op": "ping"}
+    else:
+        command = " ".join(args.command) or sys.stdin.read().strip()
+        if not command:
+            print("No command given")
+            sys.exit(2)
+        request = {"op": "command", "command": command, "stream": not args.no_stream}
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(args.socket)
+    except (FileNotFoundError, ConnectionRefusedError):
+        print(f"Jarvis daemon is not running on {args.socket}, start it with: python jarvisd.py")
+        sys.exit(1)
+
+    with sock:
+        try:
+            send_frame(sock, request)
+            while True:
+                response = recv_frame(sock)
+                if response is None:
+                    print("\nDaemon closed the connection")
+                    sys.exit(1)
+                if "error" in response:
+                    print(f"Error: {response['error']}")
+                    sys.exit(1)
+                if "pong" in response:
+                    print(f"Jarvis daemon is running ({response['clients']} client(s) connected)", end="")
+                if "chunk" in response:
+                    print(response["chunk"], end="", flush=True)
+                if "reply" in response:
+                    print(response["reply"], end="")
+                if response.get("done"):
+                    print()
+                    break
+        except (ProtocolError, ConnectionError) as e:
+            print(f"Error talking to the daemon: {e}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Jarvis daemon: keeps one warmed agent alive and serves commands over a Unix socket
+
+    python jarvisd.py &
+    python jarvis_client.py open browser
+"""
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import sys
+from typing import Any, Dict
+
+from agent import AsyncJarvisAgent
+from config import Config
+from protocol import ProtocolError, default_socket_path, read_frame, write_frame
+from tracing import configure_tracing
+
+
+class JarvisDaemon:
+    """
+    Serves an agent to any number of concurrent clients
+
+    Requests are frames like {"op": "command", "command": "...", "stream": true}.
+    A plain command is answered with {"reply": "...", "done": true}, a streamed
+    one with {"chunk": "..."} frames followed by {"done": true}. Errors are
+    sent as {"error": "...", "done": true}. An "id" in a request is echoed in
+    its responses
+    """
+
+    def __init__(self, agent: AsyncJarvisAgent, socket_path: str):
+        self.agent = agent
+        self.socket_path = socket_path
+        self.clients = 0
+
+    def _prepare_socket(self) -> None:
+        """Remove a stale socket left by a daemon that died, refuse to start over a live one"""
+        if not os.path.exists(self.socket_path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.unlink(self.socket_path)
+            return
+        finally:
+            probe.close()
+        raise RuntimeError(f"Jarvis daemon is already running on {self.socket_path}")
+
+    async def serve(self) -> None:
+        """Accept clients until SIGINT or SIGTERM"""
+        self._prepare_socket()
+        old_umask = os.umask(0o077)
+        try:
+            server = await asyncio.start_unix_server(self._handle_client, path=self.socket_path)
+        finally:
+            os.umask(old_umask)
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+
+        print(f"Jarvis daemon listening on {self.socket_path}")
+        try:
+            async with server:
+                await stop.wait()
+        finally:
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Answer requests from one connection in order"""
+        self.clients += 1
+        try:
+            while True:
+                request = await read_frame(reader)
+                if request is None:
+                    break
+                await self._handle_request(request, writer)
+        except ProtocolError as e:
+            await self._send(writer, {"error": str(e), "done": True})
+        except ConnectionError:
+            pass
+        finally:
+            self.clients -= 1
+            writer.close()
+
+    async def _handle_request(self, request: Dict[str, Any], writer: asyncio.StreamWriter) -> None:
+        tag = {"id": request["id"]} if "id" in request else {}
+        op = request.get("op", "command")
+
+        if op == "ping":
+            await self._send(writer, {
+                **tag, "pong": True, "clients": self.clients,
+                "coalesced": {
+                    "commands": self.agent.flights.stats.as_dict(),
+                    "tools": self.agent.tool_registry.flights.stats.as_dict()
+                },
+                "done": True
+            })
+            return
+        if op != "command":
+            await self._send(writer, {**tag, "error": f"Unknown op: {op}", "done": True})
+            return
+
+        command = str(request.get("command") or "").strip()
+        if not command:
+            await self._send(writer, {**tag, "error": "Empty command", "done": True})
+            return
+
+        if request.get("stream"):
+            async for chunk in self.agent.process_command_stream(command):
+                await self._send(writer, {**tag, "chunk": chunk})
+            await self._send(writer, {**tag, "done": True})
+        else:
+            reply = await self.agent.process_command(command)
+            await self._send(writer, {**tag, "reply": reply, "done": True})
+
+    @staticmethod
+    async def _send(writer: asyncio.StreamWriter, message: Dict[str, Any]) -> None:
+        await write_frame(writer, message)
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command-line arguments"""
+    parser = argparse.ArgumentParser(description="Jarvis daemon")
+    parser.add_argument(
+        "--socket", default=default_socket_path(),
+        help="Unix socket to listen on"
+    )
+    parser.add_argument(
+        "--trace", metavar="FILE",
+        help="Append a span for every command stage to FILE as JSON lines"
+    )
+    parser.add_argument(
+        "--metrics-port", type=int, metavar="PORT",
+        help="Serve Prometheus metrics on localhost:PORT/metrics"
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    """Daemon entry point"""
+    args = parse_args()
+    try:
+        config = Config.from_env()
+        configure_tracing(args.trace, port=args.metrics_port)
+
+        # Clients share the agent, one client's turns mustn't end up in another's prompts
+        config.memory_enabled = False
+        agent = AsyncJarvisAgent(config)
+        agent.warm_up()
+        asyncio.run(JarvisDaemon(agent, args.socket).serve())
+    except ValueError as e:
+        print(f"Configuration error: {e}")
+        sys.exit(1)
+    except RuntimeError as e:
+        print(str(e))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+import os
+import select
+import signal
+import subprocess
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Any, Deque, Dict, List, Optional
+
+# Finished processes remembered for queries
+HISTORY_SIZE = 100
+
+# Seconds between waitpid sweeps when neither pidfds nor SIGCHLD can wake the reaper
+_POLL_INTERVAL = 1.0
+
+
+@dataclass
+class LaunchedProcess:
+    """A process Jarvis started, and how it ended"""
+
+    pid: int
+    command: List[str]
+    started: float = field(default_factory=time.time)
+    spawn_ms: float = 0.0
+    exit_code: Optional[int] = None
+    ended: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self.ended is None
+
+    @property
+    def lifetime(self) -> float:
+        """Seconds from start to exit, or until now if still running"""
+        return (self.ended or time.time()) - self.started
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data.update(running=self.running, lifetime=round(self.lifetime, 3))
+        return data
+
+
+@dataclass
+class LauncherStats:
+    """Spawn counts and latency"""
+
+    spawned: int = 0
+    failed: int = 0
+    reaped: int = 0
+    spawn_ms_total: float = 0.0
+
+    @property
+    def mean_spawn_ms(self) -> float:
+        return self.spawn_ms_total / self.spawned if self.spawned else 0.0
+
+
+class ProcessLauncher:
+    """
+    Starts detached programs and reaps them when they exit
+
+    Programs are started with posix_spawnp in a new session, which skips
+    the fork of the whole interpreter that Popen does. A reaper thread
+    waits on a pidfd per child, or on SIGCHLD where pidfds aren't
+    available, and collects only the children it started, so waits in
+    subprocess and asyncio are left alone
+    """
+
+    def __init__(self, history_size: int = HISTORY_SIZE):
+        self.stats = LauncherStats()
+        self.finished: Deque[LaunchedProcess] = deque(maxlen=history_size)
+        self._running: Dict[int, LaunchedProcess] = {}
+        self._pidfds: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._wake_read, self._wake_write = os.pipe()
+        os.set_blocking(self._wake_write, False)
+        self._use_pidfd = hasattr(os, "pidfd_open")
+        self._thread: Optional[threading.Thread] = None
+        if not self._use_pidfd:
+            self._install_sigchld()
+
+    def _install_sigchld(self) -> None:
+        """Wake the reaper on SIGCHLD, chaining to any existing handler"""
+        if threading.current_thread() is not threading.main_thread():
+            # Handlers can only be set from the main thread, the reaper sweeps periodically instead
+            return
+        previous = signal.getsignal(signal.SIGCHLD)
+
+        def handler(signum, frame):
+            self._wake()
+            if callable(previous):
+                previous(signum, frame)
+
+        signal.signal(signal.SIGCHLD, handler)
+
+    def _wake(self) -> None:
+        try:
+            os.write(self._wake_write, b"\0")
+        except BlockingIOError:
+            # Already woken
+            pass
+
+    def spawn(self, command: List[str]) -> Optional[LaunchedProcess]:
+        """
+        Start a program detached from Jarvis, with stdio on /dev/null
+
+        :param command: Program and arguments
+        :return: The tracked process, or None if it couldn't be started
+        """
+        if not command:
+            return None
+        started = time.perf_counter()
+        try:
+            pid = self._posix_spawn(command)
+        except NotImplementedError:
+            pid = self._popen(command)
+        except OSError:
+            pid = None
+        spawn_ms = (time.perf_counter() - started) * 1000
+
+        with self._lock:
+            if pid is None:
+                self.stats.failed += 1
+                return None
+            self.stats.spawned += 1
+            self.stats.spawn_ms_total += spawn_ms
+            process = self._running[pid] = LaunchedProcess(pid, list(command), spawn_ms=spawn_ms)
+            if self._use_pidfd:
+                try:
+                    self._pidfds[pid] = os.pidfd_open(pid)
+                except OSError:
+                    # Kernel without pidfd support, fall back to periodic sweeps
+                    self._use_pidfd = False
+        self._ensure_reaper()
+        self._wake()
+        return process
+
+    @staticmethod
+    def _posix_spawn(command: List[str]) -> int:
+        devnull = os.devnull
+        return os.posix_spawnp(command[0], command, os.environ, setsid=True, file_actions=[
+            (os.POSIX_SPAWN_OPEN, 0, devnull, os.O_RDONLY, 0),
+            (os.POSIX_SPAWN_OPEN, 1, devnull, os.O_WRONLY, 0),
+            (os.POSIX_SPAWN_OPEN, 2, devnull, os.O_WRONLY, 0)
+        ])
+
+    @staticmethod
+    def _popen(command: List[str]) -> Optional[int]:
+        """Fallback for platforms without posix_spawn setsid support"""
+        try:
+            process = subprocess.Popen(
+                command,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True
+            )
+        except OSError:
+            return None
+        # The reaper waits on the pid, Popen mustn't warn about it never being waited on
+        process.returncode = 0
+        return process.pid
+
+    def _ensure_reaper(self) -> None:
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._reap_loop, name="jarvis-reaper", daemon=True)
+            self._thread.start()
+
+    def _reap_loop(self) -> None:
+        poller = select.poll()
+        poller.register(self._wake_read, select.POLLIN)
+        registered = set()
+        while True:
+            with self._lock:
+                pidfds = dict(self._pidfds)
+            for pid, fd in pidfds.items():
+                if fd not in registered:
+                    poller.register(fd, select.POLLIN)
+                    registered.add(fd)
+
+            timeout = None if self._use_pidfd else _POLL_INTERVAL * 1000
+            events = poller.poll(timeout)
+            for fd, _ in events:
+                if fd == self._wake_read:
+                    os.read(self._wake_read, 4096)
+
+            ready_fds = {fd for fd, _ in events}
+            with self._lock:
+                candidates = [
+                    pid for pid in self._running
+                    if not self._use_pidfd or self._pidfds.get(pid) in ready_fds or pid not in self._pidfds
+                ]
+            for pid in candidates:
+                fd = self._reap(pid)
+                if fd is None:
+                    continue
+                if fd in registered:
+                    poller.unregister(fd)
+                    registered.discard(fd)
+                os.close(fd)
+
+    def _reap(self, pid: int) -> Optional[int]:
+        """
+        Collect pid if it exited
+
+        :return: Its pidfd to close if it was collected, else None
+        """
+        try:
+            waited, status = os.waitpid(pid, os.WNOHANG)
+        except ChildProcessError:
+            # Someone else waited on it, the exit code is lost
+            waited, status = pid, None
+        if waited == 0:
+            return None
+
+        with self._lock:
+            process = self._running.pop(pid, None)
+            fd = self._pidfds.pop(pid, None)
+            if process:
+                process.ended = time.time()
+                process.exit_code = os.waitstatus_to_exitcode(status) if status is not None else None
+                self.finished.append(process)
+                self.stats.reaped += 1
+        return fd
+
+    def get(self, pid: int) -> Optional[LaunchedProcess]:
+        """A process started by Jarvis, running or recently finished"""
+        with self._lock:
+            if pid in self._running:
+                return self._running[pid]
+            return next((process for process in reversed(self.finished) if process.pid == pid), None)
+
+    def processes(self, running_only: bool = False) -> List[LaunchedProcess]:
+        """Processes started by Jarvis, the running ones first"""
+        with self._lock:
+            running = list(self._running.values())
+            return running if running_only else running + list(reversed(self.finished))
+
+
+_launcher: Optional[ProcessLauncher] = None
+_launcher_lock = threading.Lock()
+
+
+def get_launcher() -> ProcessLauncher:
+    """Shared launcher, created on first use"""
+    global _launcher
+    with _launcher_lock:
+        if _launcher is None:
+            _launcher = ProcessLauncher()
+        return _launcher
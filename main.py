@@ -1,14 +1,52 @@
+import time
+
+# Taken before the other imports so startup profiling covers them
+_STARTED = time.perf_counter()
+
+import argparse
 import sys
+from typing import List, Optional, Tuple
 
-from agent import JarvisAgent
+from agent import AsyncJarvisAgent, JarvisAgent
 from config import Config
+from profiler import CommandProfiler
+from tracing import configure_tracing
+
+
+class StartupProfile:
+    """Records how long each startup phase takes until the prompt appears"""
+
+    def __init__(self, started: float = _STARTED):
+        self.started = started
+        self.last = started
+        self.phases: List[Tuple[str, float]] = []
+
+    def mark(self, phase: str) -> None:
+        """Finish a phase"""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def report(self) -> None:
+        """Print phase durations and total time to prompt"""
+        print("Startup profile:", file=sys.stderr)
+        for phase, duration in self.phases:
+            print(f"  {phase:<12} {duration * 1000:7.1f} ms", file=sys.stderr)
+        print(f"  {'to prompt':<12} {(self.last - self.started) * 1000:7.1f} ms", file=sys.stderr)
 
 
 class JarvisInterface:
     """Command-line interface for Jarvis"""
 
-    def __init__(self, agent: JarvisAgent):
+    def __init__(self, agent: JarvisAgent, show_timings: bool = False,
+                 startup_profile: Optional[StartupProfile] = None,
+                 profiler: Optional[CommandProfiler] = None):
         self.agent = agent
+        self.show_timings = show_timings
+        self.startup_profile = startup_profile
+        self.profiler = profiler or CommandProfiler(
+            agent.config.profile_dir, agent.config.profile_threshold_ms, agent.config.profile_top
+        )
 
     @staticmethod
     def print_welcome() -> None:
@@ -20,12 +58,70 @@ class JarvisInterface:
         print("  -  'search for python tutorials'")
         print("  -  'what time is it?'")
         print("  -  'open my documents folder'")
+        print("Type ':profile on|cpu|memory|off' to profile commands")
         print("Type 'exit' or 'quit' to close\n")
 
+    def handle_profile_command(self, args: List[str]) -> str:
+        """
+        Handle ':profile [on|cpu|memory|off] [threshold ms]'
+
+        :param args: Words after ':profile'
+        :return: Message for the user
+        """
+        if not args:
+            return self.profiler.status()
+        mode = args[0].lower()
+        if len(args) > 1:
+            try:
+                self.profiler.threshold_ms = float(args[1])
+            except ValueError:
+                return f"Invalid threshold '{args[1]}', expected milliseconds"
+
+        if mode == "off":
+            self.profiler.stop()
+        elif mode in ("on", "all"):
+            self.profiler.start(cpu=True, memory=True)
+        elif mode == "cpu":
+            self.profiler.start(cpu=True, memory=False)
+        elif mode == "memory":
+            self.profiler.start(cpu=False, memory=True)
+        else:
+            return "Usage: :profile [on|cpu|memory|off] [threshold ms]"
+        return self.profiler.status()
+
+    def process(self, user_input: str) -> None:
+        """Run a command and print the response, under the profiler if it's on"""
+        captured = len(self.profiler.results)
+        with self.profiler.capture(user_input):
+            if self.agent.config.stream:
+                self.print_stream(user_input)
+            else:
+                response = self.agent.process_command(user_input)
+                print(f"\n Jarvis> {response}")
+        if len(self.profiler.results) > captured:
+            print(f" [profile written to {self.profiler.results[-1].report_path}]")
+
+    def print_stream(self, user_input: str) -> None:
+        """Print the agent's response as it arrives"""
+        started = False
+        for chunk in self.agent.process_command_stream(user_input):
+            if not started:
+                print("\n Jarvis> ", end="")
+                started = True
+            print(chunk, end="", flush=True)
+        print()
+
+        if self.show_timings and self.agent.last_ttft is not None:
+            print(f" [first token in {self.agent.last_ttft * 1000:.0f} ms]")
+
     def run(self) -> None:
         """Run the main interaction loop"""
         self.print_welcome()
 
+        if self.startup_profile:
+            self.startup_profile.mark("welcome")
+            self.startup_profile.report()
+
         while True:
             try:
                 user_input = input("\n You> ").strip()
@@ -37,8 +133,11 @@ class JarvisInterface:
                     print("Goodbye!")
                     break
 
-                response = self.agent.process_command(user_input)
-                print(f"\n Jarvis> {response}")
+                if user_input.startswith(":profile"):
+                    print(self.handle_profile_command(user_input.split()[1:]))
+                    continue
+
+                self.process(user_input)
 
             except (KeyboardInterrupt, EOFError):
                 print("\n\nGoodbye!")
@@ -46,12 +145,101 @@ class JarvisInterface:
             except Exception as e:
                 print(f"\n Error: {str(e)}")
 
+def parse_args() -> argparse.Namespace:
+    """Parse command-line arguments"""
+    parser = argparse.ArgumentParser(description="Jarvis desktop assistant")
+    parser.add_argument(
+        "--no-stream", action="store_true",
+        help="Wait for the whole response instead of printing it as it arrives"
+    )
+    parser.add_argument(
+        "--timings", action="store_true",
+        help="Report time to first token after each streamed response"
+    )
+    parser.add_argument(
+        "--startup-profile", action="store_true",
+        help="Report how long each startup phase took before the prompt appears"
+    )
+    parser.add_argument(
+        "--trace", metavar="FILE",
+        help="Append a span for every command stage to FILE as JSON lines"
+    )
+    parser.add_argument(
+        "--metrics-file", metavar="FILE",
+        help="Rewrite Prometheus metrics to FILE after every command"
+    )
+    parser.add_argument(
+        "--metrics-port", type=int, metavar="PORT",
+        help="Serve Prometheus metrics on localhost:PORT/metrics"
+    )
+    parser.add_argument(
+        "--profile", choices=["all", "cpu", "memory"],
+        help="Profile every command with cProfile and/or tracemalloc, same as ':profile' at the prompt"
+    )
+    parser.add_argument(
+        "--profile-dir", metavar="DIR",
+        help="Directory for .pstats files and profile reports (default ~/.cache/jarvis/profiles)"
+    )
+    parser.add_argument(
+        "--profile-threshold", type=float, metavar="MS",
+        help="Only write profiles of commands slower than MS milliseconds"
+    )
+    parser.add_argument(
+        "--batch", metavar="FILE",
+        help="Process commands from a JSONL or text file (- for stdin) and print results as JSONL"
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=4,
+        help="Commands processed at once in batch mode"
+    )
+    parser.add_argument(
+        "--unordered", action="store_true",
+        help="Print batch results as they finish instead of in input order"
+    )
+    return parser.parse_args()
+
 def main() -> None:
     """Main entry point"""
+    profile = StartupProfile()
+    profile.mark("imports")
+    args = parse_args()
     try:
         config = Config.from_env()
+        config.stream = not args.no_stream
+        config.trace_path = args.trace
+        config.metrics_textfile = args.metrics_file
+        config.metrics_port = args.metrics_port
+        config.profile_dir = args.profile_dir
+        if args.profile_threshold is not None:
+            config.profile_threshold_ms = args.profile_threshold
+        configure_tracing(config.trace_path, config.metrics_textfile, config.metrics_port)
+        profile.mark("config")
+
+        if args.batch:
+            from batch import run_batch
+
+            # Batch commands are independent of each other
+            config.memory_enabled = False
+            profiler = CommandProfiler(config.profile_dir, config.profile_threshold_ms, config.profile_top)
+            if args.profile:
+                # Commands overlap, so the batch is profiled as a whole
+                profiler.start(cpu=args.profile != "memory", memory=args.profile != "cpu")
+            with profiler.capture(f"batch {args.batch}"):
+                run_batch(AsyncJarvisAgent(config), args.batch, args.concurrency, not args.unordered)
+            return
+
         agent = JarvisAgent(config)
-        interface = JarvisInterface(agent)
+        # Let the SDK load while the user types the first command
+        agent.warm_up()
+        profile.mark("agent")
+
+        interface = JarvisInterface(
+            agent,
+            show_timings=args.timings,
+            startup_profile=profile if args.startup_profile else None
+        )
+        if args.profile:
+            interface.profiler.start(cpu=args.profile != "memory", memory=args.profile != "cpu")
         interface.run()
     except ValueError as e:
         print(f"Configuration error: {e}")
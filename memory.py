@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import json
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List
+
+from utils import lazy_import
+
+types = lazy_import("google.genai.types")
+
+
+# Rough size of a token in characters, good enough to keep prompts bounded
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(content: types.Content) -> int:
+    """Estimate the number of tokens of a content"""
+    chars = 0
+    for part in content.parts or []:
+        if part.text:
+            chars += len(part.text)
+        if part.function_call:
+            chars += len(part.function_call.name or "")
+            chars += len(json.dumps(part.function_call.args or {}, default=str))
+        if part.function_response:
+            chars += len(part.function_response.name or "")
+            chars += len(json.dumps(part.function_response.response or {}, default=str))
+    return chars // CHARS_PER_TOKEN + 1
+
+
+@dataclass
+class Turn:
+    """One user command with everything exchanged while handling it"""
+
+    contents: List[types.Content]
+    user_text: str
+    reply_text: str
+    tokens: int = 0
+    compacted: bool = False
+
+
+@dataclass
+class MemoryStats:
+    """Counters describing the memory's size over time"""
+
+    turns: int = 0
+    compactions: int = 0
+    summarized_turns: int = 0
+    prompt_tokens: Deque[int] = field(default_factory=lambda: deque(maxlen=1000))
+
+
+class ConversationMemory:
+    """Bounded conversation history with token-budgeted compaction"""
+
+    def __init__(self, token_budget: int = 4000, recent_turns: int = 4, result_chars: int = 500):
+        """
+        :param token_budget: Max estimated tokens of history sent with a request
+        :param recent_turns: Number of latest turns always kept verbatim
+        :param result_chars: Max length of function results in older turns
+        """
+        self.token_budget = token_budget
+        self.recent_turns = recent_turns
+        self.result_chars = result_chars
+        self._turns: List[Turn] = []
+        self._summary: List[str] = []
+        self._summary_tokens = 0
+        self._tokens = 0
+        self._lock = threading.Lock()
+        self.stats = MemoryStats()
+
+    @property
+    def tokens(self) -> int:
+        """Estimated tokens of the history"""
+        return self._tokens + self._summary_tokens
+
+    def history(self) -> List[types.Content]:
+        """Get the contents to send before a new user input"""
+        with self._lock:
+            contents = []
+            if self._summary:
+                contents.append(types.Content(role="user", parts=[types.Part(
+                    text="Summary of earlier conversation:\n" + "\n".join(self._summary)
+                )]))
+            for turn in self._turns:
+                contents.extend(turn.contents)
+            return contents
+
+    def record_prompt(self, contents: List[types.Content]) -> int:
+        """
+        Record the size of a prompt about to be sent
+
+        :param contents: Full request contents
+        :return: Estimated prompt tokens
+        """
+        tokens = sum(estimate_tokens(content) for content in contents)
+        self.stats.prompt_tokens.append(tokens)
+        return tokens
+
+    def add_turn(self, user_text: str, contents: List[types.Content], reply_text: str) -> None:
+        """
+        Store a finished turn and compact older ones if over budget
+
+        :param user_text: User's input
+        :param contents: Contents exchanged during the turn, starting with the user input
+        :param reply_text: Final reply shown to the user
+        """
+        contents = list(contents)
+        if reply_text:
+            contents.append(types.Content(role="model", parts=[types.Part(text=reply_text)]))
+        turn = Turn(
+            contents=contents,
+            user_text=user_text,
+            reply_text=reply_text,
+            tokens=sum(estimate_tokens(content) for content in contents)
+        )
+
+        with self._lock:
+            self._turns.append(turn)
+            self._tokens += turn.tokens
+            self.stats.turns += 1
+            if self.tokens > self.token_budget:
+                self._compact()
+
+    def clear(self) -> None:
+        """Forget the whole conversation"""
+        with self._lock:
+            self._turns = []
+            self._summary = []
+            self._summary_tokens = 0
+            self._tokens = 0
+
+    def _compact(self) -> None:
+        """Shrink history until it fits the token budget"""
+        self.stats.compactions += 1
+        older = self._turns[:-self.recent_turns] if self.recent_turns else self._turns
+
+        # Large function results go first, they're rarely needed verbatim later.
+        # Older turns are truncated before recent ones
+        recent = self._turns[len(older):]
+        for turn in older + recent:
+            if not turn.compacted:
+                self._truncate_results(turn)
+            if self.tokens <= self.token_budget:
+                return
+
+        # Then fold the oldest turns into the summary
+        while self.tokens > self.token_budget and len(self._turns) > self.recent_turns:
+            turn = self._turns.pop(0)
+            self._tokens -= turn.tokens
+            self._add_summary_line(f"- User: {self._shorten(turn.user_text)} "
+                                   f"| Jarvis: {self._shorten(turn.reply_text)}")
+            self.stats.summarized_turns += 1
+
+        # Finally drop the oldest summary lines
+        while self.tokens > self.token_budget and self._summary:
+            line = self._summary.pop(0)
+            self._summary_tokens -= len(line) // CHARS_PER_TOKEN + 1
+
+    def _truncate_results(self, turn: Turn) -> None:
+        """Replace long function results of a turn with their beginning"""
+        contents = []
+        for content in turn.contents:
+            parts = []
+            for part in content.parts or []:
+                if part.function_response:
+                    response = self._truncate_response(part.function_response.response or {})
+                    part = types.Part(function_response=types.FunctionResponse(
+                        id=part.function_response.id,
+                        name=part.function_response.name,
+                        response=response
+                    ))
+                parts.append(part)
+            contents.append(types.Content(role=content.role, parts=parts))
+
+        tokens = sum(estimate_tokens(content) for content in contents)
+        self._tokens += tokens - turn.tokens
+        turn.contents = contents
+        turn.tokens = tokens
+        turn.compacted = True
+
+    def _truncate_response(self, response: Dict[str, Any]) -> Dict[str, Any]:
+        """Truncate string values of a function response"""
+        truncated = {}
+        for key, value in response.items():
+            text = value if isinstance(value, str) else json.dumps(value, default=str)
+            if len(text) > self.result_chars:
+                value = f"{text[:self.result_chars]}... [{len(text) - self.result_chars} chars omitted]"
+            truncated[key] = value
+        return truncated
+
+    def _add_summary_line(self, line: str) -> None:
+        self._summary.append(line)
+        self._summary_tokens += len(line) // CHARS_PER_TOKEN + 1
+
+    @staticmethod
+    def _shorten(text: str, limit: int = 160) -> str:
+        text = " ".join(text.split())
+        return text if len(text) <= limit else text[:limit] + "..."
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get memory counters and recent prompt sizes"""
+        with self._lock:
+            return {
+                "turns": len(self._turns),
+                "summary_lines": len(self._summary),
+                "history_tokens": self.tokens,
+                "total_turns": self.stats.turns,
+                "compactions": self.stats.compactions,
+                "summarized_turns": self.stats.summarized_turns,
+                "prompt_tokens": list(self.stats.prompt_tokens)
+            }
@@ -0,0 +1,372 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from dataclasses import asdict, dataclass
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from config import Config
+from memory import estimate_tokens
+from utils import lazy_import
+
+errors = lazy_import("google.genai.errors")
+httpx = lazy_import("httpx")
+
+# HTTP statuses worth another attempt: timeouts, rate limits and server errors
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether a failed model call may succeed if repeated"""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    if isinstance(error, errors.APIError):
+        return error.code in RETRYABLE_STATUS
+    return isinstance(error, httpx.TransportError)
+
+
+class TokenBucket:
+    """Bucket refilled continuously with per_minute tokens a minute"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        """
+        Take tokens, going into debt if there aren't enough
+
+        :return: Seconds to wait until the debt is paid off
+        """
+        with self._lock:
+            self._refill()
+            self.tokens -= min(amount, self.capacity)
+            return max(0.0, -self.tokens / self.rate)
+
+    def try_take(self, amount: float) -> bool:
+        """Take tokens only if they're available right now"""
+        with self._lock:
+            self._refill()
+            if self.tokens < min(amount, self.capacity):
+                return False
+            self.tokens -= min(amount, self.capacity)
+            return True
+
+    def refund(self, amount: float) -> None:
+        """Give back tokens, or take more if amount is negative"""
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limits, 0 meaning unlimited"""
+
+    def __init__(self, rpm: int = 0, tpm: int = 0):
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+
+    def reserve(self, tokens: int) -> float:
+        """Reserve one request of tokens, return seconds to wait before sending it"""
+        delay = 0.0
+        if self.requests:
+            delay = self.requests.reserve(1)
+        if self.tokens:
+            delay = max(delay, self.tokens.reserve(tokens))
+        return delay
+
+    def try_reserve(self, tokens: int) -> bool:
+        """Reserve a request only if it can be sent right away"""
+        if self.requests and not self.requests.try_take(1):
+            return False
+        if self.tokens and not self.tokens.try_take(tokens):
+            if self.requests:
+                self.requests.refund(1)
+            return False
+        return True
+
+    def settle(self, estimated: int, actual: Optional[int]) -> None:
+        """Correct a reservation with the token count the API reported"""
+        if self.tokens and actual is not None:
+            self.tokens.refund(estimated - actual)
+
+
+class LatencyTracker:
+    """Recent call latencies, for deriving the hedging delay"""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self.samples = deque(maxlen=size)
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self.samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Nearest-rank percentile, None until there are enough samples"""
+        with self._lock:
+            if len(self.samples) < self.min_samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[max(1, math.ceil(pct / 100 * len(ordered))) - 1]
+
+
+@dataclass
+class ModelCallStats:
+    """Counters of the model-call layer"""
+
+    calls: int = 0
+    attempts: int = 0
+    retries: int = 0
+    failures: int = 0
+    hedges: int = 0
+    hedge_wins: int = 0
+    throttled_seconds: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class ModelCaller:
+    """
+    Sends model requests with rate limiting, retries and optional hedging
+
+    Retryable errors (429, 5xx, connection errors) are retried with
+    jittered exponential backoff. With hedging on, a duplicate request is
+    sent if the first hasn't answered within the recent p95 latency, and
+    whichever answers first wins. Streams are retried only until their
+    first chunk arrives and are never hedged
+    """
+
+    def __init__(self, config: Config, client: Callable[[], Any]):
+        """
+        :param config: Application config
+        :param client: Returns the Gemini client, so it can stay lazy
+        """
+        self.config = config
+        self._client = client
+        self.limiter = RateLimiter(config.model_rpm, config.model_tpm)
+        self.latencies = LatencyTracker()
+        self.stats = ModelCallStats()
+        self._stats_lock = threading.Lock()
+        self._random = random.Random()
+
+    def _count(self, name: str, amount: float = 1) -> None:
+        with self._stats_lock:
+            setattr(self.stats, name, getattr(self.stats, name) + amount)
+
+    @staticmethod
+    def _estimate(contents: List[Any]) -> int:
+        """Rough prompt size for the tokens-per-minute limit"""
+        return sum(estimate_tokens(content) for content in contents if hasattr(content, "parts"))
+
+    def _settle(self, estimate: int, response) -> None:
+        usage = getattr(response, "usage_metadata", None)
+        self.limiter.settle(estimate, usage.total_token_count if usage else None)
+
+    def _throttle_delay(self, estimate: int, span) -> float:
+        delay = self.limiter.reserve(estimate)
+        if delay:
+            self._count("throttled_seconds", delay)
+            if span is not None:
+                span.set(throttled_ms=delay * 1000)
+        return delay
+
+    def _retry_delay(self, attempt: int, error: Exception, span) -> float:
+        """Count a failed attempt, return the backoff before the next one or re-raise"""
+        if attempt >= self.config.model_max_retries or not is_retryable(error):
+            self._count("failures")
+            raise error
+        self._count("retries")
+        if span is not None:
+            span.set(retries=attempt + 1)
+        ceiling = min(self.config.model_retry_max_delay, self.config.model_retry_base_delay * 2 ** attempt)
+        return self._random.uniform(0, ceiling)
+
+    def _hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, None if hedging is off or there's no history yet"""
+        if not self.config.model_hedge:
+            return None
+        delay = self.latencies.percentile(self.config.model_hedge_percentile)
+        return None if delay is None else max(delay, self.config.model_hedge_min_delay)
+
+    def generate(self, model: str, contents: List[Any], config: Any, span=None):
+        """Blocking generate_content through the limiter, retries and hedging"""
+        self._count("calls")
+        estimate = self._estimate(contents)
+        call = partial(self._client().models.generate_content, model=model, contents=contents, config=config)
+
+        for attempt in range(self.config.model_max_retries + 1):
+            time.sleep(self._throttle_delay(estimate, span))
+            self._count("attempts")
+            started = time.perf_counter()
+            try:
+                delay = self._hedge_delay()
+                response = call() if delay is None else self._hedged(call, delay, estimate, span)
+            except Exception as e:
+                time.sleep(self._retry_delay(attempt, e, span))
+                continue
+            self.latencies.record(time.perf_counter() - started)
+            self._settle(estimate, response)
+            return response
+
+    @staticmethod
+    def _start(call: Callable[[], Any]) -> Future:
+        """
+        Run a call in a thread of its own
+
+        Blocking calls can't be cancelled, so the losing request of a hedge
+        runs on without holding up a worker later calls need
+        """
+        future: Future = Future()
+
+        def run() -> None:
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(call())
+                except BaseException as e:
+                    future.set_exception(e)
+
+        threading.Thread(target=run, name="jarvis-hedge", daemon=True).start()
+        return future
+
+    def _hedged(self, call: Callable[[], Any], delay: float, estimate: int, span):
+        primary = self._start(call)
+        done, _ = wait([primary], timeout=delay)
+        if done or not self.limiter.try_reserve(estimate):
+            return primary.result()
+
+        self._count("hedges")
+        if span is not None:
+            span.set(hedged=True)
+        hedge = self._start(call)
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self._count("hedge_wins")
+                        if span is not None:
+                            span.set(hedge_won=True)
+                    # Both requests sent the same prompt, the winner's usage settles both reservations
+                    self._settle(estimate, future.result())
+                    return future.result()
+        return primary.result()
+
+    async def generate_async(self, model: str, contents: List[Any], config: Any, span=None):
+        """Async counterpart of generate"""
+        self._count("calls")
+        estimate = self._estimate(contents)
+        call = partial(self._client().aio.models.generate_content, model=model, contents=contents, config=config)
+
+        for attempt in range(self.config.model_max_retries + 1):
+            await asyncio.sleep(self._throttle_delay(estimate, span))
+            self._count("attempts")
+            started = time.perf_counter()
+            try:
+                delay = self._hedge_delay()
+                response = await (call() if delay is None else self._hedged_async(call, delay, estimate, span))
+            except Exception as e:
+                await asyncio.sleep(self._retry_delay(attempt, e, span))
+                continue
+            self.latencies.record(time.perf_counter() - started)
+            self._settle(estimate, response)
+            return response
+
+    async def _hedged_async(self, call: Callable[[], Any], delay: float, estimate: int, span):
+        primary = asyncio.ensure_future(call())
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done or not self.limiter.try_reserve(estimate):
+            return await primary
+
+        self._count("hedges")
+        if span is not None:
+            span.set(hedged=True)
+        hedge = asyncio.ensure_future(call())
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self._count("hedge_wins")
+                            if span is not None:
+                                span.set(hedge_won=True)
+                        self._settle(estimate, task.result())
+                        return task.result()
+            return primary.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stream(self, model: str, contents: List[Any], config: Any, span=None) -> Iterator:
+        """Streaming generate_content, retried while no chunk has arrived yet"""
+        self._count("calls")
+        estimate = self._estimate(contents)
+
+        for attempt in range(self.config.model_max_retries + 1):
+            time.sleep(self._throttle_delay(estimate, span))
+            self._count("attempts")
+            try:
+                chunks = iter(self._client().models.generate_content_stream(
+                    model=model, contents=contents, config=config
+                ))
+                first = next(chunks, None)
+            except Exception as e:
+                time.sleep(self._retry_delay(attempt, e, span))
+                continue
+
+            last = first
+            if first is not None:
+                yield first
+            for chunk in chunks:
+                last = chunk
+                yield chunk
+            self._settle(estimate, last)
+            return
+
+    async def stream_async(self, model: str, contents: List[Any], config: Any, span=None) -> AsyncIterator:
+        """Async counterpart of stream"""
+        self._count("calls")
+        estimate = self._estimate(contents)
+
+        for attempt in range(self.config.model_max_retries + 1):
+            await asyncio.sleep(self._throttle_delay(estimate, span))
+            self._count("attempts")
+            try:
+                stream = await self._client().aio.models.generate_content_stream(
+                    model=model, contents=contents, config=config
+                )
+                chunks = stream.__aiter__()
+                try:
+                    first = await chunks.__anext__()
+                except StopAsyncIteration:
+                    first = None
+            except Exception as e:
+                await asyncio.sleep(self._retry_delay(attempt, e, span))
+                continue
+
+            last = first
+            if first is not None:
+                yield first
+            async for chunk in chunks:
+                last = chunk
+                yield chunk
+            self._settle(estimate, last)
+            return
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import io
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator, List, Optional
+
+from utils import lazy_import
+
+# Only loaded once profiling is turned on, they'd add to every startup
+cProfile = lazy_import("cProfile")
+pstats = lazy_import("pstats")
+tracemalloc = lazy_import("tracemalloc")
+
+DEFAULT_PROFILE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "jarvis", "profiles"
+)
+
+# Frames tracemalloc keeps per allocation, enough to tell callers of shared helpers apart
+TRACEBACK_FRAMES = 5
+
+# Allocations by imports and unknown frames, left out of the reports
+IGNORED_ALLOCATIONS = ("<frozen importlib._bootstrap>", "<frozen importlib._bootstrap_external>", "<unknown>")
+
+
+@dataclass
+class ProfileResult:
+    """Files written for a profiled command"""
+
+    command: str
+    duration_ms: float
+    report_path: str
+    pstats_path: Optional[str] = None
+
+
+class CommandProfiler:
+    """
+    Profiles commands with cProfile and tracemalloc
+
+    Every command runs under the enabled profilers, but files are only
+    written for commands slower than the threshold: a .pstats file for
+    snakeviz or pstats, and a text report with the top functions by
+    cumulative time and the top allocation growth since the previous
+    command. Allocations are diffed against the snapshot taken after the
+    previous command, so memory a command keeps alive shows up in its report
+    """
+
+    def __init__(self, directory: Optional[str] = None, threshold_ms: float = 0.0, top: int = 25):
+        """
+        :param directory: Directory reports are written to
+        :param threshold_ms: Commands finishing faster aren't written out
+        :param top: Functions and allocation sites listed per report
+        """
+        self.directory = directory or DEFAULT_PROFILE_DIR
+        self.threshold_ms = threshold_ms
+        self.top = top
+        self.cpu = False
+        self.memory = False
+        self.results: List[ProfileResult] = []
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._started_tracemalloc = False
+        self._count = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.cpu or self.memory
+
+    def start(self, cpu: bool = True, memory: bool = True) -> None:
+        """Profile the following commands"""
+        self.cpu = cpu
+        if memory and not self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(TRACEBACK_FRAMES)
+                self._started_tracemalloc = True
+            self._baseline = self._snapshot()
+        elif not memory:
+            self._stop_memory()
+        self.memory = memory
+
+    def stop(self) -> None:
+        """Stop profiling"""
+        self.cpu = False
+        self._stop_memory()
+
+    def _stop_memory(self) -> None:
+        self.memory = False
+        self._baseline = None
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    @staticmethod
+    def _snapshot() -> tracemalloc.Snapshot:
+        # Along with the profilers' own allocations
+        modules = (tracemalloc.__file__, cProfile.__file__, pstats.__file__)
+        filters = [tracemalloc.Filter(False, name) for name in IGNORED_ALLOCATIONS + modules]
+        return tracemalloc.take_snapshot().filter_traces(filters)
+
+    def status(self) -> str:
+        """One line describing what's being profiled"""
+        if not self.enabled:
+            return "Profiling is off"
+        kinds = " and ".join(kind for kind, on in (("cpu", self.cpu), ("memory", self.memory)) if on)
+        return (
+            f"Profiling {kinds} of commands slower than {self.threshold_ms:.0f} ms "
+            f"into {self.directory}, {len(self.results)} captured"
+        )
+
+    @contextmanager
+    def capture(self, command: str) -> Iterator[None]:
+        """
+        Profile the command run in the block
+
+        cProfile only sees the calling thread, so work handed to other
+        threads shows up as time spent waiting for it
+
+        :param command: Command text, used in the report and file name
+        """
+        if not self.enabled:
+            yield
+            return
+
+        profile = None
+        if self.cpu:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Another profiler is active, e.g. under a debugger
+                profile = None
+        if self.memory:
+            tracemalloc.reset_peak()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            if profile:
+                profile.disable()
+            snapshot = self._snapshot() if self.memory else None
+            try:
+                if duration_ms >= self.threshold_ms:
+                    self._write(command, duration_ms, profile, snapshot)
+            except OSError as e:
+                print(f"Failed to write profile: {e}", file=sys.stderr)
+            finally:
+                if snapshot:
+                    self._baseline = snapshot
+
+    def _write(self, command: str, duration_ms: float, profile: Optional[cProfile.Profile],
+               snapshot: Optional[tracemalloc.Snapshot]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        self._count += 1
+        slug = re.sub(r"[^a-z0-9]+", "-", command.lower()).strip("-")[:40] or "command"
+        base = os.path.join(self.directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{self._count:03d}-{slug}")
+
+        report = io.StringIO()
+        report.write(f"Command: {command}\nDuration: {duration_ms:.1f} ms\n")
+        pstats_path = None
+        if profile:
+            pstats_path = base + ".pstats"
+            profile.dump_stats(pstats_path)
+            report.write(f"\nTop {self.top} functions by cumulative time:\n")
+            stats = pstats.Stats(profile, stream=report)
+            stats.strip_dirs().sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+        if snapshot:
+            current, peak = tracemalloc.get_traced_memory()
+            report.write(
+                f"\nTraced memory: {current / 1024:.1f} KiB, "
+                f"peak during command {peak / 1024:.1f} KiB\n"
+            )
+            if self._baseline:
+                report.write(f"\nTop {self.top} allocation changes since the previous command:\n")
+                for diff in snapshot.compare_to(self._baseline, "lineno")[:self.top]:
+                    report.write(f"{diff}\n")
+
+        report_path = base + ".txt"
+        with open(report_path, "w", encoding="utf-8") as f:
+            f.write(report.getvalue())
+        self.results.append(ProfileResult(command, duration_ms, report_path, pstats_path))
@@ -0,0 +1,108 @@
+import json
+import os
+import socket
+import struct
+import tempfile
+from typing import Any, Dict, Optional
+
+# Every frame is a 4-byte big-endian payload length followed by a UTF-8 JSON object
+HEADER = struct.Struct("!I")
+MAX_FRAME_SIZE = 1 << 20
+
+
+class ProtocolError(Exception):
+    """Malformed or oversized frame"""
+
+
+def default_socket_path() -> str:
+    """Socket path in the user's runtime dir, or a per-user path in the temp dir"""
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, "jarvis.sock")
+    return os.path.join(tempfile.gettempdir(), f"jarvis-{os.getuid()}.sock")
+
+
+def encode_frame(message: Dict[str, Any]) -> bytes:
+    """Serialize a message into a frame"""
+    payload = json.dumps(message, separators=(",", ":")).encode()
+    if len(payload) > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Frame of {len(payload)} bytes is over the {MAX_FRAME_SIZE} byte limit")
+    return HEADER.pack(len(payload)) + payload
+
+
+def decode_payload(payload: bytes) -> Dict[str, Any]:
+    """Parse a frame payload into a message"""
+    try:
+        message = json.loads(payload)
+    except ValueError as e:
+        raise ProtocolError(f"Invalid frame: {e}")
+    if not isinstance(message, dict):
+        raise ProtocolError("Frame is not a JSON object")
+    return message
+
+
+def _frame_size(header: bytes) -> int:
+    (size,) = HEADER.unpack(header)
+    if size > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Frame of {size} bytes is over the {MAX_FRAME_SIZE} byte limit")
+    return size
+
+
+def send_frame(sock: socket.socket, message: Dict[str, Any]) -> None:
+    """Send a message over a blocking socket"""
+    sock.sendall(encode_frame(message))
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> Optional[bytes]:
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            if data:
+                raise ProtocolError("Connection closed mid-frame")
+            return None
+        data += chunk
+    return bytes(data)
+
+
+def recv_frame(sock: socket.socket) -> Optional[Dict[str, Any]]:
+    """
+    Receive a message from a blocking socket
+
+    :return: Message, or None if the peer closed the connection
+    """
+    header = _recv_exactly(sock, HEADER.size)
+    if header is None:
+        return None
+    payload = _recv_exactly(sock, _frame_size(header))
+    if payload is None:
+        raise ProtocolError("Connection closed mid-frame")
+    return decode_payload(payload)
+
+
+async def read_frame(reader) -> Optional[Dict[str, Any]]:
+    """
+    Read a message from an asyncio stream
+
+    :return: Message, or None if the peer closed the connection
+    """
+    # Only the daemon needs asyncio, the client stays light without it
+    import asyncio
+
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if e.partial:
+            raise ProtocolError("Connection closed mid-frame")
+        return None
+    try:
+        payload = await reader.readexactly(_frame_size(header))
+    except asyncio.IncompleteReadError:
+        raise ProtocolError("Connection closed mid-frame")
+    return decode_payload(payload)
+
+
+async def write_frame(writer, message: Dict[str, Any]) -> None:
+    """Write a message to an asyncio stream"""
+    writer.write(encode_frame(message))
+    await writer.drain()
@@ -0,0 +1,214 @@
+import json
+import os
+import shlex
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+# Characters that make a shell command more than one plain program call
+_SHELL_SYNTAX = set(";&|<>$`(){}*?[]\n\\")
+
+# Read-only programs whose output only changes with the system's configuration.
+# Ones depending on the environment or PATH, like which or printenv, aren't
+# included: a persistent shell session can change them between calls
+STABLE_COMMANDS = frozenset({
+    "lsb_release", "whoami", "id", "groups", "nproc", "arch", "lscpu", "locale"
+})
+# Flags of hostname that only print
+HOSTNAME_READ_FLAGS = frozenset({
+    "-s", "--short", "-f", "--fqdn", "--long", "-d", "--domain", "-i", "--ip-address",
+    "-I", "--all-ip-addresses", "-a", "--alias", "-A", "--all-fqdns", "-y", "--yp", "--nis"
+})
+# Read-only programs whose output depends on the paths they're given. Only the
+# paths' own mtimes are checked, so programs reading whole subtrees like du
+# and tree aren't included
+PATH_COMMANDS = frozenset({
+    "ls", "cat", "head", "wc", "file", "stat", "readlink", "realpath"
+})
+# Pseudo filesystems whose contents change without their mtimes changing
+VOLATILE_ROOTS = ("/proc", "/sys", "/dev")
+STABLE_TTL = 300.0
+PATH_TTL = 60.0
+
+
+@dataclass
+class CachePolicy:
+    """How long a tool result may be reused, and the paths whose changes invalidate it"""
+
+    ttl: float
+    paths: Tuple[str, ...] = ()
+
+
+def read_only_policy(command: str, relative_paths: bool = True) -> Optional[CachePolicy]:
+    """
+    Cache policy of a shell command known to only read
+
+    :param command: Shell command
+    :param relative_paths: Whether relative paths resolve the same every time.
+        False for persistent shell sessions, whose working dir may change
+    :return: Policy, or None if the command may write or isn't recognized
+    """
+    if _SHELL_SYNTAX & set(command):
+        return None
+    try:
+        argv = shlex.split(command)
+    except ValueError:
+        return None
+    if not argv:
+        return None
+
+    program = os.path.basename(argv[0])
+    if program in STABLE_COMMANDS or _reads_configuration(program, argv[1:]):
+        return CachePolicy(STABLE_TTL)
+    if program not in PATH_COMMANDS:
+        return None
+
+    if program == "ls" and any(_is_recursive_flag(arg) for arg in argv[1:]):
+        return None
+    paths = [os.path.expanduser(arg) for arg in argv[1:] if not arg.startswith("-")]
+    if program == "ls" and not paths:
+        paths = ["."]
+    if not paths or (not relative_paths and not all(os.path.isabs(path) for path in paths)):
+        return None
+    if any(_is_volatile(os.path.realpath(path)) for path in paths):
+        return None
+    return CachePolicy(PATH_TTL, tuple(os.path.abspath(path) for path in paths))
+
+
+def _reads_configuration(program: str, args: List[str]) -> bool:
+    """Whether a command that can also change the configuration only reports it"""
+    positional = [arg for arg in args if not arg.startswith("-")]
+    if program == "uname":
+        return not positional
+    if program == "hostname":
+        # 'hostname NAME', -F and -b set the hostname
+        return all(arg in HOSTNAME_READ_FLAGS for arg in args)
+    if program == "hostnamectl":
+        return positional in ([], ["status"])
+    return False
+
+
+def _is_recursive_flag(arg: str) -> bool:
+    """ls -R, also combined with other short flags"""
+    return arg == "--recursive" or (arg.startswith("-") and not arg.startswith("--") and "R" in arg)
+
+
+def _is_volatile(path: str) -> bool:
+    return any(path == root or path.startswith(root + os.sep) for root in VOLATILE_ROOTS)
+
+
+def _mtime(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+@dataclass
+class _Entry:
+    result: str
+    expires: float
+    mtimes: Tuple[Tuple[str, Optional[int]], ...]
+    size: int
+
+
+@dataclass
+class CacheStats:
+    """Result cache counters"""
+
+    hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    expired: int = 0
+    invalidated: int = 0
+    evicted: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), "hit_rate": round(self.hit_rate, 3)}
+
+
+class ResultCache:
+    """
+    LRU cache of tool results with a TTL per entry and a total size bound
+
+    Entries may be tied to paths. The paths' mtimes are taken before the
+    tool runs and compared on lookup, so a directory listing is dropped
+    as soon as an entry is added to or removed from the directory
+    """
+
+    def __init__(self, max_bytes: int = 1 << 20):
+        """
+        :param max_bytes: Bound on the summed size of cached results
+        """
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.stats = CacheStats()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(name: str, kwargs: Dict[str, Any]) -> str:
+        """Tool name and normalized arguments"""
+        normalized = {
+            param: value.strip() if isinstance(value, str) else value
+            for param, value in kwargs.items() if value is not None
+        }
+        return name + json.dumps(normalized, sort_keys=True, default=str)
+
+    @staticmethod
+    def snapshot(paths: Tuple[str, ...]) -> Tuple[Tuple[str, Optional[int]], ...]:
+        """mtimes of paths, to be taken before the tool runs"""
+        return tuple((path, _mtime(path)) for path in paths)
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached result, None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats.misses += 1
+                return None
+            if time.monotonic() >= entry.expires:
+                self.stats.expired += 1
+            elif any(_mtime(path) != mtime for path, mtime in entry.mtimes):
+                self.stats.invalidated += 1
+            else:
+                self._entries.move_to_end(key)
+                self.stats.hits += 1
+                return entry.result
+            self._remove(key)
+            self.stats.misses += 1
+            return None
+
+    def put(self, key: str, result: str, policy: CachePolicy,
+            mtimes: Tuple[Tuple[str, Optional[int]], ...] = ()) -> None:
+        """Store a result, evicting the least recently used ones past the size bound"""
+        size = len(key) + len(result)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(result, time.monotonic() + policy.ttl, mtimes, size)
+            self.size += size
+            self.stats.stores += 1
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.stats.evicted += 1
+
+    def _remove(self, key: str) -> None:
+        self.size -= self._entries.pop(key).size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,110 @@
+import re
+from typing import Any, Dict, List, Optional, Pattern, Tuple
+
+from tools.registry import ToolRegistry
+
+# Fillers stripped from the input before matching, e.g. "hey jarvis, please ..."
+_PREFIX_RE = re.compile(
+    r"^(?:(?:hey|ok|okay)\s+)?(?:jarvis\b[\s,]*)?(?:please\s+|(?:can|could|would) you\s+)*",
+    re.IGNORECASE
+)
+_SUFFIX_RE = re.compile(r"(?:[\s,]+please)?[\s.!?]*$", re.IGNORECASE)
+_SPACE_RE = re.compile(r"\s+")
+
+
+class IntentRouter:
+    """Answers common commands locally by matching them to tool patterns"""
+
+    def __init__(self, tool_registry: ToolRegistry):
+        self.tool_registry = tool_registry
+        self._routes: Optional[List[Tuple[Pattern, str, Dict[str, Any]]]] = None
+        self.hits = 0
+        self.misses = 0
+        self.tool_hits: Dict[str, int] = {}
+
+    def rebuild(self) -> None:
+        """Compile intent patterns of all registered tools"""
+        routes = []
+        for tool in self.tool_registry.get_tools():
+            for pattern, args in tool.intent_patterns:
+                routes.append((re.compile(pattern, re.IGNORECASE), tool.name, args))
+        self._routes = routes
+
+    @staticmethod
+    def normalize(user_input: str) -> str:
+        """Strip fillers, punctuation and repeated whitespace from input"""
+        text = _SPACE_RE.sub(" ", user_input).strip()
+        text = _PREFIX_RE.sub("", text)
+        text = _SUFFIX_RE.sub("", text)
+        return text.strip()
+
+    def match(self, user_input: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        Find a tool call for the input
+
+        :param user_input: User's natural language command
+        :return: Tuple of (tool name, arguments) or None if nothing matched
+        """
+        if self._routes is None:
+            self.rebuild()
+
+        text = self.normalize(user_input)
+        for regex, tool_name, args in self._routes:
+            match = regex.fullmatch(text)
+            if match:
+                kwargs = dict(args)
+                kwargs.update({k: v for k, v in match.groupdict().items() if v is not None})
+                return tool_name, kwargs
+        return None
+
+    def _resolve(self, user_input: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Match the input and update counters"""
+        matched = self.match(user_input)
+        if not matched:
+            self.misses += 1
+            return None
+
+        tool_name, kwargs = matched
+        self.hits += 1
+        self.tool_hits[tool_name] = self.tool_hits.get(tool_name, 0) + 1
+        print(f"[Executing: {tool_name}({kwargs})]")
+        return matched
+
+    def route(self, user_input: str) -> Optional[str]:
+        """
+        Execute the matching tool directly
+
+        :param user_input: User's natural language command
+        :return: Tool result, or None if the model should handle the input
+        """
+        matched = self._resolve(user_input)
+        if not matched:
+            return None
+        tool_name, kwargs = matched
+        result = self.tool_registry.execute(tool_name, **kwargs)
+        return self.tool_registry.render_responses([matched], [result]) or result
+
+    async def route_async(self, user_input: str) -> Optional[str]:
+        """Async counterpart of route"""
+        matched = self._resolve(user_input)
+        if not matched:
+            return None
+        tool_name, kwargs = matched
+        result = await self.tool_registry.execute_async(tool_name, **kwargs)
+        return self.tool_registry.render_responses([matched], [result]) or result
+
+    def reset_stats(self) -> None:
+        """Zero hit and miss counters"""
+        self.hits = 0
+        self.misses = 0
+        self.tool_hits = {}
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit and miss counters"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "tool_hits": dict(self.tool_hits)
+        }
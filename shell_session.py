@@ -0,0 +1,174 @@
+import atexit
+import codecs
+import os
+import queue
+import re
+import selectors
+import shlex
+import signal
+import subprocess
+import threading
+import time
+from typing import Callable, List, Optional
+
+from utils import DEFAULT_OUTPUT_LIMIT, CommandResult, OutputBuffer
+
+_READ_SIZE = 65536
+
+
+class ShellSession:
+    """Long-lived bash process that runs commands framed by an exit-code sentinel"""
+
+    def __init__(self, output_limit: int = DEFAULT_OUTPUT_LIMIT):
+        self.output_limit = output_limit
+        self._marker = f"__JARVIS_DONE_{os.urandom(16).hex()}__"
+        self._sentinel = re.compile(rb"\n" + self._marker.encode() + rb"(\d+)\n")
+        self._process: Optional[subprocess.Popen] = None
+        self.commands_run = 0
+        self.respawns = 0
+
+    @property
+    def alive(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def _spawn(self) -> None:
+        """Start a fresh bash process"""
+        if self._process is not None:
+            self.respawns += 1
+        self._process = subprocess.Popen(
+            ["bash", "--noprofile", "--norc"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            bufsize=0,
+            start_new_session=True
+        )
+
+    def kill(self) -> None:
+        """Kill the shell and everything it started"""
+        if self._process is None:
+            return
+        try:
+            os.killpg(self._process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        self._process.wait()
+        self._process.stdin.close()
+        self._process.stdout.close()
+
+    def run(self, command: str, timeout: int = 10,
+            echo: Optional[Callable[[str], None]] = None) -> CommandResult:
+        """
+        Run a command in the session, keeping its cwd and environment
+
+        On timeout the session is killed and respawned by the next command
+
+        :param command: Shell command string
+        :param timeout: Timeout in seconds
+        :param echo: Optional callback receiving output text as it arrives
+        :return: Captured result, stderr is merged into stdout
+        """
+        if not self.alive:
+            self._spawn()
+
+        # eval keeps syntax errors from killing the session, /dev/null keeps the
+        # command from reading the framing of the next one
+        framed = (
+            f"eval {shlex.quote(command)} 2>&1 </dev/null; "
+            f"printf '\\n{self._marker}%d\\n' $?\n"
+        )
+        self._process.stdin.write(framed.encode())
+        self.commands_run += 1
+
+        buffer = OutputBuffer(self.output_limit)
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        pending = b""
+        keep = len(self._marker) + 24
+        deadline = time.monotonic() + timeout
+        returncode = None
+
+        def emit(data: bytes) -> None:
+            buffer.write(data)
+            if echo and data:
+                echo(decoder.decode(data))
+
+        with selectors.DefaultSelector() as selector:
+            selector.register(self._process.stdout, selectors.EVENT_READ)
+            while returncode is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not selector.select(remaining):
+                    self.kill()
+                    emit(pending)
+                    return CommandResult(None, buffer.getvalue(), "", buffer.dropped, timed_out=True)
+
+                data = os.read(self._process.stdout.fileno(), _READ_SIZE)
+                if not data:
+                    # The command exited the shell
+                    emit(pending)
+                    returncode = self._process.wait()
+                    self.kill()
+                    break
+
+                pending += data
+                match = self._sentinel.search(pending)
+                if match:
+                    emit(pending[:match.start()])
+                    returncode = int(match.group(1))
+                elif len(pending) > keep:
+                    emit(pending[:-keep])
+                    pending = pending[-keep:]
+
+        return CommandResult(returncode, buffer.getvalue(), "", buffer.dropped)
+
+
+class ShellSessionPool:
+    """Small pool of shell sessions shared by concurrent commands"""
+
+    def __init__(self, size: int = 2, output_limit: int = DEFAULT_OUTPUT_LIMIT):
+        """
+        :param size: Max number of sessions
+        :param output_limit: Max bytes of output kept per command
+        """
+        self.size = size
+        self.output_limit = output_limit
+        # Last used session is handed out first, so sequential commands share state
+        self._idle: "queue.LifoQueue[ShellSession]" = queue.LifoQueue()
+        self._sessions: List[ShellSession] = []
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def _acquire(self) -> ShellSession:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._sessions) < self.size:
+                session = ShellSession(self.output_limit)
+                self._sessions.append(session)
+                return session
+        return self._idle.get()
+
+    def run(self, command: str, timeout: int = 10,
+            echo: Optional[Callable[[str], None]] = None) -> CommandResult:
+        """Run a command in an idle session, waiting for one if all are busy"""
+        session = self._acquire()
+        try:
+            return session.run(command, timeout, echo)
+        finally:
+            self._idle.put(session)
+
+    def close(self) -> None:
+        """Kill all sessions"""
+        with self._lock:
+            for session in self._sessions:
+                session.kill()
+
+    def stats(self) -> dict:
+        """Get session counters"""
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "commands": sum(session.commands_run for session in self._sessions),
+                "respawns": sum(session.respawns for session in self._sessions)
+            }
@@ -0,0 +1,120 @@
+import asyncio
+import threading
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+@dataclass
+class FlightStats:
+    """How many calls were answered by another call's execution"""
+
+    calls: int = 0
+    executions: int = 0
+    coalesced: int = 0
+    shared_errors: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class _Call:
+    """An execution in progress and its outcome"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces identical calls in flight into one execution
+
+    The first caller for a key runs the function. Callers arriving with
+    the same key before it finishes wait and get the same result, or have
+    the same exception raised. Nothing is remembered once the call
+    returns, that's what the result cache is for
+    """
+
+    def __init__(self):
+        self.stats = FlightStats()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._tasks: Dict[Tuple[int, Hashable], asyncio.Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run fn, or wait for the identical call already running
+
+        :param key: Identity of the call
+        :param fn: Function to run if no identical call is in flight
+        :return: Result, and whether it was shared from another call
+        """
+        with self._lock:
+            self.stats.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.stats.executions += 1
+            else:
+                call.waiters += 1
+                self.stats.coalesced += 1
+
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                    if call.error is not None:
+                        self.stats.shared_errors += call.waiters
+                call.done.set()
+        else:
+            call.done.wait()
+
+        if call.error is not None:
+            raise call.error
+        return call.result, not leader
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Async counterpart of do
+
+        The execution runs as its own task, so a waiter being cancelled
+        doesn't cancel it for the others
+        """
+        loop = asyncio.get_running_loop()
+        # Futures belong to one event loop, calls on different loops don't coalesce
+        task_key = (id(loop), key)
+        with self._lock:
+            self.stats.calls += 1
+            task = self._tasks.get(task_key)
+            leader = task is None
+            if leader:
+                task = self._tasks[task_key] = asyncio.ensure_future(fn())
+                task.add_done_callback(lambda done: self._finish(task_key, done))
+                self.stats.executions += 1
+            else:
+                self.stats.coalesced += 1
+
+        try:
+            result = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            if not leader:
+                with self._lock:
+                    self.stats.shared_errors += 1
+            raise
+        return result, not leader
+
+    def _finish(self, task_key: Tuple[int, Hashable], task: asyncio.Future) -> None:
+        with self._lock:
+            self._tasks.pop(task_key, None)
+        if not task.cancelled():
+            # Mark the exception retrieved in case every waiter was cancelled
+            task.exception()
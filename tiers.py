@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import re
+import threading
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import Config
+from tools.registry import ToolRegistry
+
+# Phrases suggesting a request needs reasoning rather than a single tool call
+_COMPLEX_RE = re.compile(
+    r"\b(?:why|explain|compare|difference|analy[sz]e|summari[sz]e|plan|debug|write (?:a|an|me)|"
+    r"step by step|and then|after that|if .+ then)\b",
+    re.IGNORECASE
+)
+
+
+@dataclass
+class TierStats:
+    """Latency, tokens and cost of one model"""
+
+    calls: int = 0
+    seconds: float = 0.0
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+    cost: float = 0.0
+
+    @property
+    def mean_latency(self) -> float:
+        return self.seconds / self.calls if self.calls else 0.0
+
+
+class ModelTiers:
+    """
+    Chooses between a fast model and a capable one
+
+    The fast model picks tools and phrases follow-ups. Requests that look
+    complex start on the capable model, and a fast response without a
+    valid function call is retried there
+    """
+
+    def __init__(self, config: Config, tool_registry: ToolRegistry):
+        self.config = config
+        self.tool_registry = tool_registry
+        self.capable = config.model_name
+        self.fast = config.fast_model_name or config.model_name
+        self.escalations = 0
+        self.stats: Dict[str, TierStats] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.fast != self.capable
+
+    def is_complex(self, user_input: str) -> bool:
+        """Whether the input looks like it needs the capable model"""
+        return (
+            len(user_input.split()) > self.config.complex_input_words
+            or bool(_COMPLEX_RE.search(user_input))
+        )
+
+    def initial_model(self, user_input: str) -> str:
+        """Model for the first request of a command"""
+        if not self.enabled or self.is_complex(user_input):
+            return self.capable
+        return self.fast
+
+    def valid_call(self, name: str, args: Dict[str, Any], tool_names: Optional[Tuple[str, ...]]) -> bool:
+        """Whether a function call names a declared tool and has valid arguments"""
+        if tool_names is not None and name not in tool_names:
+            return False
+        tool = self.tool_registry.get(name)
+        if not tool:
+            return False
+        validator = self.tool_registry.validator(tool)
+        fixed, problems = validator.validate(args)
+        return not problems and all(fixed.get(param) != "" for param in validator.required)
+
+    def should_escalate(self, model: str, calls: List[Tuple[str, Dict[str, Any]]],
+                        tool_names: Optional[Tuple[str, ...]]) -> bool:
+        """Whether a response of model should be retried on the capable model"""
+        if model == self.capable:
+            return False
+        if not calls:
+            return self.config.escalate_without_call
+        return not all(self.valid_call(name, args, tool_names) for name, args in calls)
+
+    def record(self, model: str, seconds: float, response) -> None:
+        """Add a finished call to the stats of its model"""
+        usage = getattr(response, "usage_metadata", None)
+        prompt = (usage.prompt_token_count or 0) if usage else 0
+        output = (usage.candidates_token_count or 0) if usage else 0
+        input_price, output_price = (
+            self.config.fast_model_price if model == self.fast and self.enabled else self.config.model_price
+        )
+        with self._lock:
+            stats = self.stats.setdefault(model, TierStats())
+            stats.calls += 1
+            stats.seconds += seconds
+            stats.prompt_tokens += prompt
+            stats.output_tokens += output
+            stats.cost += (prompt * input_price + output * output_price) / 1_000_000
+
+    def escalated(self) -> None:
+        with self._lock:
+            self.escalations += 1
+
+    def report(self) -> Dict[str, Any]:
+        """Per-model stats with mean latency, and the escalation count"""
+        with self._lock:
+            return {
+                "escalations": self.escalations,
+                "models": {
+                    model: {**asdict(stats), "mean_latency": stats.mean_latency}
+                    for model, stats in self.stats.items()
+                }
+            }
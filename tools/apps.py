@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import json
+from typing import List, Optional
+
+from app_index import DEFAULT_CACHE_PATH, AppIndex
+from launcher import ProcessLauncher, get_launcher
+from tools.base import BaseTool, ResponseMode
+from utils import ProcessExecutor, lazy_import
+
+types = lazy_import("google.genai.types")
+
+
+class LaunchApplicationTool(BaseTool):
+    """Tool launching any installed application found in the .desktop file index"""
+
+    def __init__(self, cache_path: Optional[str] = None, index: Optional[AppIndex] = None):
+        self.executor = ProcessExecutor()
+        self.index = index or AppIndex(cache_path or DEFAULT_CACHE_PATH)
+
+    @property
+    def name(self) -> str:
+        return "launch_application"
+
+    @property
+    def description(self) -> str:
+        return (
+            "Launches any installed application by name or by what it does, e.g. 'spotify', "
+            "'image editor' or 'spreadsheet'. Can optionally open a file or URL in it"
+        )
+
+    @property
+    def keywords(self) -> List[str]:
+        return ["launch", "start", "run", "app", "application", "program", "open"]
+
+    @property
+    def response_mode(self) -> ResponseMode:
+        return ResponseMode.DIRECT
+
+    def get_function_declaration(self) -> types.FunctionDeclaration:
+        return types.FunctionDeclaration(
+            name=self.name,
+            description=self.description,
+            parameters=types.Schema(
+                type=types.Type.OBJECT,
+                properties={
+                    "app": types.Schema(
+                        type=types.Type.STRING,
+                        description="Application name or kind, e.g. 'gimp' or 'music player'"
+                    ),
+                    "target": types.Schema(
+                        type=types.Type.STRING,
+                        description="Optional file path or URL to open in the application"
+                    )
+                },
+                required=["app"]
+            )
+        )
+
+    def execute(self, app: str, target: Optional[str] = None) -> str:
+        entry = self.index.resolve(app)
+        if not entry:
+            return f"No installed application matching '{app}'"
+        command = entry.command(target)
+        if not command:
+            return f"Failed to launch {entry.name}: empty Exec line"
+        if entry.terminal:
+            command = ['konsole', '-e'] + command
+        if self.executor.run_detached(command):
+            return f"Launching {entry.name}{' with ' + target if target else ''}"
+        return f"Failed to launch {entry.name}"
+
+
+class LaunchedAppsTool(BaseTool):
+    """Tool listing the programs Jarvis started and whether they're still running"""
+
+    def __init__(self, launcher: Optional[ProcessLauncher] = None):
+        self.launcher = launcher or get_launcher()
+
+    @property
+    def name(self) -> str:
+        return "list_launched_apps"
+
+    @property
+    def description(self) -> str:
+        return "Lists apps and programs opened by the assistant, with pid, whether they're running and exit code"
+
+    def coalescible(self, **kwargs) -> bool:
+        return True
+
+    @property
+    def keywords(self) -> List[str]:
+        return ["opened", "launched", "started", "running", "apps", "exited", "closed"]
+
+    @property
+    def response_mode(self) -> ResponseMode:
+        return ResponseMode.MODEL
+
+    def get_function_declaration(self) -> types.FunctionDeclaration:
+        return types.FunctionDeclaration(
+            name=self.name,
+            description=self.description,
+            parameters=types.Schema(
+                type=types.Type.OBJECT,
+                properties={
+                    "running_only": types.Schema(
+                        type=types.Type.BOOLEAN,
+                        description="Only list apps still running. Defaults to false"
+                    )
+                }
+            )
+        )
+
+    def execute(self, running_only: bool = False) -> str:
+        processes = [
+            {
+                "pid": process.pid,
+                "command": " ".join(process.command),
+                "running": process.running,
+                "exit_code": process.exit_code,
+                "seconds": round(process.lifetime, 1)
+            }
+            for process in self.launcher.processes(running_only)[:20]
+        ]
+        if not processes:
+            return "No apps launched yet"
+        return json.dumps(processes, separators=(",", ":"))
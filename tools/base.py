@@ -1,5 +1,22 @@
+from __future__ import annotations
+
 from abc import ABC, abstractmethod
-from google.genai import types
+from enum import Enum
+from typing import Any, Dict, List, Optional, Tuple
+
+from result_cache import CachePolicy
+from utils import lazy_import
+
+types = lazy_import("google.genai.types")
+
+
+class ResponseMode(str, Enum):
+    """How a tool result is turned into the reply shown to the user"""
+
+    DIRECT = "direct"
+    TEMPLATED = "templated"
+    MODEL = "model"
+
 
 class BaseTool(ABC):
     """Abstract base class for all tools"""
@@ -16,12 +33,81 @@ class BaseTool(ABC):
         """Tool description"""
         pass
 
+    @property
+    def keywords(self) -> List[str]:
+        """Words users may say when they mean this tool, used to pick relevant tools"""
+        return []
+
+    @property
+    def intent_patterns(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Patterns the local intent router may answer without calling the model
+
+        Each entry is a regex matched against the whole normalized input and
+        the fixed arguments to call the tool with. Named groups are passed as
+        extra arguments
+        """
+        return []
+
     @abstractmethod
     def get_function_declaration(self) -> types.FunctionDeclaration:
         """Get the function declaration for Gemini API"""
         pass
 
+    @property
+    def response_mode(self) -> ResponseMode:
+        """
+        DIRECT results are shown verbatim, TEMPLATED ones through
+        response_template, MODEL ones are phrased by Gemini
+        """
+        return ResponseMode.MODEL
+
+    @property
+    def response_template(self) -> str:
+        """Template for TEMPLATED results, formatted with result and the call arguments"""
+        return "{result}"
+
+    def render_response(self, result: str, **kwargs) -> str:
+        """Build the user-facing reply for a DIRECT or TEMPLATED result"""
+        if self.response_mode == ResponseMode.TEMPLATED:
+            return self.response_template.format(result=result, **kwargs)
+        return result
+
+    def cache_policy(self, **kwargs) -> Optional[CachePolicy]:
+        """
+        Whether a result for these arguments may be reused, and for how long
+
+        Only tools that read without side effects should return a policy
+        """
+        return None
+
+    def coalescible(self, **kwargs) -> bool:
+        """
+        Whether identical calls running at the same time may share one execution
+
+        True for calls without side effects, which by default are the cacheable ones
+        """
+        return self.cache_policy(**kwargs) is not None
+
+    def cacheable_result(self, result: str) -> bool:
+        """Whether a result is worth caching, errors aren't"""
+        return not result.startswith(("Error", "Unknown", "Failed"))
+
+    @property
+    def supports_async(self) -> bool:
+        """Whether execute_async is implemented natively"""
+        return False
+
     @abstractmethod
     def execute(self, **kwargs) -> str:
         """Execute the tool with given arguments"""
-        pass
\ No newline at end of file
+        pass
+
+    async def execute_async(self, **kwargs) -> str:
+        """
+        Execute the tool without blocking the event loop
+
+        Only called when supports_async is True, other tools are run
+        in the registry's thread pool
+        """
+        raise NotImplementedError(f"{self.name} has no async implementation")
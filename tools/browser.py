@@ -1,9 +1,18 @@
-from typing import Optional
+from __future__ import annotations
 
-from google.genai import types
+from typing import Any, Dict, List, Optional, Tuple
 
-from tools.base import BaseTool
-from utils import ProcessExecutor
+from tools.base import BaseTool, ResponseMode
+from utils import ProcessExecutor, lazy_import
+
+types = lazy_import("google.genai.types")
+
+# Search queries the intent router leaves to the model: several requests in one,
+# or searches that are probably for local files rather than the web
+_NOT_A_WEB_QUERY = (
+    r"(?!.*\b(?:and|then|also|plus)\b)"
+    r"(?!.*\b(?:my|files?|folders?|director(?:y|ies)|documents?|computer|disk|drive|locally)\b)"
+)
 
 class BrowserTool(BaseTool):
     """Tool for browser operations"""
@@ -19,6 +28,22 @@ class BrowserTool(BaseTool):
     def description(self) -> str:
         return "Opens the web browser. Can optionally open a specific URL"
 
+    @property
+    def keywords(self) -> List[str]:
+        return ["web", "internet", "website", "site", "url", "link", "page", "firefox"]
+
+    @property
+    def response_mode(self) -> ResponseMode:
+        return ResponseMode.DIRECT
+
+    @property
+    def intent_patterns(self) -> List[Tuple[str, Dict[str, Any]]]:
+        return [
+            (r"(?:open|launch|start) (?:the |a )?(?:web )?browser", {}),
+            (r"(?:open|launch|start) firefox", {}),
+            (r"(?:open|go to|browse to) (?P<url>https?://\S+)", {}),
+        ]
+
     def get_function_declaration(self) -> types.FunctionDeclaration:
         return types.FunctionDeclaration(
             name=self.name,
@@ -58,6 +83,21 @@ class WebSearchTool(BaseTool):
     def description(self) -> str:
         return "Opens browser and searches for the given query on Google"
 
+    @property
+    def keywords(self) -> List[str]:
+        return ["search", "google", "look up", "find online", "query", "web"]
+
+    @property
+    def response_mode(self) -> ResponseMode:
+        return ResponseMode.DIRECT
+
+    @property
+    def intent_patterns(self) -> List[Tuple[str, Dict[str, Any]]]:
+        return [
+            (rf"(?:search|google)(?: the web)? for (?P<query>{_NOT_A_WEB_QUERY}.+)", {}),
+            (rf"google (?P<query>{_NOT_A_WEB_QUERY}.+)", {}),
+        ]
+
     def get_function_declaration(self) -> types.FunctionDeclaration:
         return types.FunctionDeclaration(
             name=self.name,
@@ -1,15 +1,43 @@
-from typing import Optional
+from __future__ import annotations
 
-from google.genai import types
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from file_index import FileIndex
+from tools.base import BaseTool, ResponseMode
+from utils import ProcessExecutor, lazy_import
+
+types = lazy_import("google.genai.types")
+
+
+def resolve_path(path: str, index: Optional[FileIndex], kind: str) -> str:
+    """
+    Turn a vague name into a real path
+
+    :param path: Path or description given by the model
+    :param index: File index to look the name up in
+    :param kind: "file" or "directory"
+    :return: The path itself if it exists or nothing matches, otherwise the best match
+    """
+    expanded = os.path.expanduser(path)
+    if os.path.exists(expanded) or index is None:
+        return expanded
+    matches = index.search(path, 1, kind)
+    return matches[0] if matches else expanded
+
+
+def _shorten(path: str) -> str:
+    """Abbreviate the home dir to ~"""
+    home = os.path.expanduser("~")
+    return "~" + path[len(home):] if path == home or path.startswith(home + os.sep) else path
 
-from tools.base import BaseTool
-from utils import ProcessExecutor
 
 class FileManagerTool(BaseTool):
     """Tool for file manager operations"""
 
-    def __init__(self):
+    def __init__(self, index: Optional[FileIndex] = None):
         self.executor = ProcessExecutor()
+        self.index = index
 
     @property
     def name(self) -> str:
@@ -19,6 +47,20 @@ class FileManagerTool(BaseTool):
     def description(self) -> str:
         return "Opens the Dolphin file manager. Can optionally open a specific dir"
 
+    @property
+    def keywords(self) -> List[str]:
+        return ["folder", "directory", "files", "browse", "documents", "downloads", "dolphin"]
+
+    @property
+    def response_mode(self) -> ResponseMode:
+        return ResponseMode.DIRECT
+
+    @property
+    def intent_patterns(self) -> List[Tuple[str, Dict[str, Any]]]:
+        return [
+            (r"(?:open|launch|start) (?:the )?(?:file manager|dolphin)", {}),
+        ]
+
     def get_function_declaration(self) -> types.FunctionDeclaration:
         return types.FunctionDeclaration(
             name=self.name,
@@ -28,13 +70,15 @@ class FileManagerTool(BaseTool):
                 properties={
                     "path": types.Schema(
                         type=types.Type.STRING,
-                        description="Optional directory path to open. Defaults to home dir"
+                        description="Optional directory path or folder name to open. Defaults to home dir"
                     )
                 }
             )
         )
 
     def execute(self, path: Optional[str] = None) -> str:
+        if path:
+            path = resolve_path(path, self.index, "directory")
         command = ['dolphin', path] if path else ['dolphin']
         if self.executor.run_detached(command):
             return f"Opening file manager{' at ' + path if path else ''}"
@@ -43,8 +87,9 @@ class FileManagerTool(BaseTool):
 class TextEditorTool(BaseTool):
     """Tool for text editor operations"""
 
-    def __init__(self):
+    def __init__(self, index: Optional[FileIndex] = None):
         self.executor = ProcessExecutor()
+        self.index = index
 
     @property
     def name(self) -> str:
@@ -54,6 +99,20 @@ class TextEditorTool(BaseTool):
     def description(self) -> str:
         return "Opens Kate text editor. Can optionally open a specific file"
 
+    @property
+    def keywords(self) -> List[str]:
+        return ["edit", "file", "note", "write", "text", "kate"]
+
+    @property
+    def response_mode(self) -> ResponseMode:
+        return ResponseMode.DIRECT
+
+    @property
+    def intent_patterns(self) -> List[Tuple[str, Dict[str, Any]]]:
+        return [
+            (r"(?:open|launch|start) (?:the |a )?(?:text editor|editor|kate)", {}),
+        ]
+
     def get_function_declaration(self) -> types.FunctionDeclaration:
         return types.FunctionDeclaration(
             name=self.name,
@@ -63,14 +122,83 @@ class TextEditorTool(BaseTool):
                 properties={
                     "file_path": types.Schema(
                         type=types.Type.STRING,
-                        description="Optional file path to open in editor"
+                        description="Optional file path or file name to open in editor"
                     )
                 }
             )
         )
 
     def execute(self, file_path: Optional[str] = None) -> str:
+        if file_path:
+            file_path = resolve_path(file_path, self.index, "file")
         command = ['kate', file_path] if file_path else ['kate']
         if self.executor.run_detached(command):
             return f"Opening Kate editor{' with ' + file_path if file_path else ''}"
-        return "Failed to open text editor"
\ No newline at end of file
+        return "Failed to open text editor"
+
+
+class FileLocatorTool(BaseTool):
+    """Tool finding files by name in the file index"""
+
+    def __init__(self, index: FileIndex):
+        self.index = index
+        # Build or revalidate the index before the first lookup needs it
+        self.index.start()
+
+    @property
+    def name(self) -> str:
+        return "locate_file"
+
+    @property
+    def description(self) -> str:
+        return (
+            "Finds files or directories by name, or by a vague description like 'thesis draft'. "
+            "Prefer this over find or locate shell commands"
+        )
+
+    def coalescible(self, **kwargs) -> bool:
+        return True
+
+    @property
+    def keywords(self) -> List[str]:
+        return ["find", "locate", "where", "search", "file", "path", "saved", "document"]
+
+    @property
+    def response_mode(self) -> ResponseMode:
+        return ResponseMode.MODEL
+
+    def get_function_declaration(self) -> types.FunctionDeclaration:
+        return types.FunctionDeclaration(
+            name=self.name,
+            description=self.description,
+            parameters=types.Schema(
+                type=types.Type.OBJECT,
+                properties={
+                    "query": types.Schema(
+                        type=types.Type.STRING,
+                        description="Name or words of the name to look for"
+                    ),
+                    "kind": types.Schema(
+                        type=types.Type.STRING,
+                        format="enum",
+                        enum=["file", "directory", "any"],
+                        description="'file', 'directory' or 'any'. Defaults to 'any'"
+                    ),
+                    "limit": types.Schema(
+                        type=types.Type.INTEGER,
+                        minimum=1,
+                        maximum=50,
+                        description="Max results. Defaults to 10"
+                    )
+                },
+                required=["query"]
+            )
+        )
+
+    def execute(self, query: str, kind: str = "any", limit: int = 10) -> str:
+        if kind not in ("file", "directory", "any"):
+            return f"Unknown kind: {kind}"
+        matches = self.index.search(query, max(1, min(int(limit), 50)), kind)
+        if not matches:
+            return f"No files matching '{query}'"
+        return "\n".join(_shorten(path) for path in matches)
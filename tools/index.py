@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Tuple
+
+from .base import BaseTool
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# Words too common to say anything about which tool is meant
+_STOPWORDS = frozenset(
+    "a an and are can could for from given how i if in is it its like me my of on only "
+    "open opens or please show some tell that the this to use what when which with would you".split()
+)
+
+# Weight of a term by where it appears in a tool
+NAME_WEIGHT = 3.0
+KEYWORD_WEIGHT = 2.0
+DESCRIPTION_WEIGHT = 1.0
+PARAMETER_WEIGHT = 0.5
+
+# Rough characters per token, as in memory.py
+CHARS_PER_TOKEN = 4
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase words of text without stopwords, with plurals folded"""
+    terms = []
+    for word in _WORD_RE.findall(text.lower()):
+        if word in _STOPWORDS:
+            continue
+        if len(word) > 4 and word.endswith(("sses", "xes", "ches", "shes")):
+            word = word[:-2]
+        elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+@dataclass
+class ToolSelection:
+    """Tools chosen for a request"""
+
+    names: List[str]
+    tokens_sent: int
+    tokens_saved: int
+
+
+@dataclass
+class SelectionStats:
+    """Totals of tool declaration pruning"""
+
+    requests: int = 0
+    tokens_sent: int = 0
+    tokens_saved: int = 0
+    tool_counts: Dict[str, int] = field(default_factory=dict)
+
+    def record(self, selection: ToolSelection) -> None:
+        self.requests += 1
+        self.tokens_sent += selection.tokens_sent
+        self.tokens_saved += selection.tokens_saved
+        for name in selection.names:
+            self.tool_counts[name] = self.tool_counts.get(name, 0) + 1
+
+
+class ToolIndex:
+    """
+    Keyword index over tool names, keywords, descriptions and parameters
+
+    Scores are summed term weights scaled by inverse document frequency,
+    so words shared by many tools count for little
+    """
+
+    def __init__(self, tools: Iterable[BaseTool]):
+        self.names: List[str] = []
+        self.terms: Dict[str, Dict[str, float]] = {}
+        self.declaration_tokens: Dict[str, int] = {}
+
+        for tool in tools:
+            declaration = tool.get_function_declaration()
+            weights: Dict[str, float] = {}
+            self._add(weights, tool.name.replace("_", " "), NAME_WEIGHT)
+            self._add(weights, " ".join(tool.keywords), KEYWORD_WEIGHT)
+            self._add(weights, tool.description, DESCRIPTION_WEIGHT)
+            properties = declaration.parameters.properties if declaration.parameters else None
+            for param, schema in (properties or {}).items():
+                self._add(weights, f"{param} {schema.description or ''}", PARAMETER_WEIGHT)
+
+            self.names.append(tool.name)
+            self.terms[tool.name] = weights
+            self.declaration_tokens[tool.name] = (
+                len(declaration.model_dump_json(exclude_none=True)) // CHARS_PER_TOKEN + 1
+            )
+
+        document_frequency: Dict[str, int] = {}
+        for weights in self.terms.values():
+            for term in weights:
+                document_frequency[term] = document_frequency.get(term, 0) + 1
+        count = len(self.names)
+        self.idf = {term: math.log(1 + count / df) for term, df in document_frequency.items()}
+
+    @staticmethod
+    def _add(weights: Dict[str, float], text: str, weight: float) -> None:
+        for term in tokenize(text):
+            weights[term] = max(weights.get(term, 0.0), weight)
+
+    def score(self, query: str) -> List[Tuple[float, str]]:
+        """Tools with a positive score for query, best first"""
+        terms = set(tokenize(query))
+        scores = []
+        for name in self.names:
+            weights = self.terms[name]
+            score = sum(weights[term] * self.idf[term] for term in terms if term in weights)
+            if score > 0:
+                scores.append((score, name))
+        scores.sort(key=lambda item: -item[0])
+        return scores
+
+    def select(self, query: str, k: int, always: Iterable[str] = ()) -> ToolSelection:
+        """
+        Choose the declarations to send for query
+
+        :param query: User input
+        :param k: Max tools picked by relevance
+        :param always: Tools included regardless of relevance
+        :return: Selected names in registration order, every tool if nothing scored
+        """
+        scored = self.score(query)
+        if not scored:
+            chosen = set(self.names)
+        else:
+            chosen = {name for _, name in scored[:k]}
+            chosen.update(name for name in always if name in self.terms)
+
+        names = [name for name in self.names if name in chosen]
+        total = sum(self.declaration_tokens.values())
+        sent = sum(self.declaration_tokens[name] for name in names)
+        return ToolSelection(names, sent, total - sent)
@@ -0,0 +1,347 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from tools.base import BaseTool, ResponseMode
+from utils import lazy_import
+
+types = lazy_import("google.genai.types")
+
+PROC = "/proc"
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+# Shortest span CPU usage is measured over, in seconds
+MIN_CPU_WINDOW = 0.2
+
+
+@dataclass
+class CpuTimes:
+    """Cumulative jiffies from a /proc/stat cpu line"""
+
+    busy: int
+    total: int
+
+
+@dataclass
+class Sample:
+    """System-wide readings at one point in time"""
+
+    time: float
+    cpu_percent: float
+    core_percents: List[float]
+    mem_total: int
+    mem_available: int
+    swap_total: int
+    swap_free: int
+    load: Tuple[float, float, float]
+
+
+def read_cpu_times() -> List[CpuTimes]:
+    """Read /proc/stat, the total first and then every core"""
+    times = []
+    with open(f"{PROC}/stat") as f:
+        for line in f:
+            if not line.startswith("cpu"):
+                break
+            values = [int(value) for value in line.split()[1:]]
+            # idle and iowait
+            idle = values[3] + (values[4] if len(values) > 4 else 0)
+            # guest time is already counted in user time
+            total = sum(values[:8])
+            times.append(CpuTimes(total - idle, total))
+    return times
+
+
+def read_meminfo() -> Dict[str, int]:
+    """Read /proc/meminfo in bytes"""
+    info = {}
+    with open(f"{PROC}/meminfo") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            fields = rest.split()
+            if fields:
+                info[key] = int(fields[0]) * (1024 if len(fields) > 1 else 1)
+    return info
+
+
+def read_loadavg() -> Tuple[float, float, float]:
+    """Read the 1, 5 and 15 minute load averages"""
+    with open(f"{PROC}/loadavg") as f:
+        one, five, fifteen = f.read().split()[:3]
+    return float(one), float(five), float(fifteen)
+
+
+def read_processes() -> Dict[int, Tuple[str, int, int]]:
+    """
+    Read /proc/[pid]/stat of every process
+
+    :return: pid -> (command name, cumulative cpu jiffies, resident bytes)
+    """
+    processes = {}
+    for entry in os.listdir(PROC):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"{PROC}/{entry}/stat", "rb") as f:
+                data = f.read().decode(errors="replace")
+        except OSError:
+            # The process exited while we were listing
+            continue
+        # The command name is in parentheses and may itself contain spaces or parentheses
+        name = data[data.index("(") + 1:data.rindex(")")]
+        fields = data[data.rindex(")") + 2:].split()
+        processes[int(entry)] = (name, int(fields[11]) + int(fields[12]), int(fields[21]) * _PAGE_SIZE)
+    return processes
+
+
+def _percent(before: CpuTimes, after: CpuTimes) -> float:
+    total = after.total - before.total
+    return 100.0 * (after.busy - before.busy) / total if total > 0 else 0.0
+
+
+class MetricsSampler:
+    """
+    Samples /proc in a background thread into a fixed-size ring buffer
+
+    CPU usage needs two readings, so keeping the last ones around lets
+    questions about it be answered without waiting. Processes are only
+    read when they're asked for, listing them is the expensive part
+    """
+
+    def __init__(self, interval: float = 1.0, size: int = 60):
+        """
+        :param interval: Seconds between samples
+        :param size: Samples kept
+        """
+        self.interval = interval
+        self.samples: Deque[Sample] = deque(maxlen=size)
+        self._cpu_times: Optional[List[CpuTimes]] = None
+        self._processes: Optional[Tuple[float, Dict[int, Tuple[str, int, int]]]] = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        """Start sampling if not already running"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="jarvis-metrics-sampler", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.sample()
+            except OSError:
+                # No /proc, nothing to sample
+                return
+            self._stop.wait(self.interval)
+
+    def sample(self) -> Sample:
+        """Take a sample now and add it to the buffer"""
+        cpu_times = read_cpu_times()
+        meminfo = read_meminfo()
+        now = time.monotonic()
+
+        with self._lock:
+            previous = self._cpu_times
+            self._cpu_times = cpu_times
+
+        if previous and len(previous) == len(cpu_times):
+            percents = [_percent(before, after) for before, after in zip(previous, cpu_times)]
+        else:
+            # Since boot, until there's a previous reading
+            percents = [100.0 * times.busy / times.total if times.total else 0.0 for times in cpu_times]
+
+        sample = Sample(
+            time=now,
+            cpu_percent=percents[0],
+            core_percents=percents[1:],
+            mem_total=meminfo.get("MemTotal", 0),
+            mem_available=meminfo.get("MemAvailable", meminfo.get("MemFree", 0)),
+            swap_total=meminfo.get("SwapTotal", 0),
+            swap_free=meminfo.get("SwapFree", 0),
+            load=read_loadavg()
+        )
+        with self._lock:
+            self.samples.append(sample)
+        return sample
+
+    def latest(self) -> Sample:
+        """Most recent sample, taking two readings a short window apart if there aren't two yet"""
+        with self._lock:
+            if len(self.samples) > 1:
+                return self.samples[-1]
+            empty = not self.samples
+        # The first reading can only give CPU usage since boot
+        if empty:
+            self.sample()
+        time.sleep(MIN_CPU_WINDOW)
+        return self.sample()
+
+    def cpu_average(self, seconds: float) -> Optional[float]:
+        """Mean CPU usage over the last seconds, None without samples"""
+        with self._lock:
+            if not self.samples:
+                return None
+            cutoff = self.samples[-1].time - seconds
+            recent = [sample.cpu_percent for sample in self.samples if sample.time >= cutoff]
+        return sum(recent) / len(recent)
+
+    def top_processes(self, count: int = 5, sort_by: str = "cpu") -> List[Dict[str, Any]]:
+        """
+        Processes using the most CPU or memory
+
+        CPU usage is measured against the snapshot of the previous call if
+        it's recent, so questions a little apart need no extra wait
+        """
+        with self._lock:
+            before = self._processes
+        if before is None or time.monotonic() - before[0] > 5 * self.interval:
+            # No recent snapshot to compare against, take a fresh one
+            before = (time.monotonic(), read_processes())
+        # Too short a window gives nothing but rounding noise
+        time.sleep(max(0.0, MIN_CPU_WINDOW - (time.monotonic() - before[0])))
+        now, processes = time.monotonic(), read_processes()
+        with self._lock:
+            self._processes = (now, processes)
+        elapsed_ticks = max((now - before[0]) * _CLOCK_TICKS, 1e-9)
+
+        rows = []
+        for pid, (name, jiffies, rss) in processes.items():
+            previous = before[1].get(pid)
+            cpu = 100.0 * (jiffies - previous[1]) / elapsed_ticks if previous and previous[0] == name else 0.0
+            rows.append({"pid": pid, "name": name, "cpu": round(cpu, 1), "mem_mb": round(rss / 2 ** 20, 1)})
+
+        key = "mem_mb" if sort_by == "memory" else "cpu"
+        rows.sort(key=lambda row: row[key], reverse=True)
+        return rows[:count]
+
+
+_sampler: Optional[MetricsSampler] = None
+_sampler_lock = threading.Lock()
+
+
+def get_sampler() -> MetricsSampler:
+    """Shared sampler, started on first use"""
+    global _sampler
+    with _sampler_lock:
+        if _sampler is None:
+            _sampler = MetricsSampler()
+            _sampler.start()
+        return _sampler
+
+
+def _gib(value: int) -> float:
+    return round(value / 2 ** 30, 2)
+
+
+class SystemMetricsTool(BaseTool):
+    """Tool reading CPU, memory, load and process usage straight from /proc"""
+
+    def __init__(self, sampler: Optional[MetricsSampler] = None):
+        """
+        :param sampler: Sampler to read, the shared one if not given
+        """
+        self._sampler = sampler
+
+    @property
+    def sampler(self) -> MetricsSampler:
+        # Started on the first question, not whenever the tool is loaded
+        if self._sampler is None:
+            self._sampler = get_sampler()
+        return self._sampler
+
+    @property
+    def name(self) -> str:
+        return "get_system_metrics"
+
+    @property
+    def description(self) -> str:
+        return (
+            "Gets current CPU usage, memory and swap usage, load average and the top processes "
+            "by CPU or memory. Prefer this over shell commands like top, free or ps"
+        )
+
+    @property
+    def keywords(self) -> List[str]:
+        return ["cpu", "memory", "ram", "free", "swap", "load", "usage", "using", "processes", "busy", "slow"]
+
+    @property
+    def response_mode(self) -> ResponseMode:
+        return ResponseMode.MODEL
+
+    def coalescible(self, **kwargs) -> bool:
+        return True
+
+    def get_function_declaration(self) -> types.FunctionDeclaration:
+        return types.FunctionDeclaration(
+            name=self.name,
+            description=self.description,
+            parameters=types.Schema(
+                type=types.Type.OBJECT,
+                properties={
+                    "metric": types.Schema(
+                        type=types.Type.STRING,
+                        format="enum",
+                        enum=["cpu", "memory", "load", "processes", "all"],
+                        description="What to get: 'cpu', 'memory', 'load', 'processes' or 'all'. Defaults to 'all'"
+                    ),
+                    "top": types.Schema(
+                        type=types.Type.INTEGER,
+                        minimum=0,
+                        maximum=20,
+                        description="Number of processes to list. Defaults to 5"
+                    ),
+                    "sort_by": types.Schema(
+                        type=types.Type.STRING,
+                        format="enum",
+                        enum=["cpu", "memory"],
+                        description="Sort processes by 'cpu' or 'memory'. Defaults to 'cpu'"
+                    )
+                }
+            )
+        )
+
+    def execute(self, metric: str = "all", top: int = 5, sort_by: str = "cpu") -> str:
+        if metric not in ("cpu", "memory", "load", "processes", "all"):
+            return f"Unknown metric: {metric}"
+        try:
+            sample = self.sampler.latest()
+            result: Dict[str, Any] = {}
+            if metric in ("cpu", "all"):
+                result["cpu"] = {
+                    "percent": round(sample.cpu_percent, 1),
+                    "cores": len(sample.core_percents),
+                    "avg_1m": round(self.sampler.cpu_average(60) or sample.cpu_percent, 1)
+                }
+            if metric in ("memory", "all"):
+                used = sample.mem_total - sample.mem_available
+                result["memory"] = {
+                    "used_gib": _gib(used),
+                    "available_gib": _gib(sample.mem_available),
+                    "total_gib": _gib(sample.mem_total),
+                    "percent": round(100 * used / sample.mem_total, 1) if sample.mem_total else 0.0,
+                    "swap_used_gib": _gib(sample.swap_total - sample.swap_free),
+                    "swap_total_gib": _gib(sample.swap_total)
+                }
+            if metric in ("load", "cpu", "all"):
+                result["load"] = list(sample.load)
+            if metric in ("processes", "all") or (metric in ("cpu", "memory") and top):
+                sort_key = "memory" if metric == "memory" else sort_by
+                result["top"] = self.sampler.top_processes(max(1, min(int(top), 20)), sort_key)
+            return json.dumps(result, separators=(",", ":"))
+        except OSError as e:
+            return f"Error reading system metrics: {str(e)}"
@@ -1,53 +1,315 @@
-from typing import Dict, List
-from google.genai import types
-from .base import BaseTool
-from .browser import BrowserTool, WebSearchTool
-from .file_system import FileManagerTool, TextEditorTool
-from .system import (
-    TerminalTool, CalculatorTool, SystemMonitorTool,
-    ShellCommandTool, SystemInfoTool
-)
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import importlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from file_index import DEFAULT_CACHE_PATH, FileIndex
+from result_cache import ResultCache
+from shell_session import ShellSessionPool
+from singleflight import SingleFlight
+from tracing import get_tracer
+from utils import DEFAULT_OUTPUT_LIMIT, lazy_import
+from .base import BaseTool, ResponseMode
+from .index import SelectionStats, ToolIndex, ToolSelection
+from .validation import INVALID_ARGUMENTS, ArgumentValidator
+
+types = lazy_import("google.genai.types")
+
+
+@dataclass
+class ToolDescriptor:
+    """Stand-in for a tool whose module is imported on first use"""
+
+    name: str
+    module: str
+    class_name: str
+    kwargs: Dict[str, Any] = field(default_factory=dict)
+
+    def load(self) -> BaseTool:
+        """Import the tool class and instantiate it"""
+        tool_class = getattr(importlib.import_module(self.module), self.class_name)
+        return tool_class(**self.kwargs)
+
 
 class ToolRegistry:
     """Registry for managing and accessing tools"""
 
-    def __init__(self, command_timeout: int = 10):
-        self._tools: Dict[str, BaseTool] = {}
-        self._register_default_tools(command_timeout)
+    def __init__(self, command_timeout: int = 10, max_workers: int = 4,
+                 shell_output_limit: int = DEFAULT_OUTPUT_LIMIT, shell_echo: bool = False,
+                 shell_sessions: int = 0, file_index_roots: Tuple[str, ...] = (),
+                 file_index_path: Optional[str] = None, app_index_path: Optional[str] = None,
+                 cache_bytes: int = 1 << 20):
+        self._tools: Dict[str, Union[BaseTool, ToolDescriptor]] = {}
+        self._validators: Dict[str, ArgumentValidator] = {}
+        self._load_lock = threading.Lock()
+        self._index: Optional[ToolIndex] = None
+        self.version = 0
+        self.selection_stats = SelectionStats()
+        self.result_cache = ResultCache(cache_bytes) if cache_bytes > 0 else None
+        self.flights = SingleFlight()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="jarvis-tool"
+        )
+        self.shell_pool = ShellSessionPool(shell_sessions, shell_output_limit) if shell_sessions else None
+        self.file_index = FileIndex(file_index_roots, file_index_path or DEFAULT_CACHE_PATH) if file_index_roots else None
+        self._register_default_tools(command_timeout, shell_output_limit, shell_echo, app_index_path)
 
-    def _register_default_tools(self, timeout: int) -> None:
+    def _register_default_tools(self, timeout: int, shell_output_limit: int, shell_echo: bool,
+                                app_index_path: Optional[str]) -> None:
         """Register all default tools"""
         default_tools = [
-            BrowserTool(),
-            WebSearchTool(),
-            FileManagerTool(),
-            TextEditorTool(),
-            TerminalTool(),
-            CalculatorTool(),
-            SystemMonitorTool(),
-            ShellCommandTool(timeout),
-            SystemInfoTool()
+            ToolDescriptor("open_browser", "tools.browser", "BrowserTool"),
+            ToolDescriptor("search_web", "tools.browser", "WebSearchTool"),
+            ToolDescriptor("open_file_manager", "tools.file_system", "FileManagerTool", {"index": self.file_index}),
+            ToolDescriptor("open_text_editor", "tools.file_system", "TextEditorTool", {"index": self.file_index}),
+            ToolDescriptor("open_terminal", "tools.system", "TerminalTool"),
+            ToolDescriptor("open_calculator", "tools.system", "CalculatorTool"),
+            ToolDescriptor("open_system_monitor", "tools.system", "SystemMonitorTool"),
+            ToolDescriptor("execute_shell_command", "tools.system", "ShellCommandTool", {
+                "timeout": timeout,
+                "output_limit": shell_output_limit,
+                "echo": shell_echo,
+                "pool": self.shell_pool
+            }),
+            ToolDescriptor("get_system_info", "tools.system", "SystemInfoTool"),
+            ToolDescriptor("get_system_metrics", "tools.metrics", "SystemMetricsTool"),
+            ToolDescriptor("launch_application", "tools.apps", "LaunchApplicationTool", {"cache_path": app_index_path}),
+            ToolDescriptor("list_launched_apps", "tools.apps", "LaunchedAppsTool")
         ]
+        if self.file_index:
+            default_tools.append(
+                ToolDescriptor("locate_file", "tools.file_system", "FileLocatorTool", {"index": self.file_index})
+            )
 
         for tool in default_tools:
             self.register(tool)
 
-    def register(self, tool: BaseTool) -> None:
-        """Register a tool"""
+    def register(self, tool: Union[BaseTool, ToolDescriptor]) -> None:
+        """Register a tool, or a descriptor to load it from on first use"""
         self._tools[tool.name] = tool
+        self._validators.pop(tool.name, None)
+        if isinstance(tool, BaseTool):
+            self._validators[tool.name] = ArgumentValidator.for_tool(tool)
+        self._index = None
+        self.version += 1
+
+    def names(self) -> List[str]:
+        """Get names of all registered tools without loading them"""
+        return list(self._tools)
+
+    def get(self, name: str) -> Optional[BaseTool]:
+        """Get a tool by name, loading it if needed"""
+        tool = self._tools.get(name)
+        if not isinstance(tool, ToolDescriptor):
+            return tool
+
+        with self._load_lock:
+            tool = self._tools[name]
+            if isinstance(tool, ToolDescriptor):
+                tool = self._tools[name] = tool.load()
+                self._validators[name] = ArgumentValidator.for_tool(tool)
+            return tool
+
+    def get_tools(self) -> List[BaseTool]:
+        """Get all registered tools"""
+        return [self.get(name) for name in self.names()]
+
+    def get_function_declarations(self, names: Optional[List[str]] = None) -> List[types.FunctionDeclaration]:
+        """Get function declarations for Gemini API, of all tools or only the named ones"""
+        tools = self.get_tools() if names is None else [self.get(name) for name in names]
+        return [tool.get_function_declaration() for tool in tools if tool]
+
+    def tool_index(self) -> ToolIndex:
+        """Keyword index over all tools, rebuilt after a tool is registered"""
+        index = self._index
+        if index is None:
+            index = self._index = ToolIndex(self.get_tools())
+        return index
+
+    def select_tools(self, query: str, k: int, always: Iterable[str] = ()) -> ToolSelection:
+        """
+        Pick the tools worth declaring for a request
+
+        :param query: User input
+        :param k: Max tools picked by relevance
+        :param always: Tools to include anyway
+        :return: Selection with the names and declaration tokens sent and saved
+        """
+        selection = self.tool_index().select(query, k, always)
+        self.selection_stats.record(selection)
+        return selection
 
-    def get(self, name: str) -> BaseTool:
-        """Get a tool by name"""
-        return self._tools.get(name)
+    def validator(self, tool: BaseTool) -> ArgumentValidator:
+        """Get the compiled argument validator of a tool"""
+        validator = self._validators.get(tool.name)
+        if validator is None:
+            validator = self._validators[tool.name] = ArgumentValidator.for_tool(tool)
+        return validator
 
-    def get_function_declarations(self) -> List[types.FunctionDeclaration]:
-        """Get all function declarations for Gemini API"""
-        return [tool.get_function_declaration() for tool in self._tools.values()]
+    def _validate(self, tool: BaseTool, kwargs: Dict[str, Any], span) -> Tuple[Dict[str, Any], Optional[str]]:
+        """
+        Check a call's arguments against the tool's compiled schema
+
+        :return: Arguments fixed where possible, and the result rejecting
+            the call if they can't be, None if they're valid
+        """
+        validator = self.validator(tool)
+        fixed, problems = validator.validate(kwargs)
+        if problems:
+            span.set(invalid_arguments=True)
+            return fixed, validator.error(problems)
+        return fixed, None
+
+    def _cache_lookup(self, tool: BaseTool, kwargs: Dict[str, Any], span) -> Tuple[Optional[str], Optional[Callable]]:
+        """
+        Look a call up in the result cache
+
+        :return: Cached result or None, and a function storing the result
+            once computed, None if the call isn't cacheable
+        """
+        if self.result_cache is None:
+            return None, None
+        policy = tool.cache_policy(**kwargs)
+        if policy is None:
+            return None, None
+
+        key = self.result_cache.key(tool.name, kwargs)
+        cached = self.result_cache.get(key)
+        span.set(cache_hit=cached is not None)
+        if cached is not None:
+            return cached, None
+        # Taken before running, so a change during the run invalidates the entry
+        mtimes = self.result_cache.snapshot(policy.paths)
+
+        def store(result: str) -> None:
+            if tool.cacheable_result(result):
+                self.result_cache.put(key, result, policy, mtimes)
+
+        return None, store
 
     def execute(self, name: str, **kwargs) -> str:
-        """Execute a tool by name"""
-        tool = self.get(name)
-        if not tool:
-            return f"Unknown tool: {name}"
-        return tool.execute(**kwargs)
+        """
+        Execute a tool by name
+
+        Calls without side effects share the run of an identical call
+        already in flight, and may be answered from the result cache
+        """
+        with get_tracer().span(f"tool.{name}") as span:
+            tool = self.get(name)
+            if not tool:
+                return f"Unknown tool: {name}"
+            kwargs, invalid = self._validate(tool, kwargs, span)
+            if invalid:
+                return invalid
+            if tool.coalescible(**kwargs):
+                result, shared = self.flights.do(ResultCache.key(name, kwargs), partial(self._run, tool, kwargs, span))
+                span.set(coalesced=shared)
+            else:
+                result = self._run(tool, kwargs, span)
+            span.set(result_bytes=len(result.encode()))
+            return result
+
+    def _run(self, tool: BaseTool, kwargs: Dict[str, Any], span) -> str:
+        cached, store = self._cache_lookup(tool, kwargs, span)
+        if cached is not None:
+            return cached
+        result = tool.execute(**kwargs)
+        if store:
+            store(result)
+        return result
+
+    def render_responses(self, calls: List[Tuple[str, Dict[str, Any]]], results: List[str]) -> Optional[str]:
+        """
+        Build the reply for tool results locally
+
+        :param calls: List of (tool name, arguments)
+        :param results: Results of the calls
+        :return: Reply, or None if any result needs to be phrased by the model
+        """
+        replies = []
+        for (name, kwargs), result in zip(calls, results):
+            tool = self.get(name)
+            # Rejected calls go back to the model to be corrected
+            if not tool or tool.response_mode == ResponseMode.MODEL or result.startswith(INVALID_ARGUMENTS):
+                return None
+            # With the arguments the call ran with, e.g. 'time' for 'Time'
+            fixed, _ = self.validator(tool).validate(kwargs)
+            replies.append(tool.render_response(result, **fixed))
+        return "\n".join(replies)
+
+    def _execute_safely(self, name: str, kwargs: Dict[str, Any]) -> str:
+        """Execute a tool, turning exceptions into an error result"""
+        try:
+            return self.execute(name, **kwargs)
+        except Exception as e:
+            return f"Error executing {name}: {str(e)}"
+
+    def execute_many(self, calls: List[Tuple[str, Dict[str, Any]]]) -> List[str]:
+        """
+        Execute several tools concurrently in the thread pool
+
+        :param calls: List of (tool name, arguments)
+        :return: Results in the same order as calls
+        """
+        if len(calls) == 1:
+            name, kwargs = calls[0]
+            return [self._execute_safely(name, kwargs)]
+        # Run each call in a copy of this context so its span nests under the caller's
+        contexts = [contextvars.copy_context() for _ in calls]
+        return list(self._executor.map(
+            lambda context, call: context.run(self._execute_safely, *call), contexts, calls
+        ))
+
+    async def execute_many_async(self, calls: List[Tuple[str, Dict[str, Any]]]) -> List[str]:
+        """Async counterpart of execute_many"""
+        results = await asyncio.gather(
+            *(self.execute_async(name, **kwargs) for name, kwargs in calls),
+            return_exceptions=True
+        )
+        # A cancelled call comes back as CancelledError, a BaseException
+        return [
+            f"Error executing {name}: {str(result) or type(result).__name__}"
+            if isinstance(result, BaseException) else result
+            for (name, _), result in zip(calls, results)
+        ]
+
+    async def execute_async(self, name: str, **kwargs) -> str:
+        """Execute a tool by name without blocking the event loop"""
+        with get_tracer().span(f"tool.{name}") as span:
+            tool = self.get(name)
+            if not tool:
+                return f"Unknown tool: {name}"
+            kwargs, invalid = self._validate(tool, kwargs, span)
+            if invalid:
+                return invalid
+            if tool.coalescible(**kwargs):
+                result, shared = await self.flights.do_async(
+                    ResultCache.key(name, kwargs), partial(self._run_async, tool, kwargs, span)
+                )
+                span.set(coalesced=shared)
+            else:
+                result = await self._run_async(tool, kwargs, span)
+            span.set(result_bytes=len(result.encode()))
+            return result
 
+    async def _run_async(self, tool: BaseTool, kwargs: Dict[str, Any], span) -> str:
+        cached, store = self._cache_lookup(tool, kwargs, span)
+        if cached is not None:
+            return cached
+        if tool.supports_async:
+            result = await tool.execute_async(**kwargs)
+        else:
+            loop = asyncio.get_running_loop()
+            context = contextvars.copy_context()
+            result = await loop.run_in_executor(
+                self._executor, partial(context.run, tool.execute, **kwargs)
+            )
+        if store:
+            store(result)
+        return result
@@ -1,11 +1,21 @@
+from __future__ import annotations
+
+import asyncio
 import os
+import shutil
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, List, Optional, Tuple
+
+from result_cache import CachePolicy, read_only_policy
+from shell_session import ShellSessionPool
+from tools.base import BaseTool, ResponseMode
+from utils import DEFAULT_OUTPUT_LIMIT, CommandResult, ProcessExecutor, lazy_import
 
-from google.genai import types
+types = lazy_import("google.genai.types")
 
-from tools.base import BaseTool
-from utils import ProcessExecutor
+# Starts shell results that aren't the complete output of a successful
+# command: failures, timeouts and truncated output
+ANNOTATION_PREFIX = "[Command: "
 
 
 class TerminalTool(BaseTool):
@@ -22,6 +32,20 @@ class TerminalTool(BaseTool):
     def description(self) -> str:
         return "Opens a new Konsole terminal window. Can optionally execute a command in it"
 
+    @property
+    def keywords(self) -> List[str]:
+        return ["console", "command line", "shell window", "konsole"]
+
+    @property
+    def response_mode(self) -> ResponseMode:
+        return ResponseMode.DIRECT
+
+    @property
+    def intent_patterns(self) -> List[Tuple[str, Dict[str, Any]]]:
+        return [
+            (r"(?:open|launch|start) (?:the |a )?(?:new )?(?:terminal|konsole)(?: window)?", {}),
+        ]
+
     def get_function_declaration(self) -> types.FunctionDeclaration:
         return types.FunctionDeclaration(
             name=self.name,
@@ -61,6 +85,20 @@ class CalculatorTool(BaseTool):
     def description(self) -> str:
         return "Opens a KCalc calculator app"
 
+    @property
+    def keywords(self) -> List[str]:
+        return ["calculate", "math", "calc", "kcalc"]
+
+    @property
+    def response_mode(self) -> ResponseMode:
+        return ResponseMode.DIRECT
+
+    @property
+    def intent_patterns(self) -> List[Tuple[str, Dict[str, Any]]]:
+        return [
+            (r"(?:open|launch|start) (?:the |a )?(?:calculator|kcalc)", {}),
+        ]
+
     def get_function_declaration(self) -> types.FunctionDeclaration:
         return types.FunctionDeclaration(
             name=self.name,
@@ -87,6 +125,20 @@ class SystemMonitorTool(BaseTool):
     def description(self) -> str:
         return "Opens the system monitor to view CPU, memory and process information"
 
+    @property
+    def keywords(self) -> List[str]:
+        return ["task manager", "cpu", "memory", "ram", "processes", "usage", "performance"]
+
+    @property
+    def response_mode(self) -> ResponseMode:
+        return ResponseMode.DIRECT
+
+    @property
+    def intent_patterns(self) -> List[Tuple[str, Dict[str, Any]]]:
+        return [
+            (r"(?:open|launch|start) (?:the )?(?:system monitor|task manager)", {}),
+        ]
+
     def get_function_declaration(self) -> types.FunctionDeclaration:
         return types.FunctionDeclaration(
             name=self.name,
@@ -95,18 +147,29 @@ class SystemMonitorTool(BaseTool):
         )
 
     def execute(self) -> str:
-        if self.executor.run_detached(['plasma-systemmonitor']):
-            return "Opening system monitor"
-        if self.executor.run_detached(['ksysguard']):
+        # Look the program up instead of paying a failed spawn for the missing one
+        program = shutil.which('plasma-systemmonitor') or shutil.which('ksysguard') or 'plasma-systemmonitor'
+        if self.executor.run_detached([program]):
             return "Opening system monitor"
         return "Failed to open system monitor"
 
 class ShellCommandTool(BaseTool):
     """Tool for executing shell commands"""
 
-    def __init__(self, timeout: int = 10):
+    def __init__(self, timeout: int = 10, output_limit: int = DEFAULT_OUTPUT_LIMIT, echo: bool = False,
+                 pool: Optional[ShellSessionPool] = None):
+        """
+        :param timeout: Timeout in seconds
+        :param output_limit: Max bytes of stdout and stderr kept for the model
+        :param echo: Print command output live while it runs
+        :param pool: Persistent shell sessions to run commands in. A fresh
+            shell is started for every command if not given
+        """
         self.executor = ProcessExecutor()
         self.timeout = timeout
+        self.output_limit = output_limit
+        self.echo = echo
+        self.pool = pool
 
     @property
     def name(self) -> str:
@@ -116,6 +179,10 @@ class ShellCommandTool(BaseTool):
     def description(self) -> str:
         return "Executes a shell command. Use carefully and only for safe operations"
 
+    @property
+    def keywords(self) -> List[str]:
+        return ["run", "command", "disk", "space", "storage", "kernel", "uptime", "install", "package", "network", "ip", "battery"]
+
     def get_function_declaration(self) -> types.FunctionDeclaration:
         return types.FunctionDeclaration(
             name=self.name,
@@ -132,9 +199,62 @@ class ShellCommandTool(BaseTool):
             )
         )
 
+    @property
+    def supports_async(self) -> bool:
+        return True
+
+    def cache_policy(self, command: str = "", **kwargs) -> Optional[CachePolicy]:
+        # A session's working dir may have changed since a relative path was cached
+        return read_only_policy(command, relative_paths=self.pool is None)
+
+    def cacheable_result(self, result: str) -> bool:
+        return not result.startswith(ANNOTATION_PREFIX)
+
     def execute(self, command) -> str:
-        success, output = self.executor.run_sync(command, self.timeout)
-        return output
+        echo = self._echo if self.echo else None
+        try:
+            if self.pool:
+                result = self.pool.run(command, self.timeout, echo)
+            else:
+                result = self.executor.capture(command, self.timeout, self.output_limit, echo)
+        except Exception as e:
+            return self._annotate(f"error, {str(e)}")
+        return self._format_result(result)
+
+    async def execute_async(self, command) -> str:
+        echo = self._echo if self.echo else None
+        try:
+            if self.pool:
+                result = await asyncio.to_thread(self.pool.run, command, self.timeout, echo)
+            else:
+                result = await self.executor.capture_async(command, self.timeout, self.output_limit, echo)
+        except Exception as e:
+            return self._annotate(f"error, {str(e)}")
+        return self._format_result(result)
+
+    @staticmethod
+    def _echo(text: str) -> None:
+        print(text, end="", flush=True)
+
+    @staticmethod
+    def _annotate(note: str, output: str = "") -> str:
+        return f"{ANNOTATION_PREFIX}{note}]\n{output}" if output else f"{ANNOTATION_PREFIX}{note}]"
+
+    def _format_result(self, result: CommandResult) -> str:
+        """Compact result for the model, annotated with exit status and truncation"""
+        if result.timed_out and not result.output:
+            return self._annotate(f"timed out after {self.timeout}s")
+
+        notes = []
+        if result.timed_out:
+            notes.append(f"timed out after {self.timeout}s")
+        elif result.returncode:
+            notes.append(f"exit code {result.returncode}")
+        if result.dropped_bytes:
+            notes.append(f"{result.dropped_bytes} bytes of output omitted")
+
+        output = result.output or "Command executed"
+        return self._annotate(", ".join(notes), output) if notes else output
 
 class SystemInfoTool(BaseTool):
     """Tool getting system information"""
@@ -147,6 +267,43 @@ class SystemInfoTool(BaseTool):
     def description(self) -> str:
         return "Gets system information like date, time, username or hostname"
 
+    @property
+    def keywords(self) -> List[str]:
+        return ["time", "date", "today", "day", "clock", "user", "username", "hostname", "computer name"]
+
+    @property
+    def response_mode(self) -> ResponseMode:
+        return ResponseMode.TEMPLATED
+
+    def cache_policy(self, info_type: str = "", **kwargs) -> Optional[CachePolicy]:
+        # Time and date change, the user and hostname practically don't
+        return CachePolicy(3600.0) if info_type in ("username", "hostname") else None
+
+    def coalescible(self, **kwargs) -> bool:
+        # Reading the clock has no side effects either
+        return True
+
+    def render_response(self, result: str, **kwargs) -> str:
+        templates = {
+            "time": "It's {result}",
+            "date": "Today is {result}",
+            "username": "Your username is {result}",
+            "hostname": "Your hostname is {result}"
+        }
+        if result.startswith(("Unknown info type", "Error getting system info")):
+            return result
+        return templates.get(kwargs.get("info_type"), "{result}").format(result=result)
+
+    @property
+    def intent_patterns(self) -> List[Tuple[str, Dict[str, Any]]]:
+        return [
+            (r"what time is it", {"info_type": "time"}),
+            (r"what(?:'s| is) the (?:current )?time", {"info_type": "time"}),
+            (r"what(?:'s| is) (?:the date|today's date|the date today)", {"info_type": "date"}),
+            (r"what(?:'s| is) my user ?name|who am i", {"info_type": "username"}),
+            (r"what(?:'s| is) (?:my |the )?host ?name", {"info_type": "hostname"}),
+        ]
+
     def get_function_declaration(self) -> types.FunctionDeclaration:
         return types.FunctionDeclaration(
             name=self.name,
@@ -156,6 +313,8 @@ class SystemInfoTool(BaseTool):
                 properties={
                     "info_type": types.Schema(
                         type=types.Type.STRING,
+                        format="enum",
+                        enum=["time", "date", "username", "hostname", "all"],
                         description="Type of info: 'time', 'date', 'username', 'hostname', 'all'"
                     )
                 },
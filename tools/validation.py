@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+import inspect
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+from utils import lazy_import
+
+types = lazy_import("google.genai.types")
+
+# Prefix of results rejecting a call, sent back to the model to correct the call
+INVALID_ARGUMENTS = "Invalid arguments"
+
+TRUE_STRINGS = frozenset({"true", "yes", "y", "on", "1"})
+FALSE_STRINGS = frozenset({"false", "no", "n", "off", "0", "none"})
+
+# Converts a value to the schema's type, raises ArgumentError if it can't
+Coercer = Callable[[Any], Any]
+
+
+class ArgumentError(ValueError):
+    """Value that can't be converted to what the schema declares"""
+
+
+def _type_name(schema: types.Schema) -> str:
+    return str(getattr(schema.type, "value", schema.type or "")).upper()
+
+
+def _clamp(schema: types.Schema) -> Callable[[Any], Any]:
+    low, high = schema.minimum, schema.maximum
+    if low is None and high is None:
+        return lambda value: value
+
+    def clamp(value):
+        if low is not None and value < low:
+            value = type(value)(low)
+        if high is not None and value > high:
+            value = type(value)(high)
+        return value
+
+    return clamp
+
+
+def _normalize(value: str) -> str:
+    return value.strip().lower().replace(" ", "_").replace("-", "_")
+
+
+def _string(schema: types.Schema) -> Coercer:
+    allowed = list(schema.enum or [])
+    by_key = {_normalize(value): value for value in allowed}
+
+    def coerce(value):
+        if isinstance(value, bool):
+            value = "true" if value else "false"
+        elif isinstance(value, (int, float)):
+            value = str(int(value)) if float(value).is_integer() else str(value)
+        elif not isinstance(value, str):
+            raise ArgumentError(f"expected a string, got {type(value).__name__}")
+        if not by_key:
+            return value
+
+        key = _normalize(value)
+        if key in by_key:
+            return by_key[key]
+        # Unambiguous abbreviations, e.g. 'mem' for 'memory'
+        matches = [name for normalized, name in by_key.items() if key and normalized.startswith(key)]
+        if len(matches) == 1:
+            return matches[0]
+        raise ArgumentError(f"must be one of {', '.join(map(repr, allowed))}, got {value!r}")
+
+    return coerce
+
+
+def _integer(schema: types.Schema) -> Coercer:
+    clamp = _clamp(schema)
+
+    def coerce(value):
+        # Gemini sends every number as a float
+        if isinstance(value, str):
+            try:
+                value = float(value.strip())
+            except ValueError:
+                raise ArgumentError(f"expected an integer, got {value!r}") from None
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ArgumentError(f"expected an integer, got {type(value).__name__}")
+        if isinstance(value, float) and not value.is_integer():
+            raise ArgumentError(f"expected an integer, got {value}")
+        return clamp(int(value))
+
+    return coerce
+
+
+def _number(schema: types.Schema) -> Coercer:
+    clamp = _clamp(schema)
+
+    def coerce(value):
+        if isinstance(value, str):
+            try:
+                value = float(value.strip())
+            except ValueError:
+                raise ArgumentError(f"expected a number, got {value!r}") from None
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ArgumentError(f"expected a number, got {type(value).__name__}")
+        return clamp(value)
+
+    return coerce
+
+
+def _boolean(schema: types.Schema) -> Coercer:
+    def coerce(value):
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, (int, float)) and value in (0, 1):
+            return bool(value)
+        if isinstance(value, str):
+            lower = value.strip().lower()
+            if lower in TRUE_STRINGS:
+                return True
+            if lower in FALSE_STRINGS:
+                return False
+        raise ArgumentError(f"expected true or false, got {value!r}")
+
+    return coerce
+
+
+def _array(schema: types.Schema) -> Coercer:
+    item = compile_schema(schema.items) if schema.items else (lambda value: value)
+
+    def coerce(value):
+        if not isinstance(value, (list, tuple)):
+            # A single item where a list is expected
+            value = [value]
+        return [item(element) for element in value]
+
+    return coerce
+
+
+def _object(schema: types.Schema) -> Coercer:
+    validator = ArgumentValidator.from_schema("", schema)
+
+    def coerce(value):
+        if not isinstance(value, dict):
+            raise ArgumentError(f"expected an object, got {type(value).__name__}")
+        value, problems = validator.validate(value)
+        if problems:
+            raise ArgumentError("; ".join(problems))
+        return value
+
+    return coerce
+
+
+_COMPILERS: Dict[str, Callable[[types.Schema], Coercer]] = {
+    "STRING": _string,
+    "INTEGER": _integer,
+    "NUMBER": _number,
+    "BOOLEAN": _boolean,
+    "ARRAY": _array,
+    "OBJECT": _object,
+}
+
+
+def compile_schema(schema: types.Schema) -> Coercer:
+    """Coercer for values of a schema, values of unknown types are passed through"""
+    compiler = _COMPILERS.get(_type_name(schema))
+    return compiler(schema) if compiler else (lambda value: value)
+
+
+class ArgumentValidator:
+    """
+    Checks and fixes a tool call's arguments before it runs
+
+    Compiled once from the tool's declaration. Values are converted to the
+    declared types where that's unambiguous, e.g. 5.0 to 5 or 'Memory' to
+    the enum value 'memory', numbers are clamped to their declared range,
+    and arguments execute doesn't take are dropped. What can't be fixed is
+    reported in a few words, so the model can correct the call
+    """
+
+    def __init__(self, name: str, properties: Dict[str, Coercer], required: FrozenSet[str],
+                 accepted: Optional[FrozenSet[str]] = None):
+        """
+        :param name: Tool name, used in the messages
+        :param properties: Coercer of every declared argument
+        :param required: Arguments that must be set
+        :param accepted: Arguments execute takes, None if it takes any
+        """
+        self.name = name
+        self.properties = properties
+        self.required = required
+        self.accepted = accepted
+
+    @classmethod
+    def from_schema(cls, name: str, schema: Optional[types.Schema],
+                    execute: Optional[Callable] = None) -> "ArgumentValidator":
+        """
+        Compile a parameters schema
+
+        :param name: Tool name
+        :param schema: Parameters schema of the declaration
+        :param execute: Tool's execute method, its signature adds the
+            arguments it can't do without and bounds the ones passed on
+        """
+        properties = {
+            param: compile_schema(property_schema)
+            for param, property_schema in ((schema.properties or {}) if schema else {}).items()
+        }
+        required = set(schema.required or []) if schema else set()
+        accepted = None
+        if execute is not None:
+            parameters = inspect.signature(execute).parameters.values()
+            if not any(param.kind == param.VAR_KEYWORD for param in parameters):
+                accepted = frozenset(param.name for param in parameters)
+            required.update(
+                param.name for param in parameters
+                if param.default is param.empty and param.kind in (param.POSITIONAL_OR_KEYWORD, param.KEYWORD_ONLY)
+            )
+        return cls(name, properties, frozenset(required), accepted)
+
+    @classmethod
+    def for_tool(cls, tool) -> "ArgumentValidator":
+        """Compile a tool's declaration"""
+        declaration = tool.get_function_declaration()
+        return cls.from_schema(tool.name, declaration.parameters, tool.execute)
+
+    def validate(self, kwargs: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        :param kwargs: Arguments of the call
+        :return: Fixed arguments, and what's wrong with the ones that can't be fixed
+        """
+        fixed: Dict[str, Any] = {}
+        problems: List[str] = []
+        for param, value in kwargs.items():
+            if value is None:
+                # Same as leaving the argument out
+                continue
+            coerce = self.properties.get(param)
+            if coerce is None:
+                if self.accepted is None or param in self.accepted:
+                    fixed[param] = value
+                continue
+            try:
+                fixed[param] = coerce(value)
+            except ArgumentError as e:
+                problems.append(f"'{param}' {e}")
+        for param in self.required:
+            if param not in fixed and not any(problem.startswith(f"'{param}'") for problem in problems):
+                problems.append(f"'{param}' is required")
+        return fixed, problems
+
+    def error(self, problems: List[str]) -> str:
+        """Result reporting the problems to the model"""
+        return f"{INVALID_ARGUMENTS} for {self.name}: {'; '.join(sorted(problems))}"
@@ -0,0 +1,310 @@
+import contextvars
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+# Histogram buckets for span durations, in seconds
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Span attributes counted as events, e.g. retries of a model call
+EVENT_ATTRIBUTES = ("retries", "hedged", "hedge_won", "cache_hit", "coalesced", "invalid_arguments")
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar(
+    "jarvis_current_span", default=None
+)
+
+
+@dataclass
+class Span:
+    """Timed stage of a command"""
+
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    start_time: float = field(default_factory=time.time)
+    duration_ms: Optional[float] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+    _started: float = field(default_factory=time.perf_counter, repr=False)
+    _tracer: Optional["Tracer"] = field(default=None, repr=False)
+
+    def set(self, **attributes) -> None:
+        """Attach attributes to the span"""
+        self.attributes.update(attributes)
+
+    def record_usage(self, response) -> None:
+        """Attach token usage from a Gemini response's usage metadata"""
+        usage = getattr(response, "usage_metadata", None)
+        if not usage:
+            return
+        self.set(
+            prompt_tokens=usage.prompt_token_count or 0,
+            output_tokens=usage.candidates_token_count or 0,
+            cached_tokens=usage.cached_content_token_count or 0,
+            total_tokens=usage.total_token_count or 0
+        )
+
+    def fail(self, error: BaseException) -> None:
+        """Mark the span as failed"""
+        self.error = f"{type(error).__name__}: {error}"
+
+    def finish(self) -> None:
+        """End the span and hand it to the exporters"""
+        if self.duration_ms is not None:
+            return
+        self.duration_ms = (time.perf_counter() - self._started) * 1000
+        if self._tracer:
+            self._tracer.export(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "duration_ms": self.duration_ms,
+            "attributes": self.attributes,
+            "error": self.error
+        }
+
+
+class _NoopSpan:
+    """Span handed out while tracing is disabled"""
+
+    def set(self, **attributes) -> None:
+        pass
+
+    def record_usage(self, response) -> None:
+        pass
+
+    def fail(self, error: BaseException) -> None:
+        pass
+
+    def finish(self) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class JsonlExporter:
+    """Appends every finished span to a JSONL file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+class PrometheusExporter:
+    """
+    Aggregates spans into Prometheus metrics
+
+    Metrics are rewritten to a textfile after every finished command and/or
+    served over HTTP at /metrics
+    """
+
+    def __init__(self, textfile: Optional[str] = None, port: Optional[int] = None,
+                 host: str = "127.0.0.1"):
+        self.textfile = textfile
+        self._lock = threading.Lock()
+        self._durations: Dict[str, List[float]] = {}
+        self._bucket_counts: Dict[str, List[int]] = {}
+        self._tokens: Dict[Tuple[str, str], int] = {}
+        self._result_bytes: Dict[str, int] = {}
+        self._errors: Dict[str, int] = {}
+        self._events: Dict[Tuple[str, str], int] = {}
+        self._server = self._serve(host, port) if port else None
+
+    def export(self, span: Span) -> None:
+        seconds = (span.duration_ms or 0) / 1000
+        with self._lock:
+            total = self._durations.setdefault(span.name, [0.0, 0])
+            total[0] += seconds
+            total[1] += 1
+            buckets = self._bucket_counts.setdefault(span.name, [0] * len(DURATION_BUCKETS))
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    buckets[i] += 1
+            for kind in ("prompt", "output", "cached"):
+                count = span.attributes.get(f"{kind}_tokens")
+                if count:
+                    key = (span.name, kind)
+                    self._tokens[key] = self._tokens.get(key, 0) + count
+            if "result_bytes" in span.attributes:
+                self._result_bytes[span.name] = self._result_bytes.get(span.name, 0) + span.attributes["result_bytes"]
+            if span.error:
+                self._errors[span.name] = self._errors.get(span.name, 0) + 1
+            for event in EVENT_ATTRIBUTES:
+                if span.attributes.get(event):
+                    key = (span.name, event)
+                    self._events[key] = self._events.get(key, 0) + int(span.attributes[event])
+
+        if self.textfile and span.parent_id is None:
+            self.write_textfile()
+
+    def render(self) -> str:
+        """Render metrics in the Prometheus text format"""
+        lines = [
+            "# HELP jarvis_span_duration_seconds Duration of command stages",
+            "# TYPE jarvis_span_duration_seconds histogram"
+        ]
+        with self._lock:
+            for name, (total, count) in sorted(self._durations.items()):
+                for bound, bucket in zip(DURATION_BUCKETS, self._bucket_counts[name]):
+                    lines.append(f'jarvis_span_duration_seconds_bucket{{span="{name}",le="{bound}"}} {bucket}')
+                lines.append(f'jarvis_span_duration_seconds_bucket{{span="{name}",le="+Inf"}} {count}')
+                lines.append(f'jarvis_span_duration_seconds_sum{{span="{name}"}} {total:.6f}')
+                lines.append(f'jarvis_span_duration_seconds_count{{span="{name}"}} {count}')
+
+            lines += ["# HELP jarvis_tokens_total Tokens reported by Gemini usage metadata",
+                      "# TYPE jarvis_tokens_total counter"]
+            for (name, kind), count in sorted(self._tokens.items()):
+                lines.append(f'jarvis_tokens_total{{span="{name}",kind="{kind}"}} {count}')
+
+            lines += ["# HELP jarvis_tool_result_bytes_total Size of tool results",
+                      "# TYPE jarvis_tool_result_bytes_total counter"]
+            for name, count in sorted(self._result_bytes.items()):
+                lines.append(f'jarvis_tool_result_bytes_total{{span="{name}"}} {count}')
+
+            lines += ["# HELP jarvis_span_errors_total Stages that raised",
+                      "# TYPE jarvis_span_errors_total counter"]
+            for name, count in sorted(self._errors.items()):
+                lines.append(f'jarvis_span_errors_total{{span="{name}"}} {count}')
+
+            lines += ["# HELP jarvis_span_events_total Retries and hedged requests",
+                      "# TYPE jarvis_span_events_total counter"]
+            for (name, event), count in sorted(self._events.items()):
+                lines.append(f'jarvis_span_events_total{{span="{name}",event="{event}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self) -> None:
+        """Atomically replace the textfile, as node_exporter expects"""
+        directory = os.path.dirname(os.path.abspath(self.textfile))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".jarvis-metrics-")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp_path, self.textfile)
+
+    def _serve(self, host: str, port: int) -> "ThreadingHTTPServer":
+        # Imported here, http.server and its dependencies would add to every startup
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="jarvis-metrics", daemon=True).start()
+        return server
+
+
+class Tracer:
+    """Creates spans and passes finished ones to exporters"""
+
+    def __init__(self):
+        self.exporters: List[Any] = []
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.exporters)
+
+    def add_exporter(self, exporter) -> None:
+        self.exporters.append(exporter)
+
+    def export(self, span: Span) -> None:
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception:
+                # Metrics must never break a command
+                pass
+
+    def start_span(self, name: str, **attributes):
+        """
+        Start a span under the current one without making it current
+
+        For spans that outlive a block, like a consumed stream. Call finish() to end it
+        """
+        if not self.enabled:
+            return _NOOP_SPAN
+        parent = _current_span.get()
+        return Span(
+            name=name,
+            # os.urandom rather than uuid, which is slow to import
+            trace_id=parent.trace_id if parent else os.urandom(16).hex(),
+            span_id=os.urandom(8).hex(),
+            parent_id=parent.span_id if parent else None,
+            attributes=attributes,
+            _tracer=self
+        )
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Any]:
+        """Time a block as a span nested under the current one"""
+        if not self.enabled:
+            yield _NOOP_SPAN
+            return
+
+        span = self.start_span(name, **attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.fail(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.finish()
+
+
+_tracer = Tracer()
+
+
+def get_tracer() -> Tracer:
+    """Get the process-wide tracer"""
+    return _tracer
+
+
+def configure_tracing(jsonl_path: Optional[str] = None, textfile: Optional[str] = None,
+                      port: Optional[int] = None) -> Tracer:
+    """
+    Enable span export
+
+    :param jsonl_path: File to append spans to as JSON lines
+    :param textfile: Prometheus textfile to rewrite after every command
+    :param port: Port to serve Prometheus metrics on at /metrics
+    :return: The process-wide tracer
+    """
+    if jsonl_path:
+        _tracer.add_exporter(JsonlExporter(jsonl_path))
+    if textfile or port:
+        _tracer.add_exporter(PrometheusExporter(textfile, port))
+    return _tracer
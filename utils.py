@@ -1,5 +1,105 @@
+import asyncio
+import codecs
+import importlib
+import os
+import selectors
+import signal
 import subprocess
-from typing import List, Tuple
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+from tracing import get_tracer
+
+# Default cap on captured output per stream, in bytes
+DEFAULT_OUTPUT_LIMIT = 16384
+
+_READ_SIZE = 65536
+
+
+class LazyModule:
+    """Module proxy that imports the real module on first attribute access"""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+
+def lazy_import(name: str) -> LazyModule:
+    """
+    Defer importing a heavy module until it's actually used
+
+    Modules using this for types in annotations need
+    `from __future__ import annotations`
+    """
+    return LazyModule(name)
+
+
+class OutputBuffer:
+    """Keeps the beginning and the end of a byte stream within a byte cap"""
+
+    def __init__(self, limit: int = DEFAULT_OUTPUT_LIMIT):
+        self.head_limit = limit // 2
+        self.tail_limit = limit - self.head_limit
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+
+    def write(self, data: bytes) -> None:
+        """Append a chunk, dropping the middle of the stream if over the cap"""
+        self.total += len(data)
+        room = self.head_limit - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if data:
+            self.tail += data
+            if len(self.tail) > self.tail_limit:
+                del self.tail[:len(self.tail) - self.tail_limit]
+
+    @property
+    def dropped(self) -> int:
+        """Number of bytes that didn't fit"""
+        return self.total - len(self.head) - len(self.tail)
+
+    def getvalue(self) -> str:
+        """Get the captured text, with a marker where bytes were dropped"""
+        head = self.head.decode(errors="replace")
+        if not self.dropped:
+            return head + self.tail.decode(errors="replace")
+        return (
+            f"{head}\n[... {self.dropped} bytes omitted ...]\n"
+            f"{self.tail.decode(errors='replace')}"
+        )
+
+
+@dataclass
+class CommandResult:
+    """Outcome of a captured shell command"""
+
+    returncode: Optional[int]
+    stdout: str
+    stderr: str
+    dropped_bytes: int = 0
+    timed_out: bool = False
+
+    @property
+    def success(self) -> bool:
+        return self.returncode == 0 and not self.timed_out
+
+    @property
+    def output(self) -> str:
+        """Stdout, or stderr if there's no stdout"""
+        return self.stdout.strip() or self.stderr.strip()
+
 
 class ProcessExecutor:
     """Handles process execution"""
@@ -9,19 +109,20 @@ class ProcessExecutor:
         """
         Run a command detached from the parent process
 
+        The process is tracked and reaped by the shared launcher, see
+        get_launcher().processes()
+
         :param command: Command and arguments as list
         :return: True if success, False otherwise
         """
-        try:
-            subprocess.Popen(
-                command,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-                start_new_session=True
-            )
-            return True
-        except (FileNotFoundError, PermissionError, OSError):
-            return False
+        # Imported on first launch, the launcher isn't needed to reach the prompt
+        from launcher import get_launcher
+
+        with get_tracer().span("process.spawn", program=command[0] if command else "") as span:
+            process = get_launcher().spawn(command)
+            if process:
+                span.set(pid=process.pid, spawn_ms=process.spawn_ms)
+            return process is not None
 
     @staticmethod
     def run_sync(command: str, timeout: int = 10) -> Tuple[bool, str]:
@@ -33,16 +134,154 @@ class ProcessExecutor:
         :return: Tuple of (success, output)
         """
         try:
-            result = subprocess.run(
+            result = ProcessExecutor.capture(command, timeout)
+        except Exception as e:
+            return False, f"Error: {str(e)}"
+        if result.timed_out:
+            return False, "Command timed out"
+        return result.success, result.output or "Command executed"
+
+    @staticmethod
+    def capture(command: str, timeout: int = 10, limit: int = DEFAULT_OUTPUT_LIMIT,
+                echo: Optional[Callable[[str], None]] = None) -> CommandResult:
+        """
+        Run a shell command, reading its output incrementally
+
+        Only the first and last limit/2 bytes of each stream are kept, so
+        memory use doesn't depend on how much the command prints
+
+        :param command: Shell command string
+        :param timeout: Timeout in seconds
+        :param limit: Max bytes kept per stream
+        :param echo: Optional callback receiving output text as it arrives
+        :return: Captured result
+        """
+        with get_tracer().span("process.spawn", program="sh"):
+            process = subprocess.Popen(
                 command,
                 shell=True,
-                capture_output=True,
-                text=True,
-                timeout=timeout
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                start_new_session=True
             )
-            output = result.stdout.strip() or result.stderr.strip()
-            return result.returncode == 0, output or "Command executed"
+        buffers = {process.stdout: OutputBuffer(limit), process.stderr: OutputBuffer(limit)}
+        # One per stream, a character split across reads must not be joined with the other's bytes
+        decoders = {stream: codecs.getincrementaldecoder("utf-8")(errors="replace") for stream in buffers}
+        deadline = time.monotonic() + timeout
+        timed_out = False
+
+        with selectors.DefaultSelector() as selector:
+            for stream in buffers:
+                selector.register(stream, selectors.EVENT_READ)
+
+            while selector.get_map():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    timed_out = True
+                    break
+                for key, _ in selector.select(remaining):
+                    data = os.read(key.fd, _READ_SIZE)
+                    if not data:
+                        selector.unregister(key.fileobj)
+                        continue
+                    buffers[key.fileobj].write(data)
+                    if echo:
+                        echo(decoders[key.fileobj].decode(data))
+
+        if timed_out:
+            ProcessExecutor._kill_group(process)
+        try:
+            returncode = process.wait(max(deadline - time.monotonic(), 0.1))
         except subprocess.TimeoutExpired:
-            return False, "Command timed out"
+            timed_out = True
+            ProcessExecutor._kill_group(process)
+            returncode = process.wait()
+        finally:
+            process.stdout.close()
+            process.stderr.close()
+
+        stdout, stderr = buffers[process.stdout], buffers[process.stderr]
+        return CommandResult(
+            returncode=returncode,
+            stdout=stdout.getvalue(),
+            stderr=stderr.getvalue(),
+            dropped_bytes=stdout.dropped + stderr.dropped,
+            timed_out=timed_out
+        )
+
+    @staticmethod
+    def _kill_group(process) -> None:
+        """Kill a process started in its own session, with its children"""
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    @staticmethod
+    async def run_async(command: str, timeout: int = 10) -> Tuple[bool, str]:
+        """
+        Run a shell command in an asyncio subprocess and capture output
+
+        The process is killed on timeout or when the awaiting task is cancelled
+
+        :param command: Shell command string
+        :param timeout: Timeout in seconds
+        :return: Tuple of (success, output)
+        """
+        try:
+            result = await ProcessExecutor.capture_async(command, timeout)
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            return False, f"Error: {str(e)}"
\ No newline at end of file
+            return False, f"Error: {str(e)}"
+        if result.timed_out:
+            return False, "Command timed out"
+        return result.success, result.output or "Command executed"
+
+    @staticmethod
+    async def capture_async(command: str, timeout: int = 10, limit: int = DEFAULT_OUTPUT_LIMIT,
+                            echo: Optional[Callable[[str], None]] = None) -> CommandResult:
+        """Async counterpart of capture"""
+        with get_tracer().span("process.spawn", program="sh"):
+            process = await asyncio.create_subprocess_shell(
+                command,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                start_new_session=True
+            )
+        stdout, stderr = OutputBuffer(limit), OutputBuffer(limit)
+
+        async def read(stream, buffer: OutputBuffer) -> None:
+            # One per stream, a character split across reads must not be joined with the other's bytes
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            while True:
+                data = await stream.read(_READ_SIZE)
+                if not data:
+                    return
+                buffer.write(data)
+                if echo:
+                    echo(decoder.decode(data))
+
+        async def communicate() -> int:
+            await asyncio.gather(read(process.stdout, stdout), read(process.stderr, stderr))
+            return await process.wait()
+
+        timed_out = False
+        try:
+            returncode = await asyncio.wait_for(communicate(), timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+            ProcessExecutor._kill_group(process)
+            returncode = await process.wait()
+        except asyncio.CancelledError:
+            ProcessExecutor._kill_group(process)
+            await process.wait()
+            raise
+
+        return CommandResult(
+            returncode=returncode,
+            stdout=stdout.getvalue(),
+            stderr=stderr.getvalue(),
+            dropped_bytes=stdout.dropped + stderr.dropped,
+            timed_out=timed_out
+        )